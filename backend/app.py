@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routers.ws import router as ws_router
@@ -7,9 +8,37 @@ from routers.patients import router as patients_router
 from routers.transcripts import router as transcripts_router
 from routers.encounters import router as encounters_router
 from routers.auth import router as auth_router
+from routers.metrics import router as metrics_router
+from services.llm_gateway import close_client
+from services.rule_engine import rule_engine, refresh_interval
+from services.safety_reevaluation import safety_reevaluator
+from services.safety_audit import audit_jobs
+from services.stt_audio import shutdown_audio_pool
+import asyncio
+import contextlib
 import uvicorn
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Built-in rules serve until the first refresh loads the active rule set
+    refresher = None
+    if refresh_interval() > 0:
+        refresher = asyncio.create_task(rule_engine.run_refresher(refresh_interval()))
+    yield
+    if refresher is not None:
+        refresher.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await refresher
+    # Apply allergy/medication changes already accepted before the pool goes away
+    await safety_reevaluator.drain()
+    await audit_jobs.cancel()
+    shutdown_audio_pool()
+    # Release pooled keep-alive connections to the LLM provider
+    await close_client()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable permissive CORS for local development; tighten for production
 app.add_middleware(
@@ -27,6 +56,7 @@ app.include_router(patients_router, prefix="/patients", tags=["patients"])
 app.include_router(transcripts_router, prefix="/transcripts", tags=["transcripts"])
 app.include_router(encounters_router, prefix="/encounters", tags=["encounters"])
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
+app.include_router(metrics_router)
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,88 @@
+"""
+Concurrency benchmark for the async LLM gateway.
+
+Fires a fixed number of SOAP extractions at a local stub server with a fixed
+per-request latency and reports throughput as the number of in-flight requests
+grows. A blocking baseline (sync OpenAI client called from a coroutine, as the
+extractor used to do) is included for comparison.
+
+Run from backend/:  python -m benchmarks.bench_llm_gateway
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.stub_llm import StubLLMServer
+
+SAMPLE_TRANSCRIPT = (
+    "Doctor: What brings you in today?\n"
+    "Patient: I've had a cough and fever for five days.\n"
+    "Doctor: Your temperature is 38.5 and I hear crackles on the right.\n"
+    "Doctor: This looks like pneumonia, we'll start amoxicillin 500 mg TID.\n"
+)
+
+
+async def _run_async(n_requests: int, concurrency: int) -> float:
+    from services.soap_extractor import _extract_with_llm
+
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            await _extract_with_llm(SAMPLE_TRANSCRIPT)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n_requests)))
+    return time.perf_counter() - start
+
+
+async def _run_blocking(n_requests: int, concurrency: int, base_url: str) -> float:
+    from openai import OpenAI
+
+    client = OpenAI(api_key="stub", base_url=base_url)
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            client.chat.completions.create(
+                model="stub",
+                messages=[{"role": "user", "content": SAMPLE_TRANSCRIPT}],
+            )
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n_requests)))
+    return time.perf_counter() - start
+
+
+async def main(args: argparse.Namespace) -> None:
+    from services import llm_gateway
+
+    with StubLLMServer(latency_s=args.latency_ms / 1000) as stub:
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["OPENAI_BASE_URL"] = stub.base_url
+        llm_gateway.set_client(None)
+
+        # Warm the pool so the first row doesn't pay connection setup
+        await _run_async(4, 4)
+
+        print(f"stub latency={args.latency_ms}ms requests={args.requests}")
+        print(f"{'mode':<10}{'in-flight':>10}{'wall s':>10}{'req/s':>10}")
+
+        elapsed = await _run_blocking(min(args.requests, 16), 16, stub.base_url)
+        print(f"{'blocking':<10}{16:>10}{elapsed:>10.2f}{min(args.requests, 16) / elapsed:>10.1f}")
+
+        for concurrency in args.concurrency:
+            elapsed = await _run_async(args.requests, concurrency)
+            print(f"{'async':<10}{concurrency:>10}{elapsed:>10.2f}{args.requests / elapsed:>10.1f}")
+
+        print(f"stub max in-flight observed: {stub.max_in_flight}")
+        await llm_gateway.close_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--requests", type=int, default=128)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    asyncio.run(main(parser.parse_args()))
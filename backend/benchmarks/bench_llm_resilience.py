@@ -0,0 +1,94 @@
+"""
+Tail latency of SOAP extraction under a degraded upstream.
+
+Drives the stub server through healthy -> brownout -> outage -> recovered
+phases and reports per-phase success rate and p50/p95/p99 latency, with the
+circuit breaker enabled and effectively disabled.
+
+Run from backend/:  python -m benchmarks.bench_llm_resilience
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from benchmarks.stub_llm import StubLLMServer
+
+PHASES = [
+    ("healthy", 0.0),
+    ("brownout", 0.5),
+    ("outage", 1.0),
+    ("recovered", 0.0),
+]
+
+
+def _pct(values, q):
+    if not values:
+        return 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1] if len(values) > 1 else values[0]
+
+
+async def _phase(n_requests: int, concurrency: int) -> dict:
+    from services.soap_extractor import _extract_with_llm
+    from services.llm_errors import LLMError, LLMCircuitOpenError
+
+    sem = asyncio.Semaphore(concurrency)
+    latencies, outcomes = [], {"ok": 0, "error": 0, "fast_fail": 0}
+
+    async def one(i: int):
+        async with sem:
+            start = time.perf_counter()
+            try:
+                await _extract_with_llm(f"Doctor: request {i}\nPatient: cough")
+                outcomes["ok"] += 1
+            except LLMCircuitOpenError:
+                outcomes["fast_fail"] += 1
+            except LLMError:
+                outcomes["error"] += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one(i) for i in range(n_requests)))
+    return {"latencies": latencies, **outcomes}
+
+
+async def _run(args: argparse.Namespace, breaker_threshold: int) -> None:
+    from services import llm_gateway, llm_resilience
+
+    llm_resilience.llm_breaker = llm_resilience.CircuitBreaker(
+        "openai", failure_threshold=breaker_threshold, reset_timeout=args.reset_timeout,
+    )
+    with StubLLMServer(latency_s=args.latency_ms / 1000, error_status=503, retry_after_s=args.retry_after) as stub:
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["OPENAI_BASE_URL"] = stub.base_url
+        llm_gateway.set_client(None)
+
+        label = "breaker on" if breaker_threshold < 10**6 else "breaker off"
+        print(f"\n{label} (threshold={breaker_threshold})")
+        print(f"{'phase':<11}{'ok':>5}{'err':>5}{'fast':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for name, error_rate in PHASES:
+            stub.error_rate = error_rate
+            if name == "recovered":
+                # Give the breaker time to half-open again
+                await asyncio.sleep(args.reset_timeout)
+            r = await _phase(args.requests, args.concurrency)
+            lat = r["latencies"]
+            print(f"{name:<11}{r['ok']:>5}{r['error']:>5}{r['fast_fail']:>6}"
+                  f"{_pct(lat, 50):>9.0f}{_pct(lat, 95):>9.0f}{_pct(lat, 99):>9.0f}")
+        print(f"upstream requests: {stub.requests_served + stub.faults_injected}")
+        await llm_gateway.close_client()
+
+
+async def main(args: argparse.Namespace) -> None:
+    await _run(args, breaker_threshold=5)
+    await _run(args, breaker_threshold=10**9)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--retry-after", type=float, default=None, help="Retry-After seconds sent with faults")
+    parser.add_argument("--reset-timeout", type=float, default=2.0)
+    asyncio.run(main(parser.parse_args()))
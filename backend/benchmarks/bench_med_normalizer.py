@@ -0,0 +1,124 @@
+"""
+Fuzzy medication name normalization.
+
+Builds a SymSpellIndex over a large synthetic synonym table (pseudo drug
+names built from real stems, mapped onto a smaller set of canonical names)
+and reports build time, index memory, and uncached lookup latency for
+exact hits, 1-2 edit typos and misses. Then runs realistic inputs through
+the live MedNormalizer to show accuracy and LRU-cached latency.
+
+Run from backend/:  python -m benchmarks.bench_med_normalizer --terms 100000
+"""
+import argparse
+import random
+import statistics
+import time
+import tracemalloc
+
+PREFIXES = ["amo", "azi", "cef", "cip", "cla", "dox", "ery", "flu", "gen", "lev", "lin", "mer", "met",
+            "mox", "nit", "oxa", "pip", "rif", "str", "tei", "tob", "van", "pra", "zol", "bex", "dal"]
+MIDDLES = ["xi", "thro", "tri", "pro", "flo", "cy", "ta", "ri", "mi", "lo", "ne", "zo", "ba", "du", "ke", "sa"]
+SUFFIXES = ["cillin", "mycin", "floxacin", "cycline", "penem", "azole", "dazole", "oxime", "adroxil",
+            "furantoin", "planin", "bactam", "zolid", "xone", "pime", "micin"]
+
+REALISTIC = [
+    ("Augmentin", "amoxicillin-clavulanate"), ("amoxicilin", "amoxicillin"), ("amox-clav", "amoxicillin-clavulanate"),
+    ("Amoxicillin 500 mg PO TID", "amoxicillin"), ("ceftriaxon", "ceftriaxone"), ("cefriaxone 1g IV", "ceftriaxone"),
+    ("Cipro", "ciprofloxacin"), ("ciproflaxacin", "ciprofloxacin"), ("azithromycn", "azithromycin"),
+    ("metronidazol", "metronidazole"), ("Keflex", "cefalexin"), ("Vancomycine", "vancomycin"),
+    ("doxycyclin", "doxycycline"), ("clarithromycine", "clarithromycin"), ("Co-Amoxiclav 625mg", "amoxicillin-clavulanate"),
+    ("levofloxacn", "levofloxacin"), ("gentamycin", "gentamicin"), ("Bactrim DS", "sulfamethoxazole-trimethoprim"),
+    ("Zithromax", "azithromycin"), ("nitrofurantion", "nitrofurantoin"), ("flucloxacilin", "flucloxacillin"),
+    ("Tazocin", "piperacillin-tazobactam"), ("meropenam", "meropenem"), ("clindamicin", "clindamycin"),
+    ("paracetamol", "paracetamol"), ("xyzomycin", "xyzomycin"),
+]
+
+
+def _typo(word: str, rng: random.Random, edits: int) -> str:
+    chars = list(word)
+    for _ in range(edits):
+        i = rng.randrange(1, len(chars))
+        op = rng.randrange(3)
+        if op == 0:
+            del chars[i]
+        elif op == 1:
+            chars.insert(i, rng.choice("aeiouxyz"))
+        else:
+            chars[i] = rng.choice("aeiouxyz")
+    return "".join(chars)
+
+
+def synthetic_table(n: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    table = {}
+    canonicals = max(1, n // 5)
+    while len(table) < n:
+        name = rng.choice(PREFIXES) + rng.choice(MIDDLES) + rng.choice(MIDDLES) + rng.choice(SUFFIXES)
+        table.setdefault(name, f"drug-{len(table) % canonicals}")
+    return table
+
+
+def _timed(fn, items) -> list:
+    out = []
+    for item in items:
+        t0 = time.perf_counter()
+        fn(item)
+        out.append((time.perf_counter() - t0) * 1e6)
+    return out
+
+
+def _summary(label: str, samples: list) -> None:
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"  {label:<14} p50={statistics.median(samples):7.1f} us  p99={p99:7.1f} us  max={samples[-1]:7.1f} us")
+
+
+def main(args: argparse.Namespace) -> None:
+    from services.med_normalizer import SymSpellIndex, MedNormalizer, max_distance_for, MAX_EDIT_DISTANCE
+    from services.rule_engine import rule_engine
+
+    table = synthetic_table(args.terms, args.seed)
+    tracemalloc.start()
+    start = time.perf_counter()
+    index = SymSpellIndex(table)
+    build_s = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"synthetic table: {len(table)} surfaces, {len(index.deletes)} delete keys, "
+          f"build {build_s:.2f} s, peak {peak / 1e6:.0f} MB (max distance {MAX_EDIT_DISTANCE})")
+
+    rng = random.Random(args.seed + 1)
+    words = rng.sample(list(table), min(args.lookups, len(table)))
+    one = [_typo(w, rng, 1) for w in words]
+    two = [_typo(w, rng, 2) for w in words]
+    misses = ["q" + _typo(w, rng, 2)[1:] for w in words]
+    lookup = lambda w: index.lookup(w, max_distance_for(len(w)))
+    print("uncached lookups:")
+    _summary("exact", _timed(lookup, words))
+    _summary("1 edit", _timed(lookup, one))
+    _summary("2 edits", _timed(lookup, two))
+    _summary("miss", _timed(lookup, misses))
+    recovered = sum(1 for w, t in zip(words, one) if (hit := lookup(t)) and hit[0] == table[w])
+    print(f"  1-edit recovery: {recovered / len(words) * 100:.1f}% (misses are ambiguous or first-letter edits)")
+
+    normalizer = MedNormalizer(rule_engine.current)
+    correct = sum(1 for raw, expected in REALISTIC if normalizer.med(raw) == expected)
+    print(f"live normalizer: {normalizer.stats()['med_terms']} med surfaces, "
+          f"{correct}/{len(REALISTIC)} realistic inputs resolved as expected")
+    for raw, expected in REALISTIC:
+        got = normalizer.med(raw)
+        if got != expected:
+            print(f"  {raw!r} -> {got!r} (expected {expected!r})")
+    inputs = [raw for raw, _ in REALISTIC] * args.repeat
+    cold = MedNormalizer(rule_engine.current)
+    _summary("first pass", _timed(cold.med, [raw for raw, _ in REALISTIC]))
+    _summary("LRU cached", _timed(cold.med, inputs))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--terms", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=3)
+    main(parser.parse_args())
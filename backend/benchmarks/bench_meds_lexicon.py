@@ -0,0 +1,78 @@
+"""
+Lexicon fast path for plan-text medication extraction.
+
+Runs a corpus of representative plan texts through extract_meds_from_text
+(stub LLM for the low-confidence remainder) and reports lexicon match time
+per text, the LLM-avoidance rate and end-to-end latency.
+
+Run from backend/:  python -m benchmarks.bench_meds_lexicon
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from benchmarks.stub_llm import StubLLMServer
+
+PLANS = [
+    "Start amoxicillin 500 mg PO TID for 7 days. Paracetamol 1 g QDS PRN.",
+    "Augmentin 625mg bd for 5 days, review in 48 hours.",
+    "Ceftriaxone 1 g IV stat then continue metronidazole 500 mg IV tds.",
+    "Azithromycin 500mg od x3 days; salbutamol inhaler as needed.",
+    "Rest, oral fluids and paracetamol. Return if fever persists beyond 3 days.",
+    "Septrin prophylaxis daily, continue ARVs, review in clinic next month.",
+    "Penicillin allergy noted. Start doxycycline 100 mg twice daily for 7 days.",
+    "Nitrofurantoin 100 mg bd for 5 days, urine culture sent.",
+    "Give ciprofloxacine 500mg bd for three days",
+    "Start amoxycillin syrup for the child",
+    "Continue flucloxacillin 500 mg qds and elevate the leg.",
+    "Chest x-ray and full blood count; consider antibiotics if consolidation.",
+    "Start cefuroxime 500 mg bd, and clarithromycin 500 mg bd if atypical cover needed.",
+    "Switch to oral co-amoxiclav 625 mg tds once afebrile for 24 hours.",
+    "Start xyzomycin 250 mg daily as per specialist",
+    "Artemether-lumefantrine 4 tablets bd for 3 days; ORS for dehydration.",
+    # Non-antibiotic -azoles and sulfates: no antibiotic, and nothing for the LLM to resolve
+    "Continue omeprazole 20 mg od and ferrous sulfate 200 mg tds.",
+    "Albendazole 400 mg stat for the household; repeat stool test in 2 weeks.",
+    "Fluconazole 150 mg stat; lansoprazole 30 mg daily for 4 weeks.",
+    "Start sulfadiazine 1 g qds as per toxoplasmosis protocol",
+]
+
+
+async def main(args: argparse.Namespace) -> None:
+    from services import llm_gateway, antibiotic_lexicon
+    from services.antibiotic_rules import extract_meds_from_text, meds_extraction_stats
+
+    n = args.iterations * len(PLANS)
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        for plan in PLANS:
+            antibiotic_lexicon.match(plan)
+    match_us = (time.perf_counter() - start) / n * 1e6
+
+    with StubLLMServer(latency_s=args.latency_ms / 1000) as stub:
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["OPENAI_BASE_URL"] = stub.base_url
+        llm_gateway.set_client(None)
+
+        latencies = []
+        for plan in PLANS:
+            t0 = time.perf_counter()
+            await extract_meds_from_text(plan)
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+        stats = meds_extraction_stats()
+        print(f"lexicon match: {match_us:.1f} us/text over {n} texts")
+        print(f"LLM avoidance: {stats['llm_avoidance_rate'] * 100:.0f}% "
+              f"({stats['lexicon_resolved']}/{stats['calls']}, stub LLM calls={stub.requests_served})")
+        print(f"end-to-end ms: p50={statistics.median(latencies):.2f} max={max(latencies):.1f} "
+              f"(stub LLM latency {args.latency_ms:.0f} ms)")
+        await llm_gateway.close_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=400)
+    asyncio.run(main(parser.parse_args()))
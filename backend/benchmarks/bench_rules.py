@@ -0,0 +1,376 @@
+"""
+Rules engine micro-benchmarks and throughput regression check.
+
+A synthetic formulary generator builds a drug-class ontology (allergy
+groups, subclasses, cross-reactivity edges) and a rule set of N rules
+(allergy contraindications and drug-drug interactions) over it. For each
+grid point (rules x meds per patient x allergies per patient) it reports:
+
+  compile     time and tracemalloc memory (retained / peak) to build the
+              CompiledRuleSet, its ontology and the name normalizer
+  evaluate    CompiledRuleSet.evaluate on canonical names
+  check       check_antibiotics (normalization + evaluate + schema)
+  analyze     analyze_antibiotics with recommendations from the stub LLM
+              server: a cold pass (store misses go to the stub) and a
+              warm pass (served from the recommendation store)
+
+as latency percentiles in microseconds and calls per second. The stub is
+deterministic (fixed latency, recommendations echo the finding ids), so
+the numbers only move when our code does.
+
+Each timed stage runs --repeats times; every repeat's median-based
+throughput is divided by a fixed pure-Python calibration loop run just
+before it and the best repeat is kept, which makes results comparable
+across CI runners and steady on noisy ones.
+--check compares those calibrated numbers (and compile memory) against a
+baseline file and exits 1 when any metric regresses by more than
+--tolerance; --write-baseline records a new one.
+
+Run from backend/:  python -m benchmarks.bench_rules
+                    python -m benchmarks.bench_rules --check benchmarks/baselines/bench_rules.json
+                    python -m benchmarks.bench_rules --grid full
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.stub_llm import StubLLMServer, default_responder
+
+GRIDS = {
+    # (rules, meds per patient, allergies per patient)
+    "quick": [(100, 3, 1), (1000, 3, 1), (1000, 10, 4), (10000, 10, 4)],
+    "full": [(r, m, a) for r in (100, 1000, 10000, 100000) for m, a in ((2, 1), (10, 4), (30, 10))],
+}
+
+STEMS = ["amo", "azi", "cef", "cip", "cla", "dox", "ery", "flu", "gen", "lev", "lin", "mer", "met",
+         "mox", "nit", "oxa", "pip", "rif", "str", "tei", "tob", "van", "pra", "zol", "bex", "dal"]
+MIDDLES = ["xi", "thro", "tri", "pro", "flo", "cy", "ta", "ri", "mi", "lo", "ne", "zo", "ba", "du", "ke", "sa"]
+SUFFIXES = ["cillin", "mycin", "floxacin", "cycline", "penem", "azole", "oxime", "bactam", "zolid", "micin"]
+SEVERITIES = ["high", "medium", "low"]
+
+
+def synthetic_formulary(n_drugs: int, seed: int) -> dict:
+    """Raw ontology: ~20 drugs per class, one allergy group per ~4 classes, sparse cross-reactivity"""
+    rng = random.Random(seed)
+    drugs = set()
+    while len(drugs) < n_drugs:
+        parts = [rng.choice(STEMS)] + [rng.choice(MIDDLES) for _ in range(rng.randint(1, 3))] + [rng.choice(SUFFIXES)]
+        drugs.add("".join(parts))
+    n_classes = max(4, n_drugs // 20)
+    groups = [f"syn group {g}" for g in range(max(1, n_classes // 4))]
+    classes = {g: {"allergy_group": True} for g in groups}
+    leaves = []
+    for c in range(n_classes):
+        name = f"syn class {c}"
+        classes[name] = {"parent": groups[c % len(groups)]}
+        leaves.append(name)
+    edges = []
+    for g in groups:
+        for _ in range(rng.randint(0, 2)):
+            target = rng.choice(leaves + groups)
+            if not target.startswith(g):
+                edges.append({"from": g, "to": target, "severity": rng.choice(["medium", "low"]), "details": "Synthetic cross-reactivity."})
+    return {
+        "version": f"synthetic-{n_drugs}-{seed}",
+        "classes": classes,
+        "drugs": {d: [rng.choice(leaves)] for d in sorted(drugs)},
+        "cross_reactivity": edges,
+        "allergen_aliases": {f"{g}s": g for g in groups},
+    }
+
+
+def synthetic_rules(n_rules: int, formulary: dict, seed: int) -> dict:
+    """Raw RuleDefinitions: 70% allergy contraindications, 30% interactions"""
+    rng = random.Random(seed)
+    drugs = list(formulary["drugs"])
+    allergens = list(formulary["classes"]) + drugs
+    allergy, interactions = [], []
+    pairs = set()
+    for i in range(n_rules):
+        if rng.random() < 0.7:
+            allergy.append({
+                "id": f"syn-allergy-{i}",
+                "allergen": rng.choice(allergens),
+                "drugs": rng.sample(drugs, rng.randint(1, 8)),
+                "severity": rng.choice(SEVERITIES),
+                "title": "Synthetic {allergen} allergy with {drug}",
+                "details": "Documented {allergen} allergy while {drug} is listed.",
+            })
+        else:
+            pair = tuple(sorted(rng.sample(drugs, 2)))
+            if pair in pairs:
+                continue
+            pairs.add(pair)
+            interactions.append({
+                "id": f"syn-ddi-{i}",
+                "drugs": list(pair),
+                "severity": rng.choice(SEVERITIES),
+                "title": f"Synthetic interaction {pair[0]} + {pair[1]}",
+                "details": "Synthetic interaction.",
+            })
+    return {"allergy_contraindications": allergy, "interactions": interactions}
+
+
+def synthetic_patients(n: int, meds: int, allergies: int, formulary: dict, rules: dict, seed: int):
+    """
+    Patients biased towards drugs and allergens the rules mention, so a
+    realistic share of them produce findings
+    """
+    rng = random.Random(seed)
+    drugs = list(formulary["drugs"])
+    ruled_drugs = [d for r in rules["allergy_contraindications"] for d in r["drugs"]] or drugs
+    ruled_allergens = [r["allergen"] for r in rules["allergy_contraindications"]] or list(formulary["classes"])
+    out = []
+    for _ in range(n):
+        m = [rng.choice(ruled_drugs if rng.random() < 0.5 else drugs) for _ in range(meds)]
+        a = [rng.choice(ruled_allergens) for _ in range(allergies)]
+        out.append((m, a))
+    return out
+
+
+def calibrate(rounds: int = 3) -> float:
+    """Ops/s of a fixed dict/set/string workload, best of `rounds`"""
+    words = [f"drug{i}" for i in range(512)]
+    best = 0.0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        ops = 0
+        for k in range(200):
+            index = {w: i for i, w in enumerate(words)}
+            seen = set()
+            for w in words[k % 7::7]:
+                if index[w] & 1:
+                    seen.add(w.upper())
+                ops += 1
+        best = max(best, ops / (time.perf_counter() - start))
+    return best
+
+
+def _latencies(fn, items) -> list:
+    out = []
+    for item in items:
+        t0 = time.perf_counter()
+        fn(item)
+        out.append((time.perf_counter() - t0) * 1e6)
+    return out
+
+
+async def _alatencies(fn, items) -> list:
+    out = []
+    for item in items:
+        t0 = time.perf_counter()
+        await fn(item)
+        out.append((time.perf_counter() - t0) * 1e6)
+    return out
+
+
+def _dist(samples: list) -> dict:
+    s = sorted(samples)
+    pick = lambda q: s[min(len(s) - 1, int(len(s) * q))]
+    return {
+        "p50_us": round(statistics.median(s), 2),
+        "p95_us": round(pick(0.95), 2),
+        "p99_us": round(pick(0.99), 2),
+        "ops": round(len(s) / (sum(s) / 1e6), 1),
+        # From the median, so a few GC pauses or scheduler hiccups do not move the regression check
+        "p50_ops": round(1e6 / statistics.median(s), 1),
+    }
+
+
+def _best(runs: list) -> dict:
+    """
+    Best of several (calibration, samples) repeats. Each repeat is
+    normalized by a calibration run taken right before it, so a noisy
+    neighbour slowing the whole machine for a moment cancels out
+    """
+    best = None
+    for calibration, samples in runs:
+        d = _dist(samples)
+        d["calibrated_ops"] = round(d["p50_ops"] / calibration, 5)
+        if best is None or d["calibrated_ops"] > best["calibrated_ops"]:
+            best = d
+    return best
+
+
+def echo_responder(body: dict) -> str:
+    user = body["messages"][-1]["content"]
+    if "Findings JSON" not in user:
+        return default_responder(body)
+    findings = json.loads(user.split("Findings JSON:\n", 1)[1].rsplit("\n", 1)[0])["findings"]
+    return json.dumps({"recommendations": [
+        {"findingId": f["id"], "reason": f"Stub rationale for {f['id']}.", "alternatives": ["doxycycline"]}
+        for f in findings
+    ]})
+
+
+async def run_point(rules_n: int, meds_n: int, allergies_n: int, args: argparse.Namespace, stub: StubLLMServer) -> dict:
+    from schemas.rules import RuleDefinitions
+    from services.drug_ontology import DrugOntology
+    from services.rule_engine import CompiledRuleSet, rule_engine
+    from services.med_normalizer import MedNormalizer
+    from services.recommendation_store import recommendation_store
+    from services.antibiotic_rules import check_antibiotics, analyze_antibiotics
+
+    drugs_n = args.drugs or max(100, rules_n // 4)
+    formulary = synthetic_formulary(drugs_n, args.seed)
+    raw_rules = synthetic_rules(rules_n, formulary, args.seed)
+    patients = synthetic_patients(args.patients, meds_n, allergies_n, formulary, raw_rules, args.seed + 1)
+
+    gc.collect()
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    t0 = time.perf_counter()
+    ontology = DrugOntology(formulary)
+    compiled = CompiledRuleSet(
+        "synthetic", f"syn-{rules_n}", RuleDefinitions.model_validate(raw_rules), ontology=ontology,
+    )
+    # Built directly: normalizer_for would reuse the cached one when two points share a rule set
+    MedNormalizer(compiled)
+    compile_ms = (time.perf_counter() - t0) * 1000
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    previous = rule_engine.current
+    rule_engine.install(compiled)
+    try:
+        canonical = [(m, [ontology.canonical(a) for a in al]) for m, al in patients]
+        evaluate = _best([(calibrate(), _latencies(lambda p: compiled.evaluate(*p), canonical)) for _ in range(args.repeats)])
+        findings = sum(1 for p in canonical if compiled.evaluate(*p))
+        # Raw spellings: upper-cased half of the time so normalization does real work
+        noisy = [([x.upper() if i % 2 else x for i, x in enumerate(m)], a) for m, a in patients]
+        check_antibiotics(*noisy[0])
+        check = _best([(calibrate(), _latencies(lambda p: check_antibiotics(*p), noisy)) for _ in range(args.repeats)])
+
+        subset = patients[: args.analyze_patients]
+        recommendation_store._entries.clear()
+        calls = stub.requests_served
+        cold = _dist(await _alatencies(lambda p: analyze_antibiotics(p[0], p[1]), subset))
+        cold_calls = stub.requests_served - calls
+        warm = _best([(calibrate(), await _alatencies(lambda p: analyze_antibiotics(p[0], p[1]), subset)) for _ in range(args.repeats)])
+    finally:
+        rule_engine.install(previous)
+
+    return {
+        "rules": rules_n,
+        "drugs": drugs_n,
+        "meds": meds_n,
+        "allergies": allergies_n,
+        "patients_with_findings": round(findings / len(canonical), 3),
+        "compile_ms": round(compile_ms, 1),
+        "memory_retained_kb": round((retained - base) / 1024, 1),
+        "memory_peak_kb": round((peak - base) / 1024, 1),
+        "evaluate": evaluate,
+        "check": check,
+        "analyze_cold": cold,
+        "analyze_cold_llm_calls": cold_calls,
+        "analyze_warm": warm,
+    }
+
+
+def point_key(r: dict) -> str:
+    return f"rules={r['rules']},meds={r['meds']},allergies={r['allergies']}"
+
+
+def compare(results: list, baseline: dict, tolerance: float) -> list:
+    """Regressions as human-readable lines; empty when everything is within tolerance"""
+    problems = []
+    base_points = baseline.get("points", {})
+    for r in results:
+        key = point_key(r)
+        base = base_points.get(key)
+        if base is None:
+            print(f"  {key}: not in baseline, skipped")
+            continue
+        for stage in ("evaluate", "check", "analyze_warm"):
+            now = r[stage]["calibrated_ops"]
+            was = base[stage]["calibrated_ops"]
+            if now < was * (1 - tolerance):
+                problems.append(f"{key} {stage}: {now:.4f} vs baseline {was:.4f} calibrated ops ({(now / was - 1) * 100:+.0f}%)")
+        if r["memory_retained_kb"] > base["memory_retained_kb"] * (1 + tolerance) + 64:
+            problems.append(f"{key} memory: {r['memory_retained_kb']:.0f} KB vs baseline {base['memory_retained_kb']:.0f} KB")
+    return problems
+
+
+def baseline_from(results: list, calibration: float, grid: str) -> dict:
+    return {
+        "grid": grid,
+        "calibration_ops": round(calibration, 1),
+        "points": {
+            point_key(r): {
+                **{stage: {"calibrated_ops": r[stage]["calibrated_ops"], "p50_ops": r[stage]["p50_ops"]}
+                   for stage in ("evaluate", "check", "analyze_warm")},
+                "memory_retained_kb": r["memory_retained_kb"],
+            }
+            for r in results
+        },
+    }
+
+
+async def main(args: argparse.Namespace) -> int:
+    from services import llm_gateway
+
+    stub = StubLLMServer(latency_s=args.llm_latency, responder=echo_responder).start()
+    os.environ["OPENAI_API_KEY"] = "stub"
+    os.environ["OPENAI_BASE_URL"] = stub.base_url
+    llm_gateway.set_client(None)
+    calibration = calibrate()
+    print(f"calibration: {calibration:,.0f} ops/s; stub LLM latency {args.llm_latency * 1000:.0f} ms; "
+          f"{args.patients} patients per point ({args.analyze_patients} through analyze)")
+    print(f"{'rules':>7} {'drugs':>6} {'meds':>4} {'alg':>4} {'compile':>9} {'mem':>9} "
+          f"{'evaluate p50/p99 us':>20} {'check p50/p99 us':>18} {'analyze warm p50':>17} {'cold LLM':>9}")
+    results = []
+    try:
+        for rules_n, meds_n, allergies_n in GRIDS[args.grid]:
+            r = await run_point(rules_n, meds_n, allergies_n, args, stub)
+            results.append(r)
+            print(f"{r['rules']:>7} {r['drugs']:>6} {r['meds']:>4} {r['allergies']:>4} "
+                  f"{r['compile_ms']:>7.0f}ms {r['memory_retained_kb'] / 1024:>7.1f}MB "
+                  f"{r['evaluate']['p50_us']:>9.1f}/{r['evaluate']['p99_us']:<10.1f}"
+                  f"{r['check']['p50_us']:>8.1f}/{r['check']['p99_us']:<9.1f}"
+                  f"{r['analyze_warm']['p50_us']:>12.1f} us {r['analyze_cold_llm_calls']:>9}")
+    finally:
+        stub.stop()
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({"calibration_ops": calibration, "results": results}, indent=2) + "\n")
+    if args.write_baseline:
+        Path(args.write_baseline).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.write_baseline).write_text(json.dumps(baseline_from(results, calibration, args.grid), indent=2) + "\n")
+        print(f"baseline written to {args.write_baseline}")
+    if args.check:
+        baseline = json.loads(Path(args.check).read_text())
+        problems = compare(results, baseline, args.tolerance)
+        if problems:
+            print(f"REGRESSIONS (tolerance {args.tolerance * 100:.0f}%):")
+            for p in problems:
+                print(f"  {p}")
+            return 1
+        print(f"no regressions against {args.check} (tolerance {args.tolerance * 100:.0f}%)")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--grid", choices=sorted(GRIDS), default="quick")
+    parser.add_argument("--patients", type=int, default=2000)
+    parser.add_argument("--analyze-patients", type=int, default=200)
+    parser.add_argument("--drugs", type=int, default=None, help="Formulary size (default: max(100, rules / 4))")
+    parser.add_argument("--llm-latency", type=float, default=0.005, help="Stub LLM latency per call (s)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--json", default=None, help="Write full results to this file")
+    parser.add_argument("--check", default=None, help="Baseline file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="Allowed regression before --check fails")
+    parser.add_argument("--write-baseline", default=None)
+    args = parser.parse_args()
+    # Recommendations stay in memory; no database needed
+    os.environ.setdefault("RECOMMENDATION_STORE_PERSISTENT", "false")
+    sys.exit(asyncio.run(main(args)))
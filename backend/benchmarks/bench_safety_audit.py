@@ -0,0 +1,134 @@
+"""
+Population-wide antibiotic safety audit.
+
+Generates a synthetic population (most encounters on non-antibiotic meds,
+a minority with allergies) and compares the vectorized AuditPlan against
+calling CompiledRuleSet.evaluate per encounter, checking that both produce
+identical findings. With --db-url it also seeds that database and times
+run_audit end to end, including streaming and the bulk insert.
+
+Run from backend/:  python -m benchmarks.bench_safety_audit --encounters 200000
+                    python -m benchmarks.bench_safety_audit --encounters 50000 \\
+                        --db-url sqlite+aiosqlite:////tmp/audit.db
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timezone
+
+OTHER_MEDS = [
+    "paracetamol", "ibuprofen", "metformin", "amlodipine", "omeprazole", "salbutamol",
+    "simvastatin", "warfarin", "sertraline", "methotrexate", "tizanidine", "lisinopril",
+]
+OTHER_ALLERGIES = ["peanuts", "latex", "codeine", "shellfish", "ibuprofen"]
+
+
+def synthetic_population(n: int, seed: int, antibiotics: list, allergens: list):
+    rng = random.Random(seed)
+    meds, allergies = [], []
+    for _ in range(n):
+        m = [rng.choice(OTHER_MEDS) for _ in range(rng.randint(0, 5))]
+        if rng.random() < 0.3:
+            m += [rng.choice(antibiotics) for _ in range(rng.randint(1, 2))]
+        a = []
+        if rng.random() < 0.25:
+            a = [rng.choice(allergens if rng.random() < 0.7 else OTHER_ALLERGIES) for _ in range(rng.randint(1, 2))]
+        meds.append(m)
+        allergies.append(a)
+    return meds, allergies
+
+
+def bench_engine(args: argparse.Namespace) -> None:
+    from services.rule_engine import rule_engine
+    from services.safety_audit import audit_plan
+
+    rules = rule_engine.current
+    start = time.perf_counter()
+    plan = audit_plan(rules)
+    plan_ms = (time.perf_counter() - start) * 1000
+
+    antibiotics = [d for d in plan.drug_names if d not in OTHER_MEDS]
+    allergens = plan.allergen_names + ["sulfa", "PCN", "penicillins", "augmentin"]
+    meds, allergies = synthetic_population(args.encounters, args.seed, antibiotics, allergens)
+
+    start = time.perf_counter()
+    M, L = plan.encode(meds, allergies)
+    encode_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    vectorized = plan.evaluate(M, L)
+    evaluate_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    reference = [rules.evaluate(m, a) for m, a in zip(meds, allergies)]
+    reference_ms = (time.perf_counter() - start) * 1000
+
+    mismatches = sum(1 for i, r in enumerate(reference) if vectorized.get(i, []) != r)
+    findings = sum(len(f) for f in vectorized.values())
+    print(f"population: {args.encounters} encounters, {findings} findings, "
+          f"{len(vectorized)} encounters flagged")
+    print(f"plan build: {plan_ms:.1f} ms ({len(plan.drug_names)} drugs in {plan.words} words, "
+          f"{len(plan.allergen_names)} allergens)")
+    print(f"vectorized: encode {encode_ms:.0f} ms + evaluate {evaluate_ms:.0f} ms "
+          f"= {(encode_ms + evaluate_ms) / args.encounters * 1000:.2f} us/encounter")
+    print(f"per-encounter evaluate(): {reference_ms:.0f} ms "
+          f"= {reference_ms / args.encounters * 1000:.2f} us/encounter "
+          f"(speedup {reference_ms / (encode_ms + evaluate_ms):.1f}x)")
+    print(f"mismatches vs evaluate(): {mismatches}")
+
+
+async def bench_db(args: argparse.Namespace) -> None:
+    from sqlalchemy import insert, delete
+    from core.database import engine, Base, AsyncSessionLocal
+    from models import Patient, Encounter, Medication, Allergy, SafetyFinding
+    from services.rule_engine import rule_engine
+    from services.safety_audit import audit_plan, run_audit
+
+    engine.echo = False
+    plan = audit_plan(rule_engine.current)
+    antibiotics = [d for d in plan.drug_names if d not in OTHER_MEDS]
+    meds, allergies = synthetic_population(args.encounters, args.seed, antibiotics, plan.allergen_names)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as db:
+        for model in (SafetyFinding, Medication, Allergy, Encounter, Patient):
+            await db.execute(delete(model))
+        now = datetime.now(timezone.utc)
+        n = args.encounters
+        await db.execute(insert(Patient), [{"id": i + 1, "first_name": "Synthetic", "last_name": str(i)} for i in range(n)])
+        await db.execute(insert(Encounter), [
+            {"id": i + 1, "patient_id": i + 1, "encounter_type": "outpatient", "status": "active", "encounter_date": now}
+            for i in range(n)
+        ])
+        await db.execute(insert(Medication), [
+            {"encounter_id": i + 1, "generic_name": m} for i, ms in enumerate(meds) for m in ms
+        ])
+        await db.execute(insert(Allergy), [
+            {"patient_id": i + 1, "allergen": a, "is_active": True} for i, al in enumerate(allergies) for a in al
+        ])
+        await db.commit()
+
+        report = await run_audit(db, chunk_size=args.chunk_size)
+        print(f"run_audit (first run): {report.elapsed_ms:.0f} ms total, {report.evaluate_ms:.0f} ms encode+evaluate, "
+              f"{report.chunks} chunks, {report.inserted} rows inserted")
+        report = await run_audit(db, chunk_size=args.chunk_size)
+        print(f"run_audit (rerun):     {report.elapsed_ms:.0f} ms total, {report.inserted} inserted, "
+              f"{report.skipped_existing} already stored")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--encounters", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--db-url", default=None, help="Also seed this database and time run_audit end to end")
+    args = parser.parse_args()
+    if args.db_url:
+        # Before anything imports core.database
+        os.environ["DATABASE_URL"] = args.db_url
+    bench_engine(args)
+    if args.db_url:
+        asyncio.run(bench_db(args))
@@ -0,0 +1,175 @@
+"""
+Incremental safety re-evaluation after allergy and medication changes.
+
+Seeds a synthetic population (one patient per encounter plus extra
+encounters for some patients) into a database, stores findings with a full
+run_audit, then applies a batch of changes: relevant allergies added,
+irrelevant ones added, allergies removed and antibiotics added to
+encounters. reevaluate() is run for just the touched patients and
+encounters and the script checks that:
+
+- exactly the touched encounters whose rule-visible facts changed were
+  recomputed (those with a rule-visible med before or after the change);
+- the stored findings afterwards equal a from-scratch evaluation of the
+  whole population;
+- a second pass over the same touches, with nothing changed, recomputes
+  nothing.
+
+It also drives a few changes through the HTTP endpoints to exercise the
+background worker. Timings are compared with a full audit pass.
+
+Run from backend/:  python -m benchmarks.bench_safety_incremental --encounters 50000
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timezone
+
+from benchmarks.bench_safety_audit import synthetic_population, OTHER_MEDS
+
+
+async def main(args: argparse.Namespace) -> None:
+    from sqlalchemy import insert, delete, select, func
+    from httpx import AsyncClient, ASGITransport
+    from core.database import engine, Base, AsyncSessionLocal
+    from models import Patient, Encounter, Medication, Allergy, SafetyFinding
+    from services.rule_engine import rule_engine
+    from services.safety_audit import audit_plan, run_audit, load_facts
+    from services.safety_reevaluation import reevaluate, safety_reevaluator
+
+    engine.echo = False
+    rng = random.Random(args.seed)
+    plan = audit_plan(rule_engine.current)
+    antibiotics = [d for d in plan.drug_names if d not in OTHER_MEDS]
+    n = args.encounters
+    patients = max(1, int(n * 0.8))
+    meds, allergies = synthetic_population(n, args.seed, antibiotics, plan.allergen_names)
+    # First `patients` encounters get their own patient, the rest are repeat visits
+    owner = [i + 1 if i < patients else rng.randint(1, patients) for i in range(n)]
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as db:
+        now = datetime.now(timezone.utc)
+        await db.execute(insert(Patient), [{"id": p + 1, "first_name": "Synthetic", "last_name": str(p)} for p in range(patients)])
+        await db.execute(insert(Encounter), [
+            {"id": i + 1, "patient_id": owner[i], "encounter_type": "outpatient", "status": "active", "encounter_date": now}
+            for i in range(n)
+        ])
+        await db.execute(insert(Medication), [{"encounter_id": i + 1, "generic_name": m} for i, ms in enumerate(meds) for m in ms])
+        # Allergies belong to the patient; use the patient's own encounter's list
+        await db.execute(insert(Allergy), [
+            {"patient_id": i + 1, "allergen": a, "is_active": True} for i in range(patients) for a in allergies[i]
+        ])
+        await db.commit()
+
+        t0 = time.perf_counter()
+        report = await run_audit(db)
+        full_ms = (time.perf_counter() - t0) * 1000
+        print(f"population: {patients} patients, {n} encounters; full audit {full_ms:.0f} ms, {report.inserted} findings stored")
+
+        async def visible_facts() -> dict:
+            """encounter id -> its rule-visible facts, None when it has no rule-visible med"""
+            rows = (await db.execute(select(Encounter.id, Encounter.patient_id).order_by(Encounter.id))).all()
+            ids, all_meds, all_allergies = await load_facts(db, rows)
+            M, L = plan.encode(all_meds, all_allergies)
+            return {e: plan.depends_on(M, L, r) if M[r].any() else None for r, e in enumerate(ids)}
+
+        before = await visible_facts()
+
+        # A batch of changes
+        touched_patients, touched_encounters = set(), set()
+        allergy_rows, med_rows = [], []
+        for _ in range(args.changes):
+            kind = rng.random()
+            if kind < 0.4:
+                p = rng.randint(1, patients)
+                allergy_rows.append({"patient_id": p, "allergen": rng.choice(plan.allergen_names + ["PCN", "sulfa"]), "is_active": True})
+                touched_patients.add(p)
+            elif kind < 0.55:
+                # Irrelevant to every rule: filtered before anything is scheduled
+                p = rng.randint(1, patients)
+                allergy_rows.append({"patient_id": p, "allergen": rng.choice(["peanuts", "latex", "shellfish"]), "is_active": True})
+                assert not safety_reevaluator.allergy_changed(p, allergy_rows[-1]["allergen"])
+            elif kind < 0.7:
+                p = rng.randint(1, patients)
+                await db.execute(delete(Allergy).where(Allergy.patient_id == p))
+                touched_patients.add(p)
+            else:
+                e = rng.randint(1, n)
+                med_rows.append({"encounter_id": e, "generic_name": rng.choice(antibiotics)})
+                touched_encounters.add(e)
+        if allergy_rows:
+            await db.execute(insert(Allergy), allergy_rows)
+        if med_rows:
+            await db.execute(insert(Medication), med_rows)
+        await db.commit()
+        safety_reevaluator.skipped_irrelevant = 0
+
+        t0 = time.perf_counter()
+        report = await reevaluate(db, touched_patients, touched_encounters)
+        incr_ms = (time.perf_counter() - t0) * 1000
+        affected = (await db.execute(
+            select(func.count()).select_from(Encounter).where(
+                (Encounter.patient_id.in_(touched_patients)) | (Encounter.id.in_(touched_encounters))
+            )
+        )).scalar_one()
+        print(f"changes: {args.changes} ({len(touched_patients)} patients, {len(touched_encounters)} encounters touched, "
+              f"{affected} affected encounters)")
+        print(f"reevaluate: {report.encounters} loaded, {report.recomputed} recomputed, {report.unchanged} unchanged; "
+              f"+{report.inserted} ~{report.updated} -{report.deleted} in {incr_ms:.1f} ms "
+              f"({full_ms / max(incr_ms, 1e-3):.0f}x faster than the full audit)")
+        after = await visible_facts()
+        touched = [e for e, p in enumerate(owner, 1) if p in touched_patients or e in touched_encounters]
+        changed = sum(1 for e in touched if (before[e] or after[e]) and before[e] != after[e])
+        print(f"touched encounters whose rule-visible facts changed: {changed}")
+        assert report.encounters == affected
+        assert report.recomputed == changed, (report.recomputed, changed)
+
+        # Stored state must equal a from-scratch evaluation
+        rows = (await db.execute(select(Encounter.id, Encounter.patient_id).order_by(Encounter.id))).all()
+        ids, all_meds, all_allergies = await load_facts(db, rows)
+        M, L = plan.encode(all_meds, all_allergies)
+        expected = {(ids[r], f.id, f.title[:100]) for r, fs in plan.evaluate(M, L).items() for f in fs}
+        stored = {(r.encounter_id, r.finding_id, r.title) for r in (await db.execute(
+            select(SafetyFinding.encounter_id, SafetyFinding.finding_id, SafetyFinding.title)
+        )).all()}
+        print(f"stored vs from-scratch: {len(expected ^ stored)} differences")
+        assert expected == stored
+
+        report = await reevaluate(db, touched_patients, touched_encounters)
+        print(f"second pass over the same touches: {report.recomputed} recomputed, {report.unchanged} unchanged, "
+              f"+{report.inserted} ~{report.updated} -{report.deleted}")
+        assert report.recomputed == report.inserted == report.updated == report.deleted == 0
+
+    # Through the API: one relevant allergy, one irrelevant one, and an antibiotic
+    from app import app
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        r = await client.post("/patients/1/allergies", json={"allergen": "penicillin"})
+        assert r.status_code == 200, r.text
+        await client.post("/patients/1/allergies", json={"allergen": "peanuts"})
+        r = await client.post("/encounters/1/medications", json={"generic_name": "Augmentin"})
+        assert r.status_code == 200, r.text
+        await safety_reevaluator.drain()
+        stats = (await client.get("/metrics")).json()["safety_reevaluation"]
+        print(f"API path: {stats['scheduled']} scheduled, {stats['skipped_irrelevant']} skipped as irrelevant, "
+              f"{stats['passes']} background passes, {stats['recomputed']} recomputed, +{stats['inserted']}")
+    async with AsyncSessionLocal() as db:
+        titles = (await db.execute(select(SafetyFinding.title).where(SafetyFinding.encounter_id == 1))).scalars().all()
+        print(f"encounter 1 findings: {titles}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--encounters", type=int, default=50000)
+    parser.add_argument("--changes", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--db-url", default="sqlite+aiosqlite:////tmp/safety_incremental.db")
+    args = parser.parse_args()
+    # Before anything imports core.database
+    os.environ["DATABASE_URL"] = args.db_url
+    asyncio.run(main(args))
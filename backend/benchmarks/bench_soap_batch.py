@@ -0,0 +1,55 @@
+"""
+Throughput of batch SOAP extraction against the stub LLM.
+
+Extracts --items distinct transcripts through extract_soap_notes_batch at
+several concurrency limits and reports items/s, wall time and the peak
+number of requests the stub saw in flight. Concurrency 1 is the
+one-request-at-a-time baseline.
+
+Run from backend/:  python -m benchmarks.bench_soap_batch
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.stub_llm import StubLLMServer
+
+
+async def main(args: argparse.Namespace) -> None:
+    os.environ["SOAP_CACHE_PERSISTENT"] = "false"
+    # Measure the batch path, not our own quota throttle (override to see its effect)
+    os.environ.setdefault("LLM_REQUESTS_PER_MIN", "0")
+    os.environ.setdefault("LLM_TOKENS_PER_MIN", "0")
+    os.environ["SOAP_BATCH_MAX_CONCURRENCY"] = str(max(args.concurrency))
+    from services import llm_gateway
+    from services.soap_batch import extract_soap_notes_batch
+
+    with StubLLMServer(latency_s=args.latency_ms / 1000) as stub:
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["OPENAI_BASE_URL"] = stub.base_url
+        llm_gateway.set_client(None)
+
+        print(f"items={args.items} stub latency={args.latency_ms}ms")
+        print(f"{'concurrency':>12}{'wall s':>9}{'items/s':>10}{'failed':>8}{'peak':>6}")
+        for run, concurrency in enumerate(args.concurrency):
+            # Fresh transcripts per run so the cache doesn't serve earlier results
+            transcripts = [
+                f"Doctor: What brings you in today? (run {run} item {i})\nPatient: A cough for three days."
+                for i in range(args.items)
+            ]
+            stub.max_in_flight = 0
+            start = time.perf_counter()
+            outcomes = await extract_soap_notes_batch(transcripts, concurrency=concurrency)
+            wall = time.perf_counter() - start
+            failed = sum(1 for o in outcomes if o.error is not None)
+            print(f"{concurrency:>12}{wall:>9.2f}{args.items / wall:>10.1f}{failed:>8}{stub.max_in_flight:>6}")
+        await llm_gateway.close_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64])
+    asyncio.run(main(parser.parse_args()))
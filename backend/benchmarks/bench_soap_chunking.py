@@ -0,0 +1,94 @@
+"""
+End-to-end SOAP extraction latency against transcript length, single prompt
+vs map-reduce chunking.
+
+The stub's latency follows a simple model of a hosted LLM:
+    base + prompt_tokens / prefill_rate + completion_tokens / decode_rate
+with completion_tokens taken as half of max_tokens. Single-prompt calls whose
+modeled latency exceeds the 20 s request timeout are reported as timeouts,
+which is what happens in production.
+
+Run from backend/:  python -m benchmarks.bench_soap_chunking
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.stub_llm import StubLLMServer
+
+TURNS = [
+    "Doctor: How has the cough been since we last spoke, and have you noticed any blood or coloured sputum?",
+    "Patient: It is worse at night and the sputum is greenish, no blood, and I get short of breath climbing stairs.",
+    "Doctor: Any fevers, chills, night sweats or weight loss over the past weeks? Any sick contacts at home?",
+    "Patient: Fevers on and off, around 38.4 at home, my son had a cold last week but nothing else.",
+    "Doctor: Your saturation is 94 percent, respiratory rate 22, and I hear crackles at the right base.",
+    "Doctor: I'd like a chest x-ray and a full blood count, and we'll start amoxicillin 500 mg three times daily.",
+]
+
+
+def make_transcript(target_tokens: int) -> str:
+    lines, size, i = [], 0, 0
+    while size < target_tokens:
+        line = TURNS[i % len(TURNS)]
+        lines.append(line)
+        size += len(line) // 4 + 1
+        i += 1
+    return "\n".join(lines)
+
+
+def latency_model(args: argparse.Namespace):
+    def fn(body: dict) -> float:
+        prompt_chars = sum(len(m.get("content") or "") for m in body.get("messages", []))
+        completion_tokens = body.get("max_tokens", 300) / 2
+        return args.base_ms / 1000 + (prompt_chars / 4) / args.prefill_tps + completion_tokens / args.decode_tps
+    return fn
+
+
+async def main(args: argparse.Namespace) -> None:
+    # Measure the model, not our own tokens/min throttle
+    os.environ.setdefault("LLM_TOKENS_PER_MIN", "0")
+    from services import llm_gateway
+    from services.llm_errors import LLMTimeoutError
+    from services.soap_chunking import extract_chunked, chunk_transcript
+    from services.soap_extractor import _extract_with_llm, _complete_soap
+
+    with StubLLMServer(latency_fn=latency_model(args)) as stub:
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["OPENAI_BASE_URL"] = stub.base_url
+        os.environ["SOAP_CHUNK_TOKENS"] = str(args.chunk_tokens)
+        os.environ["SOAP_CHUNK_CONCURRENCY"] = str(args.concurrency)
+        llm_gateway.set_client(None)
+
+        print(f"model: base={args.base_ms}ms prefill={args.prefill_tps} tok/s decode={args.decode_tps} tok/s; "
+              f"chunk={args.chunk_tokens} tokens x{args.concurrency} parallel")
+        print(f"{'tokens':>8}{'chunks':>8}{'single s':>11}{'chunked s':>11}")
+        for tokens in args.lengths:
+            transcript = make_transcript(tokens)
+
+            start = time.perf_counter()
+            try:
+                await _extract_with_llm(transcript)
+                single = f"{time.perf_counter() - start:.2f}"
+            except LLMTimeoutError:
+                single = "timeout"
+
+            start = time.perf_counter()
+            await extract_chunked(transcript, _complete_soap)
+            chunked = time.perf_counter() - start
+
+            n_chunks = len(chunk_transcript(transcript, args.chunk_tokens))
+            print(f"{tokens:>8}{n_chunks:>8}{single:>11}{chunked:>11.2f}")
+
+        await llm_gateway.close_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[1000, 4000, 8000, 16000, 32000, 64000])
+    parser.add_argument("--chunk-tokens", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--base-ms", type=float, default=150)
+    parser.add_argument("--prefill-tps", type=float, default=2500)
+    parser.add_argument("--decode-tps", type=float, default=100)
+    asyncio.run(main(parser.parse_args()))
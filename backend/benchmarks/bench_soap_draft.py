@@ -0,0 +1,219 @@
+"""
+Live SOAP draft vs cold extraction at session end.
+
+Plays consults of several lengths as streams of final segments (one
+speaker turn each, ~2.5 words/s, with pauses), at --speed times real time,
+into a SoapDraft updating every SOAP_DRAFT_EVERY_S of speech. At the end of
+each consult it measures:
+
+- final note latency: end of session -> final soap_draft, i.e. the update
+  in flight (if any) plus folding in the last few seconds of transcript;
+- cold extraction latency: extract_soap_note over the whole transcript,
+  which is what a note costs today once the session ends (map-reduce
+  chunking for long consults);
+- LLM calls and prompt/completion tokens of each approach. The draft sends
+  more tokens in total (the draft is re-sent with every update); they are
+  spent while the consult is still going on.
+
+A last run plays the first consult with every draft update failing (the
+LLM is down and there is no manual fallback) and checks that the draft
+backs off: at most one attempt per segment, and the session still ends
+with a SOAP_DRAFT_ERROR.
+
+The stub's latency follows the model of bench_soap_chunking,
+    base + prompt_tokens / prefill_rate + completion_tokens / decode_rate,
+with completion_tokens taken from the actual response: full extractions
+write every field, draft updates write only the fields the new transcript
+touches (null for the rest). Latencies run --speed times faster like the
+audio and are reported scaled back to real time.
+
+Run from backend/:  python -m benchmarks.bench_soap_draft --minutes 5 15 30
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+from benchmarks.bench_soap_chunking import TURNS
+from benchmarks.stub_llm import StubLLMServer
+
+# Which note sections a turn feeds, by keyword
+_SECTIONS = (
+    ("subjective", ("Patient:",)),
+    ("objective", ("saturation", "crackles", "rate")),
+    ("assessment", ("x-ray", "amoxicillin", "crackles")),
+    ("plan", ("x-ray", "amoxicillin", "start")),
+)
+
+
+def consult(minutes: float, seed: int) -> list:
+    """(text, start_ms, end_ms) final segments"""
+    rng = random.Random(seed)
+    segments, t = [], rng.uniform(500, 2000)
+    while t < minutes * 60000:
+        text = rng.choice(TURNS)
+        length = len(text.split()) / 2.5 * 1000
+        segments.append((text, t, t + length))
+        t += length + rng.uniform(500, 3000)
+    return segments
+
+
+class Responder:
+    """Deterministic responses sized like a real model's; counts tokens"""
+
+    def __init__(self):
+        self.calls = self.prompt_tokens = self.completion_tokens = 0
+
+    def content(self, body: dict) -> str:
+        user = next(m["content"] for m in body["messages"] if m["role"] == "user")
+        name = body["response_format"]["json_schema"]["name"]
+        cap = body.get("max_tokens", 300) * 4
+        if name == "soap_note_update":
+            delta = user.split("New transcript:\n", 1)[1]
+            fields = {f: (f"Updated {f}: " + delta[:220]) if any(k in delta for k in keys) else None
+                      for f, keys in _SECTIONS}
+        else:
+            # A full note grows with the transcript up to max_tokens
+            size = min(cap // 4, 60 + len(user) // 30)
+            fields = {f: (f"{f}: " + user * 2)[:size] for f, _ in _SECTIONS}
+        return json.dumps(fields)
+
+    def __call__(self, body: dict) -> str:
+        content = self.content(body)
+        self.calls += 1
+        self.prompt_tokens += sum(len(m["content"]) for m in body["messages"]) // 4
+        self.completion_tokens += len(content) // 4
+        return content
+
+    def counts(self) -> tuple:
+        return self.calls, self.prompt_tokens, self.completion_tokens
+
+
+def latency_model(args: argparse.Namespace, responder: Responder):
+    def fn(body: dict) -> float:
+        prompt_tokens = sum(len(m.get("content") or "") for m in body.get("messages", [])) / 4
+        completion_tokens = len(responder.content(body)) / 4
+        seconds = args.base_ms / 1000 + prompt_tokens / args.prefill_tps + completion_tokens / args.decode_tps
+        return seconds / args.speed
+    return fn
+
+
+async def live(segments: list, speed: float) -> dict:
+    from services.soap_draft import SoapDraft
+
+    drafts = []
+
+    async def send(message):
+        drafts.append((time.perf_counter(), message))
+
+    draft = SoapDraft("bench", send, float(os.getenv("SOAP_DRAFT_EVERY_S", "30")) * 1000)
+    start = time.perf_counter()
+    for text, start_ms, end_ms in segments:
+        delay = start + end_ms / 1000 / speed - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        draft.add(text, start_ms, end_ms)
+    t0 = time.perf_counter()
+    await draft.finish()
+    final_s = (time.perf_counter() - t0) * speed
+    # How far behind the conversation the client's draft was when each update landed
+    behind = [((at - start) * speed * 1000 - m["throughMs"]) / 1000 for at, m in drafts if not m["final"]]
+    return {"final_s": final_s, "updates": len(drafts), "behind_s": max(behind) if behind else 0.0,
+            "final": drafts[-1][1] if drafts else None}
+
+
+async def llm_down(segments: list, speed: float) -> dict:
+    from services import soap_draft
+
+    calls = 0
+
+    async def failing_update(draft, delta, transcript):
+        nonlocal calls
+        calls += 1
+        raise RuntimeError("LLM unavailable")
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    update = soap_draft.update_soap_note
+    soap_draft.update_soap_note = failing_update
+    try:
+        draft = soap_draft.create_draft("bench-down", send)
+        start = time.perf_counter()
+        for text, start_ms, end_ms in segments:
+            delay = start + end_ms / 1000 / speed - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            draft.add(text, start_ms, end_ms)
+        await draft.finish()
+        await draft.close()
+    finally:
+        soap_draft.update_soap_note = update
+    return {"calls": calls, "failures": draft.failures, "messages": messages}
+
+
+async def main(args: argparse.Namespace) -> None:
+    os.environ.setdefault("LLM_TOKENS_PER_MIN", "0")
+    os.environ["SOAP_DRAFT_EVERY_S"] = str(args.every_s)
+    from services import llm_gateway
+    from services.soap_cache import soap_cache
+    from services.soap_extractor import extract_soap_note
+
+    # Memory tier only, and cleared between runs: both paths start cold
+    soap_cache.persistent = False
+    responder = Responder()
+    with StubLLMServer(responder=responder, latency_fn=latency_model(args, responder)) as stub:
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["OPENAI_BASE_URL"] = stub.base_url
+        llm_gateway.set_client(None)
+        # First request pays for client and connection setup
+        await extract_soap_note("Doctor: Warm-up.")
+
+        print(f"model: base={args.base_ms}ms prefill={args.prefill_tps} tok/s decode={args.decode_tps} tok/s; "
+              f"draft every {args.every_s:g} s of speech; played at {args.speed:g}x real time")
+        print(f"{'consult':>8} {'segments':>9} {'cold end->note':>15} {'calls':>6} {'tokens in/out':>14}"
+              f" {'draft end->note':>16} {'updates':>8} {'max behind':>11} {'tokens in/out':>14}")
+        for minutes in args.minutes:
+            segments = consult(minutes, args.seed)
+            transcript = "\n".join(text for text, _, _ in segments)
+
+            soap_cache._entries.clear()
+            before = responder.counts()
+            t0 = time.perf_counter()
+            await extract_soap_note(transcript)
+            cold_s = (time.perf_counter() - t0) * args.speed
+            cold = [a - b for a, b in zip(responder.counts(), before)]
+
+            soap_cache._entries.clear()
+            before = responder.counts()
+            r = await live(segments, args.speed)
+            drafted = [a - b for a, b in zip(responder.counts(), before)]
+            assert r["final"] and r["final"]["final"] and r["final"]["segments"] == len(segments)
+
+            print(f"{minutes:>6g} m {len(segments):>9} {cold_s:>13.2f} s {cold[0]:>6} {cold[1]:>7}/{cold[2]:<6}"
+                  f" {r['final_s']:>14.2f} s {r['updates']:>8} {r['behind_s']:>9.1f} s {drafted[1]:>7}/{drafted[2]:<6}")
+
+        segments = consult(args.minutes[0], args.seed)
+        down = await llm_down(segments, args.speed)
+        assert down["calls"] == down["failures"] <= len(segments), down["calls"]
+        assert [m["type"] for m in down["messages"]] == ["error"], down["messages"]
+        print(f"LLM down, {args.minutes[0]:g} m consult: {down['calls']} update attempts for {len(segments)} segments, "
+              f"ended with {down['messages'][0]['code']}")
+
+        await llm_gateway.close_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, nargs="+", default=[5, 15, 30])
+    parser.add_argument("--every-s", type=float, default=30)
+    parser.add_argument("--speed", type=float, default=60)
+    parser.add_argument("--base-ms", type=float, default=150)
+    parser.add_argument("--prefill-tps", type=float, default=2500)
+    parser.add_argument("--decode-tps", type=float, default=100)
+    parser.add_argument("--seed", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,127 @@
+"""
+Transcript -> SOAP -> meds -> rules, separate vs combined extraction.
+
+Replays the flow soap_extraction.py exercises (extract_soap_note, then
+extract_meds_from_text on the plan, then analyze_antibiotics) against the
+stub LLM server, once with the SOAP and meds extractions as two serialized
+calls and once with SOAP_EXTRACT_MEDS=true, where one schema-validated call
+returns both and the meds step reuses its list. Each encounter gets a
+unique transcript so the SOAP cache never hits. Reported per mode: end to
+end latency and LLM calls per encounter.
+
+MEDS_EXTRACTOR_IMPL=llm is the two-round-trip baseline; with the default
+hybrid extractor the lexicon already resolves plans it is confident about,
+so the saving there depends on how often it has to ask the LLM
+(--unknown-rate injects plans it cannot resolve).
+
+Run from backend/:  python -m benchmarks.bench_soap_meds --encounters 40 --latency 0.4
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+
+from benchmarks.stub_llm import StubLLMServer
+
+TRANSCRIPT = """
+Doctor: Good morning, how are you feeling today?
+Patient: I've been having a really bad cough for the past week, and I'm having trouble breathing.
+Doctor: Any fever or chest pain?
+Patient: Yes, I've had a fever of 101F and my chest hurts when I cough.
+Doctor: I can hear some crackling sounds. It looks like you have pneumonia. I'm going to start you on
+ceftriaxone 1g IV daily for 7 days, and also azithromycin 500mg daily for atypical coverage.
+Doctor: Come back in 3 days for a follow-up. (visit {n})
+"""
+PLAN = "Start ceftriaxone 1g IV daily for 7 days and azithromycin 500mg daily. Follow up in 3 days."
+# Not in the lexicon, so hybrid extraction has to ask the LLM
+UNKNOWN_PLAN = "Start ceftriaxone 1g IV daily and zorbamycin 250mg daily. Follow up in 3 days."
+
+
+def make_responder(plans: dict):
+    def responder(body: dict) -> str:
+        messages = body.get("messages", [])
+        system = next((m["content"] for m in messages if m["role"] == "system"), "")
+        user = messages[-1]["content"] if messages else ""
+        marker = next((m for m in plans if m in user), "")
+        plan = plans.get(marker, PLAN)
+        meds = ["ceftriaxone", "azithromycin"] if plan == PLAN else ["ceftriaxone", "zorbamycin"]
+        if "antibiotic GENERIC" in system:
+            return json.dumps({"meds": meds})
+        if "Findings JSON" in user:
+            return json.dumps({"recommendations": []})
+        note = {
+            "subjective": "Cough for one week with fever and pleuritic chest pain.",
+            "objective": "Crackles on auscultation; temperature 101F.",
+            "assessment": "Community-acquired pneumonia.",
+            # Unique per encounter, like real plans, so nothing is reused across encounters
+            "plan": f"{plan} {marker}",
+        }
+        fmt = ((body.get("response_format") or {}).get("json_schema") or {}).get("name")
+        if fmt == "soap_note_with_meds":
+            note["meds"] = meds
+        return json.dumps(note)
+    return responder
+
+
+async def run_mode(args: argparse.Namespace, stub: StubLLMServer, combined: bool, offset: int) -> dict:
+    from services.soap_extractor import extract_soap_note
+    from services.antibiotic_rules import extract_meds_from_text, analyze_antibiotics
+
+    os.environ["SOAP_EXTRACT_MEDS"] = "true" if combined else "false"
+    latencies = []
+    calls_before = stub.requests_served
+    for i in range(args.encounters):
+        transcript = TRANSCRIPT.format(n=offset + i)
+        start = time.perf_counter()
+        note = await extract_soap_note(transcript)
+        meds = await extract_meds_from_text(note.plan)
+        result = await analyze_antibiotics(meds=meds, allergies=["penicillin"], plan_text=note.plan)
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert result["findings"]["findings"], "expected a cross-reactivity finding for ceftriaxone"
+    return {
+        "p50": statistics.median(latencies),
+        "mean": statistics.fmean(latencies),
+        "calls": (stub.requests_served - calls_before) / args.encounters,
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    from services import llm_gateway
+
+    rng = random.Random(args.seed)
+    # Marker in the transcript -> plan the stub puts in the note
+    total = 2 * args.encounters * len(args.meds_impl)
+    plans = {f"(visit {n})": (UNKNOWN_PLAN if rng.random() < args.unknown_rate else PLAN) for n in range(total)}
+    stub = StubLLMServer(latency_s=args.latency, responder=make_responder(plans)).start()
+    os.environ["OPENAI_API_KEY"] = "stub"
+    os.environ["OPENAI_BASE_URL"] = stub.base_url
+    llm_gateway.set_client(None)
+    try:
+        for k, impl in enumerate(args.meds_impl):
+            os.environ["MEDS_EXTRACTOR_IMPL"] = impl
+            offset = 2 * k * args.encounters
+            separate = await run_mode(args, stub, combined=False, offset=offset)
+            combined = await run_mode(args, stub, combined=True, offset=offset + args.encounters)
+            print(f"MEDS_EXTRACTOR_IMPL={impl} ({args.encounters} encounters, {args.latency * 1000:.0f} ms per LLM call)")
+            for label, r in (("separate", separate), ("combined", combined)):
+                print(f"  {label:<9} p50={r['p50']:7.1f} ms  mean={r['mean']:7.1f} ms  LLM calls/encounter={r['calls']:.2f}")
+            print(f"  end-to-end reduction: {(1 - combined['mean'] / separate['mean']) * 100:.0f}% (mean)")
+    finally:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--encounters", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.4, help="Stub LLM latency per call (s)")
+    parser.add_argument("--unknown-rate", type=float, default=0.3, help="Share of plans the lexicon cannot resolve")
+    parser.add_argument("--meds-impl", nargs="+", default=["llm", "hybrid"])
+    parser.add_argument("--seed", type=int, default=5)
+    args = parser.parse_args()
+    # Measure extraction, not the cache
+    os.environ.setdefault("SOAP_CACHE_PERSISTENT", "false")
+    os.environ.setdefault("RECOMMENDATION_STORE_PERSISTENT", "false")
+    asyncio.run(main(args))
@@ -0,0 +1,93 @@
+"""
+Time to first content for streamed vs blocking SOAP extraction.
+
+The stub sends its first token after --ttft-ms and then one ~4-character
+token per 1/--decode-tps seconds, returning a note of realistic length.
+Reports p50/p95 of time-to-first-delta and time-to-final-note for the
+streaming path against total latency of the blocking path.
+
+Run from backend/:  python -m benchmarks.bench_soap_stream
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+from benchmarks.stub_llm import StubLLMServer
+
+NOTE = {
+    "subjective": "Three-day history of productive cough with greenish sputum, fevers up to 38.4 C at home, "
+                  "night-time worsening and exertional breathlessness. No haemoptysis. Son recently had a cold.",
+    "objective": "SpO2 94% on room air, respiratory rate 22, crackles at the right lung base. "
+                 "No other examination findings recorded.",
+    "assessment": "Suspected right lower lobe community-acquired pneumonia, clinically stable for outpatient care.",
+    "plan": "Chest x-ray and full blood count. Start amoxicillin 500 mg three times daily for five days. "
+            "Safety-net advice given; review in 48 hours or sooner if breathing worsens.",
+}
+
+
+def _responder(body: dict) -> str:
+    return json.dumps(NOTE)
+
+
+def _pct(values, q):
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1] if len(values) > 1 else values[0]
+
+
+async def main(args: argparse.Namespace) -> None:
+    os.environ["SOAP_CACHE_PERSISTENT"] = "false"
+    from services import llm_gateway
+    from services.soap_extractor import stream_soap_note, extract_soap_note
+
+    decode_s = (len(json.dumps(NOTE)) / 4) / args.decode_tps
+
+    def latency(body: dict) -> float:
+        # A blocking response arrives only once every token has been decoded
+        return args.ttft_ms / 1000 + (0 if body.get("stream") else decode_s)
+
+    with StubLLMServer(
+        latency_fn=latency,
+        responder=_responder,
+        stream_chunk_chars=4,
+        stream_chunk_delay_s=1 / args.decode_tps,
+    ) as stub:
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["OPENAI_BASE_URL"] = stub.base_url
+        llm_gateway.set_client(None)
+        # Warm the connection pool so the first sample isn't a handshake
+        await extract_soap_note("Doctor: warm-up request.\nPatient: ok.")
+
+        first, final, blocking = [], [], []
+        for i in range(args.requests):
+            transcript = f"Doctor: How long has the cough been going on? ({i})\nPatient: Three days, with fever."
+            start = time.perf_counter()
+            first_at = None
+            async for event, _ in stream_soap_note(transcript):
+                if first_at is None and event == "delta":
+                    first_at = time.perf_counter() - start
+            first.append(first_at * 1000)
+            final.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            await extract_soap_note(transcript.replace("Doctor:", "Clinician:"))
+            blocking.append((time.perf_counter() - start) * 1000)
+
+        print(f"ttft={args.ttft_ms}ms decode={args.decode_tps} tok/s note={len(json.dumps(NOTE))} chars, n={args.requests}")
+        print(f"{'':<28}{'p50 ms':>9}{'p95 ms':>9}")
+        for label, values in (
+            ("stream: first delta", first),
+            ("stream: final note", final),
+            ("blocking: full note", blocking),
+        ):
+            print(f"{label:<28}{_pct(values, 50):>9.0f}{_pct(values, 95):>9.0f}")
+        await llm_gateway.close_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--ttft-ms", type=float, default=250)
+    parser.add_argument("--decode-tps", type=float, default=80)
+    asyncio.run(main(parser.parse_args()))
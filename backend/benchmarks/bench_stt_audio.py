@@ -0,0 +1,181 @@
+"""
+Audio front end: decode + 48k -> 16k polyphase resample + fixed frames.
+
+Checks, then measures:
+
+- chunk invariance: a 48 kHz stream cut into random chunk sizes produces
+  exactly the samples of processing it in one piece (filter state and
+  phase carried across chunks);
+- filter response: a 1 kHz tone passes at ~0 dB, tones above the 8 kHz
+  output Nyquist are rejected;
+- per-chunk processing cost for 16 kHz and 48 kHz pcm16 at several chunk
+  sizes, and for 48 kHz the decimator alone against a reference that
+  filters at the full rate with np.convolve and keeps every third sample
+  (what the polyphase form avoids);
+- concurrent sessions end to end through SttSession, always inline
+  (STT_AUDIO_WORKERS=0), always in the worker pool, and with the default
+  inline threshold, for small and large chunks: per-chunk cost including
+  the hand-off, and event-loop responsiveness (max timer lag of a 5 ms
+  ticker running beside the sessions).
+
+Run from backend/:  python -m benchmarks.bench_stt_audio
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+import numpy as np
+
+
+def tone(freq: float, rate: int, seconds: float, amplitude: float = 0.5) -> np.ndarray:
+    t = np.arange(int(rate * seconds)) / rate
+    return (amplitude * np.sin(2 * np.pi * freq * t) * 32767).astype(np.int16)
+
+
+def speechlike(rate: int, seconds: float, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    x = rng.normal(0, 4000, int(rate * seconds))
+    return np.clip(x, -32768, 32767).astype(np.int16)
+
+
+def process_all(audio, pcm: bytes, sizes) -> np.ndarray:
+    from services.stt_audio import AudioProcessor
+
+    p = AudioProcessor(audio)
+    out, i = [], 0
+    for size in sizes:
+        out += p.process(pcm[i:i + size])
+        i += size
+    out += p.process(pcm[i:])
+    frames, real = p.flush()
+    if frames:
+        out.append(frames[0][:real])
+    return np.concatenate(out)
+
+
+def gain_db(audio, freq: float) -> float:
+    x = tone(freq, 48000, 1.0)
+    y = process_all(audio, x.tobytes(), [])[2000:-2000].astype(np.float64)
+    ref = x[6000:-6000].astype(np.float64)
+    # Floor: below about -90 dB the output rounds to int16 zeros
+    return max(-90.0, 20 * np.log10(np.sqrt(np.mean(y ** 2)) / np.sqrt(np.mean(ref ** 2)) + 1e-12))
+
+
+def naive_decimate(x: np.ndarray, h: np.ndarray) -> np.ndarray:
+    return np.convolve(x, h)[::3]
+
+
+async def session_run(chunks_per_session: list, workers: int, inline_max_ms: str) -> dict:
+    from schemas.transcription import ClientInit
+    from services import stt_audio
+    from services.stt_session import SttSession, stt_metrics
+
+    os.environ["STT_AUDIO_WORKERS"] = str(workers)
+    os.environ["STT_AUDIO_INLINE_MAX_MS"] = inline_max_ms
+    stt_metrics.audio_ms.clear()
+    stt_metrics.audio_work_ms.clear()
+    lag = []
+    stop = asyncio.Event()
+
+    async def ticker():
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lag.append((time.perf_counter() - t0 - 0.005) * 1000)
+
+    async def send(message):
+        pass
+
+    async def one(k, chunks):
+        init = ClientInit.model_validate({"type": "init", "sessionId": f"a{k}", "framing": "binary",
+                                          "audio": {"codec": "pcm16", "sampleRateHz": 48000, "channels": 1}})
+        s = SttSession(init, send)
+        s.start()
+        for seq, c in enumerate(chunks):
+            await s.audio(seq, memoryview(c))
+            # Let the ticker and other sessions interleave, like a socket would
+            await asyncio.sleep(0)
+        await s.end()
+        await s.close()
+
+    tick = asyncio.create_task(ticker())
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(k, c) for k, c in enumerate(chunks_per_session)))
+    wall = time.perf_counter() - t0
+    stop.set()
+    await tick
+    stt_audio.shutdown_audio_pool()
+    stats = stt_metrics.stats()
+    return {
+        "wall_s": wall,
+        "chunk_ms_p50": stats["audio_chunk_ms_p50"],
+        "work_ms_p50": stats["audio_work_ms_p50"],
+        "lag_ms_max": max(lag) if lag else 0.0,
+    }
+
+
+def main(args: argparse.Namespace) -> None:
+    from schemas.transcription import AudioInfo
+    from services.stt_audio import AudioProcessor, PolyphaseDecimator, lowpass_taps
+
+    a48 = AudioInfo(codec="pcm16", sampleRateHz=48000, channels=1)
+    a16 = AudioInfo(codec="pcm16", sampleRateHz=16000, channels=1)
+
+    pcm = speechlike(48000, 5.0, args.seed).tobytes()
+    whole = process_all(a48, pcm, [])
+    rng = random.Random(args.seed)
+    sizes = [rng.choice([2, 98, 960, 1922, 2880, 4800, 9601]) for _ in range(100)]
+    chunked = process_all(a48, pcm, sizes)
+    print(f"chunk invariance (48 kHz, {len(sizes)} random chunk sizes incl. odd byte counts): "
+          f"{'identical' if np.array_equal(whole, chunked) else 'DIFFERENT'} ({len(whole)} samples)")
+    print("filter response: " + ", ".join(f"{f / 1000:g} kHz {gain_db(a48, f):+.1f} dB" for f in (1000, 4000, 7000, 9000, 12000, 20000)))
+
+    print(f"{'input':<8} {'chunk':>6} {'cost us/chunk':>14} {'us per audio-s':>15} {'decimator us':>13} {'full-rate us':>13}")
+    h = lowpass_taps(3, 72)
+    for info, rate in ((a16, 16000), (a48, 48000)):
+        pcm = speechlike(rate, args.seconds, args.seed).tobytes()
+        for chunk_ms in (20, 60, 100):
+            size = int(rate * chunk_ms / 1000) * 2
+            chunks = [pcm[i:i + size] for i in range(0, len(pcm), size)]
+            p = AudioProcessor(info)
+            t0 = time.perf_counter()
+            for c in chunks:
+                p.process(c)
+            per = (time.perf_counter() - t0) / len(chunks) * 1e6
+            poly = naive = ""
+            if rate == 48000:
+                floats = [np.frombuffer(c, dtype="<i2").astype(np.float32) / 32768 for c in chunks]
+                d = PolyphaseDecimator(3)
+                t0 = time.perf_counter()
+                for f in floats:
+                    d.process(f)
+                poly = f"{(time.perf_counter() - t0) / len(chunks) * 1e6:.1f}"
+                t0 = time.perf_counter()
+                for f in floats:
+                    naive_decimate(f, h)
+                naive = f"{(time.perf_counter() - t0) / len(chunks) * 1e6:.1f}"
+            print(f"{rate // 1000:>4} kHz {chunk_ms:>4}ms {per:>14.1f} {per * 1000 / chunk_ms:>15.0f} {poly:>13} {naive:>13}")
+
+    for chunk_ms in (20, 200):
+        size = 48 * chunk_ms * 2
+        sessions = []
+        for k in range(args.sessions):
+            pcm = speechlike(48000, args.seconds, args.seed + k).tobytes()
+            sessions.append([pcm[i:i + size] for i in range(0, len(pcm), size)])
+        print(f"{args.sessions} concurrent 48 kHz sessions x {args.seconds:.0f} s, {chunk_ms} ms chunks, stub engine:")
+        for label, workers, inline_max in (("inline", 0, "60"), (f"pool({args.workers})", args.workers, "0"),
+                                           ("default", args.workers, "60")):
+            r = asyncio.run(session_run(sessions, workers, inline_max))
+            print(f"  {label:<8} per chunk {r['chunk_ms_p50'] * 1000:6.1f} us (work {r['work_ms_p50'] * 1000:5.1f} us), "
+                  f"wall {r['wall_s']:.2f} s, max event-loop lag {r['lag_ms_max']:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=7)
+    main(parser.parse_args())
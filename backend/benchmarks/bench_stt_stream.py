@@ -0,0 +1,160 @@
+"""
+Live transcription over /ws/transcribe under network jitter.
+
+Each session streams synthetic pcm16 (20 ms chunks, bursts of "speech"
+separated by digital silence) at real time through the WebSocket endpoint.
+A network model delivers the chunks with bounded reordering (each chunk is
+delayed by up to --jitter-ms), duplicates a share of them and drops
+another share. Reported:
+
+- arrival -> transcript latency percentiles (server-side, from /metrics),
+  which include the reorder buffer's wait for late chunks;
+- reorder buffer counters (reordered, duplicates, late, lost);
+- with --loss 0, whether the finals match the stub engine's output for the
+  same audio delivered in order (text and startMs/endMs), i.e. whether the
+  reorder buffer fully undid the jitter.
+
+--engine openai runs the windowed transcription engine against the stub
+LLM server's transcription endpoint instead.
+
+Run from backend/:  python -m benchmarks.bench_stt_stream --sessions 4 --seconds 10 --jitter-ms 60
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import time
+
+CHUNK_MS = 20
+RATE = 16000
+
+
+def synthetic_audio(seconds: float, seed: int) -> list:
+    """20 ms pcm16 chunks: 0.8-2 s of noise ("speech") then 0.3-0.6 s of zeros"""
+    rng = random.Random(seed)
+    chunks, t = [], 0.0
+    samples = RATE * CHUNK_MS // 1000
+    while t < seconds * 1000:
+        for _ in range(rng.randint(40, 100)):
+            chunks.append(rng.randbytes(samples * 2))
+        for _ in range(rng.randint(15, 30)):
+            chunks.append(bytes(samples * 2))
+        t = len(chunks) * CHUNK_MS
+    return chunks
+
+
+def delivery_order(n: int, jitter_ms: float, duplicate: float, loss: float, rng: random.Random) -> list:
+    """(send time ms, seq) pairs: each chunk delayed by a random 0..jitter_ms"""
+    sends = []
+    for seq in range(n):
+        if rng.random() < loss:
+            continue
+        copies = 2 if rng.random() < duplicate else 1
+        for _ in range(copies):
+            sends.append((seq * CHUNK_MS + rng.uniform(0, jitter_ms), seq))
+    return sorted(sends)
+
+
+def reference(chunks: list) -> list:
+    """Finals the stub engine produces for the same audio delivered in order"""
+    from schemas.transcription import AudioInfo
+    from services.stt_engine import StubSttEngine, AudioChunk
+
+    async def run():
+        engine = StubSttEngine(AudioInfo(codec="pcm16", sampleRateHz=RATE, channels=1),
+                               float(os.getenv("STT_SEGMENT_MAX_MS", "15000")))
+        out = []
+        for seq, data in enumerate(chunks):
+            out += [r for r in await engine.feed(AudioChunk(seq, data, seq * CHUNK_MS, (seq + 1) * CHUNK_MS, 0.0)) if r.final]
+        out += await engine.finish()
+        return [{"text": r.text, "startMs": round(r.start_ms), "endMs": round(r.end_ms)} for r in out]
+    return asyncio.run(run())
+
+
+def run_session(client, k: int, chunks: list, args: argparse.Namespace) -> dict:
+    rng = random.Random(args.seed + k)
+    sends = delivery_order(len(chunks), args.jitter_ms, args.duplicate, args.loss, rng)
+    with client.websocket_connect("/ws/transcribe") as ws:
+        ws.send_text(json.dumps({
+            "type": "init", "sessionId": f"bench-{k}",
+            "audio": {"codec": "pcm16", "sampleRateHz": RATE, "channels": 1},
+        }))
+        start = time.perf_counter()
+        for at_ms, seq in sends:
+            delay = start + at_ms / 1000 / args.speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            ws.send_text(json.dumps({"type": "audio", "seq": seq, "data": base64.b64encode(chunks[seq]).decode()}))
+        ws.send_text(json.dumps({"type": "end"}))
+        finals, partials, errors = [], 0, []
+        while True:
+            frame = ws.receive()
+            if frame["type"] == "websocket.close":
+                break
+            msg = json.loads(frame["text"])
+            if msg["type"] == "final":
+                finals += msg["segments"]
+            elif msg["type"] == "transcript":
+                partials += 1
+            elif msg["type"] == "error":
+                errors.append(msg.get("code"))
+    return {"finals": finals, "partials": partials, "errors": errors}
+
+
+def main(args: argparse.Namespace) -> None:
+    from fastapi.testclient import TestClient
+    from services import llm_gateway
+    from app import app
+
+    os.environ["STT_ENGINE_IMPL"] = args.engine
+    stub = None
+    if args.engine == "openai":
+        from benchmarks.stub_llm import StubLLMServer
+        stub = StubLLMServer(latency_s=args.llm_latency).start()
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["OPENAI_BASE_URL"] = stub.base_url
+        llm_gateway.set_client(None)
+
+    # No lifespan: the endpoint needs neither the database nor the LLM client at startup
+    client = TestClient(app)
+    try:
+        matched = 0
+        for k in range(args.sessions):
+            chunks = synthetic_audio(args.seconds, args.seed + k)
+            result = run_session(client, k, chunks, args)
+            ok = ""
+            if args.engine == "stub" and args.loss == 0:
+                same = result["finals"] == reference(chunks)
+                matched += same
+                ok = "matches in-order reference" if same else "DIFFERS from in-order reference"
+            print(f"session {k}: {len(chunks)} chunks, {len(result['finals'])} finals, {result['partials']} partials, "
+                  f"errors {sorted(set(result['errors']))} {ok}")
+        stats = client.get("/metrics").json()["stt"]
+    finally:
+        client.close()
+        if stub:
+            stub.stop()
+
+    print(f"engine={stats['engine']} jitter={args.jitter_ms:.0f} ms duplicate={args.duplicate:.0%} loss={args.loss:.0%}")
+    print(f"  chunks {stats['chunks']}: reordered {stats['reordered']}, duplicates {stats['duplicates']}, "
+          f"late {stats['late']}, lost {stats['lost']}")
+    print(f"  arrival -> transcript latency p50 {stats['latency_ms_p50']:.2f} ms, p95 {stats['latency_ms_p95']:.2f} ms, "
+          f"p99 {stats['latency_ms_p99']:.2f} ms; engine p50 {stats['engine_ms_p50']:.3f} ms")
+    if args.engine == "stub" and args.loss == 0:
+        print(f"  {matched}/{args.sessions} sessions identical to in-order delivery")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--jitter-ms", type=float, default=60)
+    parser.add_argument("--duplicate", type=float, default=0.02)
+    parser.add_argument("--loss", type=float, default=0.0)
+    parser.add_argument("--speed", type=float, default=1.0, help="Playback speed multiplier (2 = twice real time)")
+    parser.add_argument("--engine", choices=["stub", "openai"], default="stub")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Stub transcription latency (s), openai engine only")
+    parser.add_argument("--seed", type=int, default=3)
+    main(parser.parse_args())
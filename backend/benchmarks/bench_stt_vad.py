@@ -0,0 +1,184 @@
+"""
+Voice activity detection on live sessions: audio skipped and latency.
+
+Synthesizes consult-like audio with ground truth: utterances of voiced
+"speech" (harmonics of a 100-250 Hz pitch under a syllable-rate envelope,
+with fricative noise bursts), separated by short pauses and long exam
+pauses, all over room noise (broadband hiss and mains hum around -50 dBFS)
+with occasional rustle/click transients. Each session is streamed at
+--speed times real time straight into SttSession, once per STT_VAD_MODE
+(off, mark, drop). Reported per mode:
+
+- share of the audio never sent to the engine, and how much of the true
+  speech still reached it (speech kept) or was clipped;
+- frames fed to the engine and, with --engine openai (stub transcription
+  server, --llm-latency per request), transcription requests and audio
+  uploaded;
+- end-to-end latency from the end of each utterance to the first
+  ServerFinal covering it, in audio-time ms (wall time x --speed). With
+  the VAD off, nothing in room noise tells the engine a segment is over,
+  so finals wait for segment_max_ms.
+
+Run from backend/:  python -m benchmarks.bench_stt_vad --sessions 2 --seconds 120 --speed 10
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import numpy as np
+
+RATE = 16000
+CHUNK_MS = 20
+
+
+def consult_audio(seconds: float, seed: int):
+    """pcm16 16 kHz chunks and the [(start_ms, end_ms)] of every utterance"""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * RATE)
+    t = np.arange(n) / RATE
+    x = rng.normal(0, 10 ** (-52 / 20), n) + 10 ** (-56 / 20) * np.sin(2 * np.pi * 60 * t)
+    utterances = []
+    pos = int(rng.uniform(0.5, 2.0) * RATE)
+    while pos < n:
+        length = int(rng.uniform(0.6, 5.0) * RATE)
+        seg = slice(pos, min(n, pos + length))
+        ts = t[seg] - t[pos]
+        pitch = rng.uniform(100, 250) * (1 + 0.1 * np.sin(2 * np.pi * rng.uniform(0.5, 2) * ts))
+        phase = 2 * np.pi * np.cumsum(pitch) / RATE
+        voiced = sum(np.sin(k * phase) / k for k in range(1, 8))
+        # Syllables at ~4 Hz, never fully silent within an utterance
+        envelope = 0.35 + 0.65 * np.abs(np.sin(np.pi * rng.uniform(3, 5) * ts + rng.uniform(0, np.pi)))
+        speech = 10 ** (rng.uniform(-26, -18) / 20) * voiced * envelope / 1.5
+        for _ in range(int(len(ts) / RATE * 1.5)):
+            at = rng.integers(0, max(1, len(ts) - 1600))
+            speech[at:at + 1600] += rng.normal(0, 10 ** (-34 / 20), len(speech[at:at + 1600]))
+        x[seg] += speech
+        utterances.append((pos * 1000 / RATE, seg.stop * 1000 / RATE))
+        pause = rng.uniform(5, 20) if rng.random() < 0.15 else rng.uniform(0.4, 2.5)
+        pos = seg.stop + int(pause * RATE)
+    for _ in range(int(seconds / 10)):
+        at = rng.integers(0, n - 800)
+        x[at:at + 800] += rng.normal(0, 10 ** (-30 / 20), 800) * np.hanning(800)
+    pcm = np.clip(np.rint(x * 32768), -32768, 32767).astype("<i2").tobytes()
+    size = RATE * CHUNK_MS // 1000 * 2
+    return [pcm[i:i + size] for i in range(0, len(pcm), size)], utterances
+
+
+async def run_session(chunks: list, utterances: list, speed: float) -> dict:
+    from schemas.transcription import ClientInit
+    from services.stt_session import SttSession
+
+    finals = []
+
+    async def send(message):
+        if message["type"] == "final":
+            now = time.perf_counter()
+            finals.extend((now, s["endMs"]) for s in message["segments"])
+
+    init = ClientInit.model_validate({"type": "init", "sessionId": "vad", "framing": "binary",
+                                      "audio": {"codec": "pcm16", "sampleRateHz": RATE, "channels": 1}})
+    session = SttSession(init, send)
+    fed = 0
+    feed = session._feed
+
+    async def counting_feed(chunk):
+        nonlocal fed
+        fed += 1
+        await feed(chunk)
+
+    session._feed = counting_feed
+    session.start()
+    start = time.perf_counter()
+    for seq, data in enumerate(chunks):
+        delay = start + seq * CHUNK_MS / 1000 / speed - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await session.audio(seq, data)
+    await session.end()
+    await session.close()
+
+    latency = []
+    for _, end_ms in utterances:
+        said = start + end_ms / 1000 / speed
+        # First final reaching the end of the utterance (finals carry 20 ms frame bounds)
+        at = next((t for t, e in finals if e >= end_ms - CHUNK_MS * 2), finals[-1][0] if finals else said)
+        latency.append(max(0.0, at - said) * 1000 * speed)
+    return {"frames": len(chunks), "fed": fed, "finals": len(finals), "latency": latency}
+
+
+async def speech_kept(chunks: list, utterances: list) -> float:
+    """Share of true speech frames the detector passes (drop mode, offline)"""
+    from services.stt_vad import StreamingVad
+
+    vad = StreamingVad()
+    kept = []
+    for i, c in enumerate(chunks):
+        kept += [item for kind, item in vad.push([i], [np.frombuffer(c, dtype="<i2")]) if kind == "feed"]
+    fed = np.zeros(len(chunks), dtype=bool)
+    fed[kept] = True
+    speech = np.zeros(len(chunks), dtype=bool)
+    for s, e in utterances:
+        speech[int(s // CHUNK_MS):int(e // CHUNK_MS)] = True
+    return float((fed & speech).sum() / max(1, speech.sum()))
+
+
+async def main(args: argparse.Namespace) -> None:
+    from services import llm_gateway, stt_engine
+
+    os.environ["STT_ENGINE_IMPL"] = args.engine
+    stub = None
+    uploaded = {"requests": 0, "bytes": 0}
+    if args.engine == "openai":
+        from benchmarks.stub_llm import StubLLMServer
+        stub = StubLLMServer(latency_s=args.llm_latency).start()
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["OPENAI_BASE_URL"] = stub.base_url
+        llm_gateway.set_client(None)
+        transcribe = stt_engine.transcribe
+
+        async def counting_transcribe(filename, audio_bytes, **kwargs):
+            uploaded["requests"] += 1
+            uploaded["bytes"] += len(audio_bytes)
+            return await transcribe(filename, audio_bytes, **kwargs)
+
+        stt_engine.transcribe = counting_transcribe
+
+    sessions = [consult_audio(args.seconds, args.seed + k) for k in range(args.sessions)]
+    total_s = args.sessions * args.seconds
+    speech_ms = sum(e - s for _, utt in sessions for s, e in utt)
+    print(f"{args.sessions} sessions x {args.seconds:.0f} s at {args.speed:g}x real time, engine={args.engine}; "
+          f"{sum(len(u) for _, u in sessions)} utterances, {speech_ms / 10 / total_s:.0f}% of the audio is speech")
+    kept = [await speech_kept(c, u) for c, u in sessions]
+    print(f"detector alone: {np.mean(kept) * 100:.1f}% of speech frames kept (incl. preroll/hangover around them)")
+    print(f"{'mode':<6} {'skipped':>8} {'fed frames':>11} {'finals':>7} {'requests':>9} {'uploaded s':>11} "
+          f"{'final lat p50':>14} {'p95':>8} {'max':>8}")
+    try:
+        for mode in ("off", "mark", "drop"):
+            os.environ["STT_VAD_MODE"] = mode
+            uploaded.update(requests=0, bytes=0)
+            results = [await run_session(c, u, args.speed) for c, u in sessions]
+            frames = sum(r["frames"] for r in results)
+            fed = sum(r["fed"] for r in results)
+            latency = sorted(x for r in results for x in r["latency"])
+            pct = lambda q: latency[min(len(latency) - 1, int(len(latency) * q))]
+            print(f"{mode:<6} {(1 - fed / frames) * 100:>7.1f}% {fed:>11} {sum(r['finals'] for r in results):>7} "
+                  f"{uploaded['requests'] if stub else '-':>9} "
+                  f"{uploaded['bytes'] / 32000 if stub else 0:>11.0f} "
+                  f"{pct(0.5):>11.0f} ms {pct(0.95):>5.0f} ms {latency[-1]:>5.0f} ms")
+    finally:
+        if stub:
+            stub.stop()
+            stt_engine.transcribe = transcribe
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=120)
+    parser.add_argument("--speed", type=float, default=10.0, help="Playback speed multiplier")
+    parser.add_argument("--engine", choices=["stub", "openai"], default="stub")
+    parser.add_argument("--llm-latency", type=float, default=0.03,
+                        help="Stub transcription latency (s, wall time: multiply by --speed for audio time)")
+    parser.add_argument("--seed", type=int, default=11)
+    asyncio.run(main(parser.parse_args()))
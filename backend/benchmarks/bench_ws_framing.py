@@ -0,0 +1,139 @@
+"""
+CPU per session-second: base64-in-JSON vs binary audio frames.
+
+Drives the /ws/transcribe ASGI endpoint in-process (no sockets, no
+client-side encoding inside the timed region: every frame is built before
+the clock starts) with S sessions of T seconds of pcm16, once with
+framing="json" and once with framing="binary", and reports server CPU
+time (process_time) per second of audio streamed, plus bytes on the wire.
+
+Two engine setups are measured:
+
+  ingest  an engine that discards audio, isolating transport cost
+          (frame parsing, JSON/base64 decode, validation, reorder buffer,
+          audio clock)
+  stub    the deterministic stub STT engine, for the end-to-end share
+
+Run from backend/:  python -m benchmarks.bench_ws_framing --sessions 20 --seconds 30 --chunk-ms 20
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import time
+
+from benchmarks.bench_stt_stream import synthetic_audio
+
+
+async def drive(app, messages: list) -> int:
+    """Run one WebSocket session through the ASGI app; returns server messages received"""
+    inbox = asyncio.Queue()
+    inbox.put_nowait({"type": "websocket.connect"})
+    for m in messages:
+        inbox.put_nowait(m)
+    received = 0
+    done = asyncio.Event()
+
+    async def receive():
+        if inbox.empty():
+            await done.wait()
+            return {"type": "websocket.disconnect", "code": 1000}
+        return inbox.get_nowait()
+
+    async def send(message):
+        nonlocal received
+        if message["type"] == "websocket.send":
+            received += 1
+        elif message["type"] == "websocket.close":
+            done.set()
+
+    scope = {
+        "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws", "http_version": "1.1",
+        "path": "/ws/transcribe", "raw_path": b"/ws/transcribe", "root_path": "", "query_string": b"",
+        "headers": [], "client": ("bench", 1), "server": ("bench", 80), "subprotocols": [],
+    }
+    await app(scope, receive, send)
+    return received
+
+
+def session_messages(k: int, framing: str, chunks: list) -> list:
+    from services.stt_frames import encode_frame, FLAG_END
+
+    init = {"type": "init", "sessionId": f"bench-{k}", "framing": framing,
+            "audio": {"codec": "pcm16", "sampleRateHz": 16000, "channels": 1}}
+    out = [{"type": "websocket.receive", "text": json.dumps(init)}]
+    if framing == "json":
+        out += [{"type": "websocket.receive", "text": json.dumps({
+            "type": "audio", "seq": seq, "data": base64.b64encode(data).decode(),
+        })} for seq, data in enumerate(chunks)]
+        out.append({"type": "websocket.receive", "text": json.dumps({"type": "end"})})
+    else:
+        out += [{"type": "websocket.receive", "bytes": encode_frame(seq, data)} for seq, data in enumerate(chunks)]
+        out.append({"type": "websocket.receive", "bytes": encode_frame(len(chunks), flags=FLAG_END)})
+    return out
+
+
+def wire_bytes(messages: list) -> int:
+    return sum(len(m.get("text", "").encode()) + len(m.get("bytes") or b"") for m in messages[1:])
+
+
+async def run(app, sessions: list, framing: str) -> dict:
+    built = [session_messages(k, framing, chunks) for k, chunks in enumerate(sessions)]
+    wire = sum(wire_bytes(m) for m in built)
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    for messages in built:
+        await drive(app, messages)
+    return {"cpu_s": time.process_time() - cpu0, "wall_s": time.perf_counter() - wall0, "wire": wire}
+
+
+async def main(args: argparse.Namespace) -> None:
+    from services import stt_session
+    from services.stt_engine import SttEngine, create_engine
+    from app import app
+
+    class DiscardEngine(SttEngine):
+        name = "discard"
+
+        async def feed(self, chunk):
+            return []
+
+        async def finish(self):
+            return []
+
+    os.environ.setdefault("STT_ENGINE_IMPL", "stub")
+    sessions = []
+    for k in range(args.sessions):
+        # Resliced to --chunk-ms
+        pcm = b"".join(synthetic_audio(args.seconds, args.seed + k))[: int(args.seconds * 32000)]
+        size = int(args.chunk_ms * 32)
+        sessions.append([pcm[i:i + size] for i in range(0, len(pcm), size)])
+    audio_s = args.sessions * args.seconds
+    print(f"{args.sessions} sessions x {args.seconds:.0f} s pcm16 16 kHz in {args.chunk_ms:.0f} ms chunks "
+          f"({len(sessions[0])} chunks per session)")
+    print(f"{'engine':<8} {'framing':<8} {'CPU ms / session-s':>19} {'wire KB / session-s':>20} {'x real time':>12}")
+    for engine in ("ingest", "stub"):
+        stt_session.create_engine = (lambda audio: DiscardEngine(audio)) if engine == "ingest" else create_engine
+        results = {}
+        for framing in ("json", "binary"):
+            # Warm-up session so imports and first-call costs are not measured
+            await run(app, sessions[:1], framing)
+            results[framing] = r = await run(app, sessions, framing)
+            print(f"{engine:<8} {framing:<8} {r['cpu_s'] / audio_s * 1000:>19.3f} {r['wire'] / audio_s / 1024:>20.1f} "
+                  f"{audio_s / r['wall_s']:>12.0f}")
+        saving = 1 - results["binary"]["cpu_s"] / results["json"]["cpu_s"]
+        print(f"{'':<8} binary saves {saving * 100:.0f}% CPU and "
+              f"{(1 - results['binary']['wire'] / results['json']['wire']) * 100:.0f}% bytes")
+    stt_session.create_engine = create_engine
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--chunk-ms", type=float, default=20)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    asyncio.run(main(args))
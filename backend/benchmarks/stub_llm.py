@@ -0,0 +1,176 @@
+"""
+Local OpenAI-compatible stub server for benchmarks.
+
+Serves /v1/chat/completions and /v1/audio/transcriptions with a configurable
+artificial latency so gateway behaviour can be measured without network or
+token costs. Streaming completions (stream=true) send the first chunk after
+the latency and then one small chunk per `stream_chunk_delay_s`. Faults (429/5xx with optional Retry-After) can be injected at a
+given rate and changed while the server runs. Runs uvicorn in a background
+thread on an ephemeral port.
+"""
+from typing import Callable, Optional
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio
+import json
+import random
+import socket
+import threading
+import time
+import uvicorn
+
+
+def _fill_schema(schema: dict) -> dict:
+    """
+    Build a deterministic object that satisfies a flat JSON schema
+    """
+    obj = {}
+    for name, prop in (schema.get("properties") or {}).items():
+        if prop.get("type") == "array":
+            obj[name] = []
+        else:
+            obj[name] = f"Stub {name}."
+    return obj
+
+
+def default_responder(body: dict) -> str:
+    """
+    Produce message content shaped like what the real model would return
+    """
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        return json.dumps(_fill_schema(response_format["json_schema"]["schema"]))
+
+    system = next((m["content"] for m in body.get("messages", []) if m["role"] == "system"), "")
+    if "antibiotic GENERIC" in system:
+        return json.dumps({"meds": []})
+    return json.dumps({"recommendations": []})
+
+
+class StubLLMServer:
+    def __init__(
+        self,
+        latency_s: float = 0.2,
+        responder: Callable[[dict], str] = default_responder,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        retry_after_s: Optional[float] = None,
+        seed: int = 0,
+        latency_fn: Optional[Callable[[dict], float]] = None,
+        stream_chunk_chars: int = 4,
+        stream_chunk_delay_s: float = 0.01,
+    ):
+        self.latency_s = latency_s
+        # Per-request latency model (e.g. proportional to prompt size); overrides latency_s
+        self.latency_fn = latency_fn
+        self.responder = responder
+        self.stream_chunk_chars = stream_chunk_chars
+        self.stream_chunk_delay_s = stream_chunk_delay_s
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after_s = retry_after_s
+        self._rng = random.Random(seed)
+        self.requests_served = 0
+        self.faults_injected = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._server: Optional[uvicorn.Server] = None
+        self._thread: Optional[threading.Thread] = None
+        self.base_url = ""
+        self.app = self._build_app()
+
+    def _fault(self) -> Optional[JSONResponse]:
+        if self.error_rate <= 0 or self._rng.random() >= self.error_rate:
+            return None
+        self.faults_injected += 1
+        headers = {"retry-after": str(self.retry_after_s)} if self.retry_after_s is not None else {}
+        return JSONResponse(
+            status_code=self.error_status,
+            content={"error": {"message": "injected fault", "type": "stub_fault", "code": None}},
+            headers=headers,
+        )
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/v1/chat/completions")
+        async def chat_completions(request: Request):
+            body = await request.json()
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+            try:
+                await asyncio.sleep(self.latency_fn(body) if self.latency_fn else self.latency_s)
+                fault = self._fault()
+                if fault is not None:
+                    return fault
+                content = self.responder(body)
+            finally:
+                self._in_flight -= 1
+            self.requests_served += 1
+            if body.get("stream"):
+                return StreamingResponse(self._stream(body, content), media_type="text/event-stream")
+            return {
+                "id": f"chatcmpl-stub-{self.requests_served}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+            }
+
+        @app.post("/v1/audio/transcriptions")
+        async def transcriptions():
+            await asyncio.sleep(self.latency_s)
+            self.requests_served += 1
+            return {"text": "Doctor: Stub transcript. Patient: Stub reply."}
+
+        return app
+
+    async def _stream(self, body: dict, content: str):
+        base = {
+            "id": f"chatcmpl-stub-{self.requests_served}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+        }
+        step = self.stream_chunk_chars
+        for i in range(0, len(content), step):
+            if i:
+                await asyncio.sleep(self.stream_chunk_delay_s)
+            chunk = {**base, "choices": [{"index": 0, "delta": {"content": content[i:i + step]}, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield f"data: {json.dumps({**base, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})}\n\n"
+        if (body.get("stream_options") or {}).get("include_usage"):
+            completion_tokens = len(content) // 4 + 1
+            usage = {"prompt_tokens": 0, "completion_tokens": completion_tokens, "total_tokens": completion_tokens}
+            yield f"data: {json.dumps({**base, 'choices': [], 'usage': usage})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    def start(self) -> "StubLLMServer":
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}/v1"
+
+        config = uvicorn.Config(self.app, log_level="warning", access_log=False)
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, kwargs={"sockets": [sock]}, daemon=True)
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> "StubLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
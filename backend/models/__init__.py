@@ -7,5 +7,8 @@ from .safety_finding import SafetyFinding
 from .recommendation import Recommendation
 from .allergy import Allergy
 from .rule_set import RuleSet
+from .soap_extraction_cache import SOAPExtractionCache
+from .antibiotic_analysis import AntibioticAnalysis
+from .recommendation_cache import RecommendationCacheEntry
 
-__all__ = ["Patient", "Encounter", "Transcript", "SOAPNoteRecord", "Medication", "SafetyFinding", "Recommendation", "Allergy", "RuleSet"]
\ No newline at end of file
+__all__ = ["Patient", "Encounter", "Transcript", "SOAPNoteRecord", "Medication", "SafetyFinding", "Recommendation", "Allergy", "RuleSet", "SOAPExtractionCache", "AntibioticAnalysis", "RecommendationCacheEntry"]
\ No newline at end of file
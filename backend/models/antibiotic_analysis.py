@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from core.database import Base
+
+class AntibioticAnalysis(Base):
+    __tablename__ = "antibiotic_analyses"
+
+    id = Column(Integer, primary_key=True, index=True)
+    encounter_id = Column(Integer, ForeignKey("encounters.id"), nullable = False, unique = True, index = True) # Latest analysis only
+    input_fingerprint = Column(String(64), nullable = False) # sha256 of normalized meds/allergies (plan text when meds were extracted)
+    rule_set_hash = Column(String(64), nullable = False)
+    rule_set_version = Column(String(50), nullable = True)
+    ontology_hash = Column(String(64), nullable = False)
+    meds = Column(JSON, nullable = False) # Resolved generic names the rules ran on
+    allergies = Column(JSON, nullable = False)
+    meds_source = Column(String(20), nullable = False) # request | plan_text
+    model_used = Column(String(50), nullable = True)
+
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # Relationships
+    encounter = relationship("Encounter", back_populates="antibiotic_analysis")
+    medications = relationship("Medication", back_populates="analysis")
+    safety_findings = relationship("SafetyFinding", back_populates="analysis")
+    recommendations = relationship("Recommendation", back_populates="analysis")
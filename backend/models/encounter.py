@@ -11,6 +11,7 @@ class Encounter(Base):
     encounter_type = Column(String(50), nullable = False)
     chief_complaint = Column(Text, nullable = True)
     status = Column(String(20), default = "active")
+    safety_fingerprint = Column(String(32), nullable = True) # Digest of the rule-relevant facts of the last safety audit, also when nothing fired
 
     # Timestamps
     encounter_date = Column(DateTime(timezone=True), nullable = False)
@@ -23,4 +24,5 @@ class Encounter(Base):
     soap_notes = relationship("SOAPNoteRecord", back_populates="encounter")
     medications = relationship("Medication", back_populates="encounter")
     safety_findings = relationship("SafetyFinding", back_populates="encounter")
-    recommendations = relationship("Recommendation", back_populates="encounter")
\ No newline at end of file
+    recommendations = relationship("Recommendation", back_populates="encounter")
+    antibiotic_analysis = relationship("AntibioticAnalysis", back_populates="encounter", uselist=False)
\ No newline at end of file
@@ -15,10 +15,12 @@ class Medication(Base):
     frequency = Column(String(50), nullable = True)
     duration = Column(String(50), nullable = True)
     source = Column(String(20), nullable = True)
+    analysis_id = Column(Integer, ForeignKey("antibiotic_analyses.id"), nullable = True, index = True) # Set when written by an antibiotic analysis
 
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Relationships
-    encounter = relationship("Encounter", back_populates="medications")
\ No newline at end of file
+    encounter = relationship("Encounter", back_populates="medications")
+    analysis = relationship("AntibioticAnalysis", back_populates="medications")
\ No newline at end of file
@@ -13,6 +13,7 @@ class Recommendation(Base):
     reason = Column(Text, nullable = False)
     alternatives = Column(JSON, nullable = True) # List of alternative medications
     model_used = Column(String(50), nullable = True)
+    analysis_id = Column(Integer, ForeignKey("antibiotic_analyses.id"), nullable = True, index = True) # Set when written by an antibiotic analysis
 
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -20,4 +21,5 @@ class Recommendation(Base):
 
     # Relationships
     encounter = relationship("Encounter", back_populates="recommendations")
-    safety_finding = relationship("SafetyFinding", back_populates="recommendations")
\ No newline at end of file
+    safety_finding = relationship("SafetyFinding", back_populates="recommendations")
+    analysis = relationship("AntibioticAnalysis", back_populates="recommendations")
\ No newline at end of file
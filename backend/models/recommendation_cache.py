@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON
+from sqlalchemy.sql import func
+from core.database import Base
+
+class RecommendationCacheEntry(Base):
+    __tablename__ = "recommendation_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String(64), nullable = False, unique = True, index = True) # sha256 of sorted finding ids + rule set version + prompt version
+    finding_ids = Column(JSON, nullable = False) # Sorted finding ids the entry covers
+    rule_set_version = Column(String(50), nullable = True)
+    recommendations = Column(JSON, nullable = False) # RuleRecommendationList.recommendations
+    model_used = Column(String(50), nullable = True)
+    prompt_version = Column(String(20), nullable = True)
+    refresh_at = Column(DateTime(timezone=True), nullable = True) # Served but refreshed in the background after this
+    expires_at = Column(DateTime(timezone=True), nullable = True) # Not served after this
+
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, JSON
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from core.database import Base
@@ -13,6 +13,8 @@ class SafetyFinding(Base):
     severity = Column(String(20), nullable = False)
     details = Column(Text, nullable = False)
     rule_set_version = Column(String(50), nullable = True)
+    analysis_id = Column(Integer, ForeignKey("antibiotic_analyses.id"), nullable = True, index = True) # Set when written by an antibiotic analysis
+    depends_on = Column(JSON, nullable = True) # Rule-relevant meds/allergies and rule set hash the finding was computed from
 
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -20,4 +22,5 @@ class SafetyFinding(Base):
 
     # Relationships
     encounter = relationship("Encounter", back_populates="safety_findings")
-    recommendations = relationship("Recommendation", back_populates="safety_finding")
\ No newline at end of file
+    recommendations = relationship("Recommendation", back_populates="safety_finding")
+    analysis = relationship("AntibioticAnalysis", back_populates="safety_findings")
\ No newline at end of file
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, JSON
+from sqlalchemy.sql import func
+from core.database import Base
+
+class SOAPExtractionCache(Base):
+    __tablename__ = "soap_extraction_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String(64), nullable = False, unique = True, index = True) # sha256 of transcript + model + prompt version + max tokens
+    subjective = Column(Text, nullable = False)
+    objective = Column(Text, nullable = False)
+    assessment = Column(Text, nullable = False)
+    plan = Column(Text, nullable = False)
+    meds = Column(JSON, nullable = True) # Antibiotics from a combined SOAP + meds extraction
+    model_used = Column(String(50), nullable = True)
+    prompt_version = Column(String(20), nullable = True)
+    expires_at = Column(DateTime(timezone=True), nullable = True)
+
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -8,11 +8,15 @@ from datetime import datetime
 from core.database import get_db
 from services.encounter_service import EncounterService
 from services.patient_service import PatientService
+from services.medication_service import MedicationService
+from services.safety_reevaluation import safety_reevaluator
 from schemas.encounter import (
     Encounter,
     EncounterCreate,
     EncounterUpdate,
     EncounterDetail,
+    MedicationCreate,
+    Medication,
 )
 
 router = APIRouter()
@@ -123,6 +127,9 @@ async def update_encounter(
         raise HTTPException(status_code=400, detail="No fields to update")
     
     updated = await encounter_service.update(db, encounter_id, **update_data)
+    if "status" in update_data:
+        # Reactivated encounters need their findings brought up to date
+        safety_reevaluator.schedule(encounter_ids=[encounter_id])
     return updated
 
 
@@ -179,3 +186,50 @@ async def get_patient_encounters(
     
     return encounters
 
+
+@router.get("/{encounter_id}/medications", response_model=List[Medication], tags=["encounters"])
+async def list_medications(
+    encounter_id: int,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Medications recorded on an encounter.
+    """
+    if not await EncounterService().get(db, encounter_id):
+        raise HTTPException(status_code=404, detail="Encounter not found")
+    return await MedicationService().get_by_encounter(db, encounter_id)
+
+
+@router.post("/{encounter_id}/medications", response_model=Medication, tags=["encounters"])
+async def add_medication(
+    encounter_id: int,
+    medication: MedicationCreate,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Record a medication. The encounter's safety findings are re-checked in
+    the background if the antibiotic rules can involve it.
+    """
+    if not await EncounterService().get(db, encounter_id):
+        raise HTTPException(status_code=404, detail="Encounter not found")
+    created = await MedicationService().create(db, encounter_id=encounter_id, source="manual", **medication.model_dump())
+    safety_reevaluator.medication_changed(encounter_id, created.generic_name)
+    return created
+
+
+@router.delete("/{encounter_id}/medications/{medication_id}", tags=["encounters"])
+async def remove_medication(
+    encounter_id: int,
+    medication_id: int,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Remove a medication; the encounter's safety findings are re-checked in the background.
+    """
+    service = MedicationService()
+    existing = await service.get(db, medication_id)
+    if not existing or existing.encounter_id != encounter_id:
+        raise HTTPException(status_code=404, detail="Medication not found")
+    await service.delete(db, medication_id)
+    safety_reevaluator.medication_changed(encounter_id, existing.generic_name)
+    return {"message": "Medication removed successfully"}
@@ -0,0 +1,33 @@
+from fastapi import APIRouter
+
+from services.soap_cache import soap_cache
+from services import single_flight
+from services import llm_resilience
+from services.llm_scheduler import llm_scheduler
+from services.antibiotic_rules import meds_extraction_stats
+from services.rule_engine import rule_engine
+from services.med_normalizer import normalizer_stats
+from services.recommendation_store import recommendation_store
+from services.safety_reevaluation import safety_reevaluator
+from services.stt_session import stt_metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics", tags=["metrics"], summary="In-process performance counters")
+async def metrics() -> dict:
+    """
+    Counters for this worker process only; each uvicorn worker reports its own
+    """
+    return {
+        "soap_cache": soap_cache.stats(),
+        "single_flight": single_flight.stats(),
+        "llm_resilience": llm_resilience.stats(),
+        "llm_scheduler": llm_scheduler.stats(),
+        "meds_extraction": meds_extraction_stats(),
+        "rule_engine": rule_engine.stats(),
+        "med_normalizer": normalizer_stats(),
+        "recommendation_store": recommendation_store.stats(),
+        "safety_reevaluation": safety_reevaluator.stats(),
+        "stt": stt_metrics.stats(),
+    }
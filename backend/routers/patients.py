@@ -5,7 +5,9 @@ from typing import List
 
 from core.database import get_db
 from services.patient_service import PatientService
-from schemas.patient import PatientCreate, PatientUpdate, Patient
+from services.allergy_service import AllergyService
+from services.safety_reevaluation import safety_reevaluator
+from schemas.patient import PatientCreate, PatientUpdate, Patient, AllergyCreate, Allergy
 
 router = APIRouter()
 
@@ -76,4 +78,48 @@ async def update_patient(
             raise HTTPException(status_code=400, detail="Medical record number already exists")
 
     updated = await service.update(db, patient_id, **patient.model_dump())
-    return updated
\ No newline at end of file
+    return updated
+
+
+@router.get("/{patient_id}/allergies", response_model=List[Allergy], tags=["patients"], summary="Active allergies for a patient")
+async def list_allergies(
+    patient_id: int,
+    db: AsyncSession = Depends(get_db),
+):
+    """List a patient's active allergies"""
+    if not await PatientService().get(db, patient_id):
+        raise HTTPException(status_code=404, detail="Patient not found")
+    return await AllergyService().get_active_by_patient(db, patient_id)
+
+
+@router.post("/{patient_id}/allergies", response_model=Allergy, tags=["patients"], summary="Record an allergy for a patient")
+async def add_allergy(
+    patient_id: int,
+    allergy: AllergyCreate,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Record an allergy. The patient's active encounters are re-checked in the
+    background if the antibiotic rules can involve this allergen.
+    """
+    if not await PatientService().get(db, patient_id):
+        raise HTTPException(status_code=404, detail="Patient not found")
+    created = await AllergyService().create(db, patient_id=patient_id, is_active=True, **allergy.model_dump())
+    safety_reevaluator.allergy_changed(patient_id, created.allergen)
+    return created
+
+
+@router.delete("/{patient_id}/allergies/{allergy_id}", tags=["patients"], summary="Remove an allergy from a patient")
+async def remove_allergy(
+    patient_id: int,
+    allergy_id: int,
+    db: AsyncSession = Depends(get_db),
+):
+    """Remove an allergy; affected encounters are re-checked in the background"""
+    service = AllergyService()
+    existing = await service.get(db, allergy_id)
+    if not existing or existing.patient_id != patient_id:
+        raise HTTPException(status_code=404, detail="Allergy not found")
+    await service.delete(db, allergy_id)
+    safety_reevaluator.allergy_changed(patient_id, existing.allergen)
+    return {"message": "Allergy removed successfully"}
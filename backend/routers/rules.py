@@ -1,6 +1,22 @@
-from fastapi import APIRouter, HTTPException
-from schemas.rules import AntibioticCheckRequest, AntibioticFindings
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import ValidationError
+
+from core.database import get_db
+from schemas.rules import (
+    AntibioticCheckRequest,
+    AntibioticFindings,
+    AntibioticAnalysisResult,
+    RuleSetCreate,
+    RuleSetInfo,
+    AuditJob,
+)
 from services.antibiotic_rules import check_antibiotics, analyze_antibiotics
+from services.rule_engine import rule_engine, compile_row
+from services.rule_set_service import RuleSetService
+from services.safety_audit import audit_jobs
+from services.antibiotic_analysis_service import AntibioticAnalysisService
+from services.encounter_service import EncounterService
 
 
 router = APIRouter()
@@ -22,6 +38,106 @@ async def antibiotics_analyze(req: AntibioticCheckRequest) -> dict:
     if len(req.meds) > 50 or len(req.allergies) > 50:
         raise HTTPException(status_code=400, detail="Too many items in meds/allergies")
 
-    return analyze_antibiotics(req.meds, req.allergies, req.planText)
+    return await analyze_antibiotics(req.meds, req.allergies, req.planText)
+
+
+@router.post(
+    "/encounters/{encounter_id}/antibiotics",
+    response_model=AntibioticAnalysisResult,
+    tags=["rules"],
+    summary="Analyze antibiotics for an encounter, reusing the stored result when inputs and rules are unchanged",
+)
+async def analyze_encounter_antibiotics(
+    encounter_id: int,
+    req: AntibioticCheckRequest,
+    force: bool = Query(False, description="Recompute even if the stored analysis is current"),
+    db: AsyncSession = Depends(get_db),
+) -> AntibioticAnalysisResult:
+    if len(req.meds) > 50 or len(req.allergies) > 50:
+        raise HTTPException(status_code=400, detail="Too many items in meds/allergies")
+    if await EncounterService().get(db, encounter_id) is None:
+        raise HTTPException(status_code=404, detail="Encounter not found")
+
+    service = AntibioticAnalysisService()
+    row, cached = await service.analyze(db, encounter_id, req.meds, req.allergies, req.planText, force=force)
+    return service.to_result(row, cached)
+
+
+@router.get(
+    "/encounters/{encounter_id}/antibiotics",
+    response_model=AntibioticAnalysisResult,
+    tags=["rules"],
+    summary="Stored antibiotic analysis for an encounter (re-checked if the active rule set changed)",
+)
+async def get_encounter_antibiotics(encounter_id: int, db: AsyncSession = Depends(get_db)) -> AntibioticAnalysisResult:
+    service = AntibioticAnalysisService()
+    row = await service.get_by_encounter(db, encounter_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="No antibiotic analysis stored for this encounter")
+    row, cached = await service.refresh_if_stale(db, row)
+    return service.to_result(row, cached)
+
+
+def _rule_set_info(row, is_active: bool) -> RuleSetInfo:
+    compiled = compile_row(row)
+    return RuleSetInfo(
+        id=row.id,
+        name=row.name,
+        version=row.version,
+        sha256_hash=row.sha256_hash,
+        is_active=is_active,
+        allergy_rules=compiled.allergy_rule_count,
+        interaction_rules=compiled.interaction_rule_count,
+    )
+
+
+@router.get("/sets/active", response_model=RuleSetInfo, tags=["rules"], summary="Rule set currently used by this worker")
+async def active_rule_set() -> RuleSetInfo:
+    current = rule_engine.current
+    return RuleSetInfo(
+        id=current.rule_set_id,
+        name=current.name,
+        version=current.version,
+        sha256_hash=current.sha256_hash,
+        is_active=True,
+        allergy_rules=current.allergy_rule_count,
+        interaction_rules=current.interaction_rule_count,
+    )
+
+
+@router.post("/sets", response_model=RuleSetInfo, tags=["rules"], summary="Upload a rule set (optionally activating it)")
+async def create_rule_set(req: RuleSetCreate, db: AsyncSession = Depends(get_db)) -> RuleSetInfo:
+    service = RuleSetService()
+    try:
+        row = await service.create_from_definitions(db, req)
+    except (ValueError, ValidationError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if req.activate:
+        row = await service.activate(db, row.id)
+    return _rule_set_info(row, bool(row.is_active))
+
+
+@router.post("/sets/{rule_set_id}/activate", response_model=RuleSetInfo, tags=["rules"], summary="Activate a stored rule set")
+async def activate_rule_set(rule_set_id: int, db: AsyncSession = Depends(get_db)) -> RuleSetInfo:
+    try:
+        row = await RuleSetService().activate(db, rule_set_id)
+    except (ValueError, ValidationError) as e:
+        raise HTTPException(status_code=400, detail=f"Stored rule set does not compile: {e}")
+    if row is None:
+        raise HTTPException(status_code=404, detail="Rule set not found")
+    return _rule_set_info(row, True)
+
+
+@router.post("/audit", response_model=AuditJob, status_code=202, tags=["rules"], summary="Start the antibiotic rules over every active encounter in the background")
+async def safety_audit() -> AuditJob:
+    # The nightly pharmacy job runs `python -m services.safety_audit`; this starts the same audit
+    # in the background (or returns the one already running) and reports progress via GET /audit/{job_id}
+    return audit_jobs.start()
 
 
+@router.get("/audit/{job_id}", response_model=AuditJob, tags=["rules"], summary="Status and report of an audit job")
+async def safety_audit_status(job_id: str) -> AuditJob:
+    job = audit_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Audit job not found")
+    return job
@@ -1,8 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 import logging
-import time
-from datetime import datetime
 
 from core.database import get_db
 from schemas.soap import (
@@ -11,18 +10,29 @@ from schemas.soap import (
     SOAPExtractAndSaveReq,
     SOAPNoteRecord,
     EncounterWithSOAP,
+    SOAPBatchReq,
+    SOAPBatchResp,
+    SOAPBatchItemResult,
 )
 from services.soap_extractor import (
     extract_soap_note,
+    stream_soap_note,
+    soap_cache_key,
+    current_model_name,
     LLMTimeoutError,
     LLMRateLimitError,
     LLMOverloadedError,
+    LLMCircuitOpenError,
+    LLMQueueFullError,
 )
 from services.soap_service import SOAPService
-from services.encounter_service import EncounterService
-from services.transcript_service import TranscriptService
+from services.soap_pipeline import SOAPPipelineService
+from services.soap_batch import extract_soap_notes_batch
 from services.patient_service import PatientService
+from services.soap_cache import soap_cache
+import json
 import os
+import time
 
 router = APIRouter()
 
@@ -48,7 +58,7 @@ async def extract(req: SOAPExtractReq) -> SOAPNote:
         raise HTTPException(status_code=401, detail="OpenAI API key is not set")
 
     try:
-        return extract_soap_note(req.transcript)
+        return await extract_soap_note(req.transcript)
     except LLMTimeoutError as e:
         logging.warning("SOAP extraction timeout length=%d hash=%s", length, short_hash)
         raise HTTPException(status_code=504, detail="LLM timeout") from e
@@ -58,23 +68,172 @@ async def extract(req: SOAPExtractReq) -> SOAPNote:
     except LLMOverloadedError as e:
         logging.warning("SOAP extraction overloaded length=%d hash=%s", length, short_hash)
         raise HTTPException(status_code=502, detail="LLM service overloaded") from e
+    except (LLMCircuitOpenError, LLMQueueFullError) as e:
+        logging.warning("SOAP extraction rejected (%s) length=%d hash=%s", type(e).__name__, length, short_hash)
+        raise HTTPException(
+            status_code=503,
+            detail="LLM temporarily unavailable",
+            headers={"Retry-After": str(max(1, int(e.retry_after or 1)))},
+        ) from e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _llm_http_error(e: Exception) -> HTTPException:
+    """Map an LLM error to the status code /extract uses for it"""
+    if isinstance(e, LLMTimeoutError):
+        return HTTPException(status_code=504, detail="LLM timeout")
+    if isinstance(e, LLMRateLimitError):
+        return HTTPException(status_code=429, detail="LLM rate limit exceeded")
+    if isinstance(e, LLMOverloadedError):
+        return HTTPException(status_code=502, detail="LLM service overloaded")
+    if isinstance(e, (LLMCircuitOpenError, LLMQueueFullError)):
+        return HTTPException(
+            status_code=503,
+            detail="LLM temporarily unavailable",
+            headers={"Retry-After": str(max(1, int(e.retry_after or 1)))},
+        )
+    return HTTPException(status_code=500, detail=str(e))
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/extract/stream", tags=["soap"], summary="Stream SOAP note extraction as server-sent events")
+async def extract_stream(req: SOAPExtractReq) -> StreamingResponse:
+    """
+    Same extraction as /extract, streamed as server-sent events:
+    `delta` events ({"field", "text"}) append text to one of the four SOAP
+    fields as soon as the model produces it, then a single `note` event
+    carries the validated SOAPNote, which replaces the accumulated deltas.
+    Errors before the first event are returned with the /extract status
+    codes; errors after it arrive as an `error` event ({"status", "detail"}).
+    """
+    if not req.transcript:
+        raise HTTPException(status_code=400, detail="Transcript is required")
+
+    if len(req.transcript) < 20:
+        raise HTTPException(status_code=400, detail="Transcript must be at least 20 characters")
+
+    length = len(req.transcript)
+    short_hash = hex(abs(hash(req.transcript)) % (1 << 32))
+    logging.info("SOAP stream request received length=%d hash=%s", length, short_hash)
+
+    if not os.getenv("OPENAI_API_KEY"):
+        raise HTTPException(status_code=401, detail="OpenAI API key is not set")
+
+    events = stream_soap_note(req.transcript)
+    try:
+        # Pull the first event before committing to a 200 so admission and
+        # connection failures still get a real status code
+        first = await events.__anext__()
+    except StopAsyncIteration:
+        raise HTTPException(status_code=500, detail="SOAP extraction produced no output")
+    except Exception as e:
+        logging.warning("SOAP stream failed (%s) length=%d hash=%s", type(e).__name__, length, short_hash)
+        raise _llm_http_error(e) from e
+
+    async def body():
+        try:
+            yield _sse(*first)
+            async for event in events:
+                yield _sse(*event)
+        except Exception as e:
+            logging.warning("SOAP stream aborted (%s) length=%d hash=%s", type(e).__name__, length, short_hash)
+            err = _llm_http_error(e)
+            yield _sse("error", {"status": err.status_code, "detail": err.detail})
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/extract-batch", response_model=SOAPBatchResp, tags=["soap"], summary="Extract SOAP notes for many transcripts")
+async def extract_batch(
+    req: SOAPBatchReq,
+    db: AsyncSession = Depends(get_db)
+) -> SOAPBatchResp:
+    """
+    Extract many transcripts with bounded concurrency. Each item gets its own
+    result or error (with the status code /extract would have returned), in
+    input order. With persist=true, notes for items that carry an
+    encounter_id are saved in one bulk insert.
+    """
+    max_items = int(os.getenv("SOAP_BATCH_MAX_ITEMS", "1000"))
+    if not req.items:
+        raise HTTPException(status_code=400, detail="At least one item is required")
+    if len(req.items) > max_items:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {max_items} items")
+
+    if not os.getenv("OPENAI_API_KEY"):
+        raise HTTPException(status_code=401, detail="OpenAI API key is not set")
+
+    start = time.perf_counter()
+    results = [SOAPBatchItemResult(index=i) for i in range(len(req.items))]
+    valid = []
+    for i, item in enumerate(req.items):
+        if not item.transcript or len(item.transcript) < 20:
+            results[i].status_code = 400
+            results[i].error = "Transcript must be at least 20 characters"
+        else:
+            valid.append(i)
+
+    outcomes = await extract_soap_notes_batch([req.items[i].transcript for i in valid], concurrency=req.concurrency)
+    for i, outcome in zip(valid, outcomes):
+        result = results[i]
+        result.processing_time_ms = outcome.processing_time_ms
+        if outcome.error is not None:
+            err = _llm_http_error(outcome.error)
+            result.status_code, result.error = err.status_code, err.detail
+        else:
+            result.note = outcome.note
+
+    persisted = 0
+    if req.persist:
+        soap_service = SOAPService()
+        candidates = [r for r in results if r.note is not None and req.items[r.index].encounter_id is not None]
+        known = await soap_service.existing_encounter_ids(db, [req.items[r.index].encounter_id for r in candidates])
+        to_save = []
+        for r in candidates:
+            if req.items[r.index].encounter_id in known:
+                to_save.append(r)
+            else:
+                r.status_code, r.error = 404, "Encounter not found"
+        try:
+            records = await soap_service.save_many(
+                db,
+                [(req.items[r.index].encounter_id, r.note, r.processing_time_ms) for r in to_save],
+                model_used=current_model_name(),
+            )
+        except Exception as e:
+            logging.error(f"Bulk SOAP persist failed: {e}")
+            raise HTTPException(status_code=500, detail=f"Failed to persist SOAP notes: {str(e)}")
+        for r, record in zip(to_save, records):
+            r.record_id = record.id
+        persisted = len(records)
+
+    failed = sum(1 for r in results if r.error is not None)
+    return SOAPBatchResp(
+        results=results,
+        succeeded=len(results) - failed,
+        failed=failed,
+        persisted=persisted,
+        elapsed_ms=int((time.perf_counter() - start) * 1000),
+    )
+
 @router.post("/extract-and-save", response_model=EncounterWithSOAP, tags=["soap"], summary="Extract SOAP note and save to database")
 async def extract_and_save(
     req: SOAPExtractAndSaveReq,
     db: AsyncSession = Depends(get_db)
 ) -> EncounterWithSOAP:
     """
-    Extract SOAP note from transcript and save everything to database:
-    1. Create encounter for patient
-    2. Save transcript
-    3. Extract SOAP note
-    4. Save SOAP note to database
+    Extract SOAP note from transcript and save everything to database.
+    The LLM runs once, then encounter, transcript and SOAP note are
+    written in a single transaction.
     """
-    start_time = time.time()
-    
     # Validate patient exists
     patient_service = PatientService()
     patient = await patient_service.get(db, req.patient_id)
@@ -90,39 +249,16 @@ async def extract_and_save(
         raise HTTPException(status_code=401, detail="OpenAI API key is not set")
     
     try:
-        # 1. Create encounter
-        encounter_service = EncounterService()
-        encounter = await encounter_service.create(
+        encounter, transcript, soap_record = await SOAPPipelineService().run(
             db,
             patient_id=req.patient_id,
             encounter_type=req.encounter_type,
+            transcript_content=req.transcript,
             chief_complaint=req.chief_complaint,
-            encounter_date=req.encounter_date or datetime.now(),
-            status="active"
-        )
-        
-        # 2. Save transcript
-        transcript_service = TranscriptService()
-        transcript = await transcript_service.create(
-            db,
-            encounter_id=encounter.id,
-            content=req.transcript,
-            language="en"
+            encounter_date=req.encounter_date,
+            language="en",
         )
         
-        # 3. Extract SOAP note
-        soap_note = extract_soap_note(req.transcript)
-        
-        # 4. Save SOAP note to database
-        soap_service = SOAPService()
-        soap_record = await soap_service.extract_and_save_soap(
-            db,
-            encounter.id,
-            req.transcript
-        )
-        
-        processing_time = int((time.time() - start_time) * 1000)
-        
         # Return complete encounter with related data
         return EncounterWithSOAP(
             id=encounter.id,
@@ -133,24 +269,18 @@ async def extract_and_save(
             encounter_date=encounter.encounter_date,
             created_at=encounter.created_at,
             transcript_content=transcript.content,
-            soap_note=SOAPNoteRecord(
-                id=soap_record.id,
-                encounter_id=soap_record.encounter_id,
-                soap_note=soap_record.soap_note,
-                subjective=soap_record.subjective,
-                objective=soap_record.objective,
-                assessment=soap_record.assessment,
-                plan=soap_record.plan,
-                model_used=soap_record.model_used,
-                processing_time_ms=processing_time,
-                confidence_score=soap_record.confidence_score,
-                created_at=soap_record.created_at
-            )
+            soap_note=SOAPNoteRecord.model_validate(soap_record),
         )
         
+    except (LLMCircuitOpenError, LLMQueueFullError) as e:
+        raise HTTPException(
+            status_code=503,
+            detail="LLM temporarily unavailable",
+            headers={"Retry-After": str(max(1, int(e.retry_after or 1)))},
+        ) from e
     except (LLMTimeoutError, LLMRateLimitError, LLMOverloadedError) as e:
-        # If SOAP extraction fails, we still have the encounter and transcript
-        logging.error(f"SOAP extraction failed for encounter {encounter.id}: {e}")
+        # Extraction runs before any write, so nothing was persisted
+        logging.error(f"SOAP extraction failed for patient {req.patient_id}: {e}")
         raise HTTPException(status_code=500, detail=f"SOAP extraction failed: {str(e)}")
     except Exception as e:
         logging.error(f"Error in extract_and_save: {e}")
@@ -180,4 +310,26 @@ async def get_soap_note(
         processing_time_ms=soap_record.processing_time_ms,
         confidence_score=soap_record.confidence_score,
         created_at=soap_record.created_at
-    )
\ No newline at end of file
+    )
+
+
+@router.post("/cache/invalidate", tags=["soap"], summary="Drop the cached SOAP extraction for a transcript")
+async def invalidate_cached_extraction(req: SOAPExtractReq) -> dict:
+    """
+    Invalidate the cached extraction for this transcript under the current model config,
+    for both the combined (SOAP + medications) and the SOAP-only prompt.
+
+    The persistent tier is shared, but the memory tier is per worker: only this worker's
+    copy is dropped, and other workers keep serving theirs until SOAP_CACHE_TTL_SECONDS
+    runs out or they restart. Lower the TTL when stale notes must not outlive this call.
+    """
+    keys = [soap_cache_key(req.transcript, combined=True), soap_cache_key(req.transcript, combined=False)]
+    removed = [await soap_cache.invalidate(key) for key in keys]
+    return {"keys": keys, "removed": any(removed)}
+
+
+@router.delete("/cache", tags=["soap"], summary="Clear the SOAP extraction cache")
+async def clear_extraction_cache() -> dict:
+    """Clear both the in-process and persistent cache tiers"""
+    removed = await soap_cache.clear()
+    return {"removed": removed}
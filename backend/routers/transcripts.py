@@ -1,14 +1,14 @@
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, HTTPException
 from pydantic import HttpUrl
 from sqlalchemy.ext.asyncio import AsyncSession
-from datetime import datetime
 from typing import List, Optional
-import os, tempfile
+import logging
+import os
+import time
 
 from core.database import get_db
-from services.encounter_service import EncounterService
-from services.transcript_service import TranscriptService
-from services.soap_service import SOAPService
+from services.soap_pipeline import SOAPPipelineService
+from services.llm_gateway import transcribe, LLMCircuitOpenError, LLMQueueFullError
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -28,56 +28,24 @@ async def transcribe_and_extract_soap(
         raise HTTPException(status_code=401, detail="OpenAI API key is not set")
     
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
         # Transcribe audio
         audio_bytes = await audio.read()
-        with tempfile.NamedTemporaryFile(delete=False, suffix=audio.filename) as temp_file:
-            temp_file.write(audio_bytes)
-            temp_path = temp_file.name
-        
-        with open(temp_path, "rb") as audio_file:
-
-            result = client.audio.transcriptions.create(
-                model = os.getenv("STT_MODEL", "gpt-4o-mini-transcribe"),
-                file = audio_file,
-                response_format = "json",
-            )
-        
-        os.unlink(temp_path)
-        
-        transcript_text = getattr(result, "text", None) or (result["text"] if isinstance(result, dict) else None)
+        t0 = time.perf_counter()
+        transcript_text = await transcribe(audio.filename or "audio", audio_bytes)
+        stt_ms = int((time.perf_counter() - t0) * 1000)
 
         if not transcript_text:
             raise HTTPException(status_code=502, detail="Failed to transcribe audio")
         
-        # Create encounter
-        encounter_service = EncounterService()
-        encounter = await encounter_service.create(
+        # Extract SOAP note, then save encounter, transcript and note together
+        encounter, transcript, soap_record = await SOAPPipelineService().run(
             db,
             patient_id=patient_id,
             encounter_type=encounter_type,
+            transcript_content=transcript_text,
             chief_complaint=chief_complaint,
-            encounter_date=datetime.now(),
-            status="active"
-        )
-
-        # Save transcript
-        transcript_service = TranscriptService()
-        transcript = await transcript_service.create(
-            db,
-            encounter_id=encounter.id,
-            content=transcript_text,
-            language=language
-        )
-
-        # Extract SOAP note
-        soap_service = SOAPService()
-        soap_note = await soap_service.extract_and_save_soap(
-            db,
-            encounter.id,
-            transcript_text
+            language=language,
+            stage_timings={"stt": stt_ms},
         )
 
         return {
@@ -88,11 +56,16 @@ async def transcribe_and_extract_soap(
     
     except HTTPException:
         raise
+
+    except (LLMCircuitOpenError, LLMQueueFullError) as e:
+        raise HTTPException(
+            status_code=503,
+            detail="LLM temporarily unavailable",
+            headers={"Retry-After": str(max(1, int(e.retry_after or 1)))},
+        ) from e
     
     except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
-        print(f"ERROR in transcripts/stt: {error_details}")
+        logging.exception("transcripts/stt failed")
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
     
     
\ No newline at end of file
@@ -1,10 +1,13 @@
+import base64
+import binascii
 import json
-from typing import List
+import time
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from schemas.transcription import (
-    ClientInit, ClientAudio, ClientEnd,
-    ServerTranscriptChunk, ServerFinal, ServerFinalSegment, ServerError
+    ClientInit, ClientAudio, ClientEnd, ServerReady, ServerError
 )
+from services.stt_frames import parse_frame, FLAG_END, HEADER_BYTES
+from services.stt_session import SttSession
 
 router = APIRouter()
 
@@ -12,6 +15,7 @@ router = APIRouter()
 async def transcribe_ws(websocket: WebSocket):
 
     await websocket.accept()
+    session = None
 
     try:
         # Expect ClientInit
@@ -19,7 +23,8 @@ async def transcribe_ws(websocket: WebSocket):
 
         try:
             init_data = ClientInit.model_validate(json.loads(init_raw))
-        
+            session = SttSession(init_data, websocket.send_json)
+
         except Exception as e:
             await websocket.send_json(ServerError(
                 message = "Invalid init",
@@ -27,74 +32,82 @@ async def transcribe_ws(websocket: WebSocket):
             ).model_dump())
             await websocket.close(code = 1008, reason = "Invalid init")
             return
-        
-        partials: List[str] = []
-        ms_cursor = 0
-        last_seq = -1
+
+        session.start()
+        binary = init_data.framing == "binary"
+        await websocket.send_json(ServerReady(
+            sessionId = init_data.sessionId,
+            framing = init_data.framing,
+            headerBytes = HEADER_BYTES if binary else 0
+        ).model_dump())
 
         while True:
-            raw = await websocket.receive_text()
-            msg = json.loads(raw)
+            message = await websocket.receive()
+            # Arrival time, before parsing, is where latency is measured from
+            arrived = time.perf_counter()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+
+            frame = message.get("bytes")
+            if frame is not None:
+                if not binary:
+                    await websocket.send_json(ServerError(
+                        message = "Binary frames need framing=binary in init",
+                        code = "BAD_FRAMING"
+                    ).model_dump())
+                    continue
+
+                try:
+                    seq, flags, payload = parse_frame(frame)
+
+                except ValueError as e:
+                    await websocket.send_json(ServerError(
+                        message = f"Invalid frame: {e}",
+                        code = "BAD_AUDIO"
+                    ).model_dump())
+                    continue
+
+                if payload:
+                    await session.audio(seq, payload, arrived)
+
+                if flags & FLAG_END:
+                    await session.end()
+                    await websocket.close(code = 1000, reason = "End of session")
+                    return
+                continue
+
+            msg = json.loads(message["text"])
             t = msg["type"]
 
             if t == "audio":
                 try:
                     audio = ClientAudio.model_validate(msg)
-                
-                except Exception as e:
+                    data = base64.b64decode(audio.data, validate = True)
+
+                except (ValueError, binascii.Error) as e:
                     await websocket.send_json(ServerError(
                         message = "Invalid audio",
                         code = "BAD_AUDIO"
                     ).model_dump())
                     continue
 
-                if audio.seq <= last_seq:
-                    await websocket.send_json(ServerError(
-                        message = "Seq out of order",
-                        code = "SEQ_ORDER"
-                    ).model_dump())
-                    continue
-                
-                last_seq = audio.seq
-
-                if audio.seq % 2 == 0:
-                    text = f"chunk {audio.seq} received"
-                    start_ms, end_ms = ms_cursor, ms_cursor + 800
-                    ms_cursor = end_ms
-                    partials.append(text)
-
-                    await websocket.send_json(
-                        ServerTranscriptChunk(
-                            id=f"t-{audio.seq}", text=text, partial=True,
-                            startMs=start_ms, endMs=end_ms
-                        ).model_dump()
-                    )
+                await session.audio(audio.seq, data, arrived)
 
             elif t == "end":
                 try:
                     _ = ClientEnd.model_validate(msg)
-                
+
                 except Exception as e:
                     await websocket.send_json(ServerError(
                         message = "Invalid end",
                         code = "BAD_END"
                     ).model_dump())
                     continue
-                
-                final_text = " ".join(partials)
-                await websocket.send_json(
-                    ServerFinal(
-                        segments = [ServerFinalSegment(
-                            text = final_text,
-                            startMs = 0,
-                            endMs = max(ms_cursor, 1500)
-                        )]
-                    ).model_dump()
-                )
 
+                await session.end()
                 await websocket.close(code = 1000, reason = "End of session")
                 return
-            
+
             else:
                 await websocket.send_json(ServerError(
                     message = "Unknown message type",
@@ -104,4 +117,6 @@ async def transcribe_ws(websocket: WebSocket):
     except WebSocketDisconnect:
         pass
 
-                
\ No newline at end of file
+    finally:
+        if session is not None:
+            await session.close()
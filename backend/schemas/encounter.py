@@ -26,6 +26,24 @@ class Encounter(EncounterBase):
     class Config:
         from_attributes = True
 
+class MedicationCreate(BaseModel):
+    generic_name: str = Field(..., min_length=1, max_length=100)
+    brand_name: Optional[str] = Field(None, max_length=100)
+    dosage: Optional[str] = Field(None, max_length=100)
+    route: Optional[str] = Field(None, max_length=50)
+    frequency: Optional[str] = Field(None, max_length=50)
+    duration: Optional[str] = Field(None, max_length=50)
+
+class Medication(MedicationCreate):
+    id: int
+    encounter_id: int
+    source: Optional[str] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 # Transcript schema for nested data
 class TranscriptInEncounter(BaseModel):
     id: int
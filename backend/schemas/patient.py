@@ -25,4 +25,20 @@ class Patient(PatientBase):
     updated_at: Optional[datetime] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class AllergyCreate(BaseModel):
+    allergen: str = Field(..., min_length=1, max_length=100)
+    reaction_type: Optional[str] = Field(None, max_length=100)
+    severity: Optional[str] = Field(None, max_length=20)
+    notes: Optional[str] = None
+
+class Allergy(AllergyCreate):
+    id: int
+    patient_id: int
+    is_active: Optional[bool] = True
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -1,6 +1,9 @@
 from typing import List, Literal, Optional
+from datetime import datetime
 from pydantic import BaseModel, Field
 
+from schemas.rec import RuleRecommendationList
+
 
 class AntibioticCheckRequest(BaseModel):
     meds: List[str] = Field(default_factory=list, description="Current or planned antibiotics", min_items=0)
@@ -13,9 +16,97 @@ class RuleFinding(BaseModel):
     title: str
     severity: Literal["low", "medium", "high"]
     details: str
+    rule_set_version: Optional[str] = None
 
 
 class AntibioticFindings(BaseModel):
     findings: List[RuleFinding]
+    rule_set_version: Optional[str] = None
+    rule_set_hash: Optional[str] = None
+    ontology_version: Optional[str] = None
+
+
+class AllergyContraindicationRule(BaseModel):
+    id: str
+    allergen: str = Field(..., description="Allergy as recorded, e.g. 'penicillin'")
+    drugs: List[str] = Field(..., description="Generic names contraindicated with this allergy")
+    severity: Literal["low", "medium", "high"] = "high"
+    title: str = Field(..., description="May use {drug} and {allergen}")
+    details: str = Field(..., description="May use {drug} and {allergen}")
+
+
+class InteractionRule(BaseModel):
+    id: str
+    drugs: List[str] = Field(..., min_length=2, max_length=2, description="The interacting pair")
+    severity: Literal["low", "medium", "high"] = "medium"
+    title: str
+    details: str
+
+
+class RuleDefinitions(BaseModel):
+    allergy_contraindications: List[AllergyContraindicationRule] = Field(default_factory=list)
+    interactions: List[InteractionRule] = Field(default_factory=list)
+
+
+class RuleSetCreate(BaseModel):
+    name: str = Field(..., max_length=100)
+    version: str = Field(..., max_length=20)
+    description: Optional[str] = None
+    rules: RuleDefinitions
+    activate: bool = Field(False, description="Make this the active rule set immediately")
+
+
+class RuleSetInfo(BaseModel):
+    id: Optional[int] = None
+    name: str
+    version: str
+    sha256_hash: str
+    is_active: bool
+    allergy_rules: int
+    interaction_rules: int
+
+
+class AuditReport(BaseModel):
+    rule_set_version: str
+    rule_set_hash: str
+    encounters: int
+    encounters_with_findings: int
+    findings: int
+    inserted: int
+    skipped_existing: int
+    chunks: int
+    elapsed_ms: float
+    evaluate_ms: float
+
+
+class AuditJob(BaseModel):
+    id: str
+    status: Literal["running", "succeeded", "failed"]
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    report: Optional[AuditReport] = None
+    error: Optional[str] = None
+
+
+class ReevaluationReport(BaseModel):
+    rule_set_version: str
+    encounters: int = Field(..., description="Active encounters touched by the change")
+    recomputed: int = Field(..., description="Encounters whose findings were re-evaluated")
+    unchanged: int = Field(..., description="Encounters skipped because their rule-relevant facts were unchanged")
+    inserted: int
+    updated: int
+    deleted: int
+    elapsed_ms: float
 
 
+class AntibioticAnalysisResult(BaseModel):
+    encounter_id: int
+    analysis_id: int
+    meds: List[str] = Field(..., description="Resolved generic names the rules ran on")
+    meds_source: Literal["request", "plan_text"]
+    allergies: List[str]
+    findings: AntibioticFindings
+    recommendations: RuleRecommendationList
+    input_fingerprint: str
+    cached: bool = Field(False, description="Served from the stored analysis without recomputing")
+    created_at: Optional[datetime] = None
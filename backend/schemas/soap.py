@@ -11,6 +11,17 @@ class SOAPNote(BaseModel):
     assessment: str
     plan: str
 
+class SOAPNoteWithMeds(SOAPNote):
+    # Combined extraction: antibiotics started or continued in the plan, lowercase generic names
+    meds: List[str] = Field(default_factory=list, description = "Antibiotic generic names in the plan")
+
+class SOAPNoteUpdate(BaseModel):
+    # Incremental draft update: a rewritten field, or null where the draft stays as it is
+    subjective: Optional[str]
+    objective: Optional[str]
+    assessment: Optional[str]
+    plan: Optional[str]
+
 # New schemas for database integration
 class SOAPExtractAndSaveReq(BaseModel):
     patient_id: int = Field(..., description = "Patient ID")
@@ -50,4 +61,27 @@ class EncounterWithSOAP(BaseModel):
 
     class Config:
         from_attributes = True
-    
\ No newline at end of file
+    
+class SOAPBatchItem(BaseModel):
+    transcript: str = Field(..., description = "Transcript of the session")
+    encounter_id: Optional[int] = Field(None, description = "Encounter to attach the note to when persisting")
+
+class SOAPBatchReq(BaseModel):
+    items: List[SOAPBatchItem] = Field(..., description = "Transcripts to extract, results are returned in this order")
+    persist: bool = Field(False, description = "Save notes for items that carry an encounter_id")
+    concurrency: Optional[int] = Field(None, ge = 1, description = "Max extractions in flight (defaults to SOAP_BATCH_CONCURRENCY)")
+
+class SOAPBatchItemResult(BaseModel):
+    index: int
+    note: Optional[SOAPNote] = None
+    record_id: Optional[int] = None
+    status_code: int = 200
+    error: Optional[str] = None
+    processing_time_ms: int = 0
+
+class SOAPBatchResp(BaseModel):
+    results: List[SOAPBatchItemResult]
+    succeeded: int
+    failed: int
+    persisted: int
+    elapsed_ms: int
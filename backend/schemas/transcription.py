@@ -1,5 +1,6 @@
 from typing import List, Literal, Optional
 from pydantic import BaseModel, field_validator, Field
+from schemas.soap import SOAPNote
 
 # ------- Client -> Server -------
 
@@ -33,6 +34,12 @@ class ClientInit(BaseModel):
     type: Literal["init"]
     sessionId: str
     audio: AudioInfo
+    framing: Literal["json", "binary"] = Field(
+        "json", description = "How audio is sent: ClientAudio JSON messages or binary frames (see services/stt_frames.py)"
+    )
+    soapDraft: bool = Field(
+        False, description = "Keep a SOAP note up to date during the session and send it as ServerSoapDraft messages"
+    )
 
 
 class ClientAudio(BaseModel):
@@ -53,6 +60,16 @@ class ClientEnd(BaseModel):
 
 # ------- Server -> Client -------
 
+class ServerReady(BaseModel):
+    """
+    Sent after a valid ClientInit; confirms the negotiated framing
+    """
+    type: Literal["ready"] = "ready"
+    sessionId: str
+    framing: Literal["json", "binary"]
+    headerBytes: int = 0
+
+
 class ServerTranscriptChunk(BaseModel):
     type: Literal["transcript"] = "transcript"
     id: str
@@ -73,6 +90,19 @@ class ServerFinal(BaseModel):
     segments: List[ServerFinalSegment]
 
 
+class ServerSoapDraft(BaseModel):
+    """
+    The session's SOAP note so far; sent as transcript accumulates and once
+    more with final=True after the closing ServerFinal
+    """
+    type: Literal["soap_draft"] = "soap_draft"
+    version: int
+    final: bool = False
+    note: SOAPNote
+    segments: int = Field(..., description = "Final segments the note covers")
+    throughMs: int = Field(..., description = "End of the last segment the note covers, on the audio clock")
+
+
 class ServerError(BaseModel):
     type: Literal["error"] = "error"
     message: str
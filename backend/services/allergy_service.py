@@ -0,0 +1,19 @@
+from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, or_
+
+from .base_service import BaseService
+from models.allergy import Allergy
+
+class AllergyService(BaseService[Allergy]):
+    def __init__(self):
+        super().__init__(Allergy)
+
+    async def get_active_by_patient(self, db: AsyncSession, patient_id: int) -> List[Allergy]:
+        """Active allergies recorded for a patient"""
+        result = await db.execute(
+            select(Allergy)
+            .where(Allergy.patient_id == patient_id, or_(Allergy.is_active.is_(True), Allergy.is_active.is_(None)))
+            .order_by(Allergy.id)
+        )
+        return result.scalars().all()
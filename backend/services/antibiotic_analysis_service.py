@@ -0,0 +1,204 @@
+from typing import List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+import hashlib
+import json
+
+from .base_service import BaseService
+from models.antibiotic_analysis import AntibioticAnalysis
+from models.medication import Medication
+from models.safety_finding import SafetyFinding
+from models.recommendation import Recommendation
+from schemas.rules import AntibioticAnalysisResult, AntibioticFindings, RuleFinding
+from schemas.rec import RuleRecommendation, RuleRecommendationList
+from services.antibiotic_rules import analyze_antibiotics, analyze_with_meds
+from services.llm_gateway import default_model
+from services.med_normalizer import normalize_meds, normalize_allergies
+from services.rule_engine import rule_engine
+from services.single_flight import SingleFlight, make_key
+
+analysis_flight = SingleFlight("antibiotic_analysis")
+
+
+def input_fingerprint(meds: Optional[List[str]], allergies: List[str], plan_text: Optional[str]) -> str:
+    """
+    sha256 over what the analysis actually depends on: normalized meds, or
+    the plan text when meds are extracted from it, plus normalized allergies
+    """
+    payload = {
+        "meds": sorted(set(normalize_meds(meds))) if meds else None,
+        "plan_text": " ".join(plan_text.split()) if not meds and plan_text else None,
+        "allergies": sorted(set(normalize_allergies(allergies or []))),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class AntibioticAnalysisService(BaseService[AntibioticAnalysis]):
+    def __init__(self):
+        super().__init__(AntibioticAnalysis)
+
+    async def get_by_encounter(self, db: AsyncSession, encounter_id: int) -> Optional[AntibioticAnalysis]:
+        result = await db.execute(
+            select(AntibioticAnalysis)
+            .options(
+                selectinload(AntibioticAnalysis.safety_findings),
+                selectinload(AntibioticAnalysis.recommendations),
+            )
+            .where(AntibioticAnalysis.encounter_id == encounter_id)
+        )
+        return result.scalar_one_or_none()
+
+    def is_current(self, row: AntibioticAnalysis) -> bool:
+        """Stored results were produced by the active rule set and ontology"""
+        rules = rule_engine.current
+        return row.rule_set_hash == rules.sha256_hash and row.ontology_hash == rules.ontology.version_hash
+
+    async def analyze(
+        self,
+        db: AsyncSession,
+        encounter_id: int,
+        meds: Optional[List[str]],
+        allergies: List[str],
+        plan_text: Optional[str] = None,
+        force: bool = False,
+    ) -> Tuple[AntibioticAnalysis, bool]:
+        """
+        Stored analysis if its inputs and rule set still match, otherwise
+        recompute and replace it. Returns (row, served_from_store).
+        """
+        fingerprint = input_fingerprint(meds, allergies, plan_text)
+        row = await self.get_by_encounter(db, encounter_id)
+        if row is not None and not force and row.input_fingerprint == fingerprint and self.is_current(row):
+            return row, True
+
+        rules = rule_engine.current
+        key = make_key(encounter_id, fingerprint, rules.sha256_hash, rules.ontology.version_hash)
+        result = await analysis_flight.do(key, lambda: analyze_antibiotics(meds, allergies, plan_text))
+        meds_source = "request" if meds else "plan_text"
+        return await self._replace(db, encounter_id, fingerprint, meds_source, normalize_allergies(allergies or []), result), False
+
+    async def refresh_if_stale(self, db: AsyncSession, row: AntibioticAnalysis) -> Tuple[AntibioticAnalysis, bool]:
+        """
+        Re-run the rules over the stored (already resolved) meds when the
+        active rule set changed; no med extraction is repeated
+        """
+        if self.is_current(row):
+            return row, True
+        rules = rule_engine.current
+        key = make_key(row.encounter_id, row.input_fingerprint, rules.sha256_hash, rules.ontology.version_hash)
+        meds, allergies = list(row.meds), list(row.allergies)
+        result = await analysis_flight.do(key, lambda: analyze_with_meds(meds, allergies))
+        return await self._replace(db, row.encounter_id, row.input_fingerprint, row.meds_source, allergies, result), False
+
+    async def _replace(
+        self,
+        db: AsyncSession,
+        encounter_id: int,
+        fingerprint: str,
+        meds_source: str,
+        allergies: List[str],
+        result: dict,
+    ) -> AntibioticAnalysis:
+        """Swap the encounter's stored analysis for this result in one transaction"""
+        findings = result["findings"]
+        # Curated and stored recommendations involve no model call in this analysis
+        llm = result["recommendations_source"] == "llm" and result["recommendations"]["recommendations"]
+        model_used = default_model() if llm else None
+        try:
+            previous = await db.execute(
+                select(AntibioticAnalysis.id).where(AntibioticAnalysis.encounter_id == encounter_id)
+            )
+            previous_id = previous.scalar_one_or_none()
+            if previous_id is not None:
+                for model in (Recommendation, SafetyFinding, Medication):
+                    await db.execute(delete(model).where(model.analysis_id == previous_id))
+                await db.execute(delete(AntibioticAnalysis).where(AntibioticAnalysis.id == previous_id))
+
+            row = AntibioticAnalysis(
+                encounter_id=encounter_id,
+                input_fingerprint=fingerprint,
+                rule_set_hash=findings["rule_set_hash"],
+                rule_set_version=findings["rule_set_version"],
+                ontology_hash=rule_engine.current.ontology.version_hash,
+                meds=result["meds"],
+                allergies=allergies,
+                meds_source=meds_source,
+                model_used=model_used,
+            )
+            row.medications = [
+                Medication(encounter_id=encounter_id, generic_name=name[:100], source=meds_source)
+                for name in result["meds"]
+            ]
+            by_id = {}
+            for f in findings["findings"]:
+                by_id.setdefault(f["id"], SafetyFinding(
+                    encounter_id=encounter_id,
+                    finding_id=f["id"],
+                    title=f["title"][:100],
+                    severity=f["severity"],
+                    details=f["details"],
+                    rule_set_version=f["rule_set_version"],
+                ))
+            row.safety_findings = list(by_id.values())
+            # Recommendations for findings the rules did not produce are dropped
+            row.recommendations = [
+                Recommendation(
+                    encounter_id=encounter_id,
+                    safety_finding=by_id[rec["findingId"]],
+                    finding_id=rec["findingId"],
+                    reason=rec["reason"],
+                    alternatives=rec["alternatives"],
+                    model_used=model_used,
+                )
+                for rec in result["recommendations"]["recommendations"]
+                if rec["findingId"] in by_id
+            ]
+            # One flush: the analysis row, then each child table as a batched insert
+            db.add(row)
+            await db.commit()
+        except IntegrityError:
+            # A concurrent request (possibly another worker) stored this encounter first
+            await db.rollback()
+            stored = await self.get_by_encounter(db, encounter_id)
+            if stored is None:
+                raise
+            return stored
+        except Exception:
+            await db.rollback()
+            raise
+        return await self.get_by_encounter(db, encounter_id)
+
+    def to_result(self, row: AntibioticAnalysis, cached: bool) -> AntibioticAnalysisResult:
+        rules = rule_engine.current
+        findings = sorted(row.safety_findings, key=lambda f: f.id)
+        return AntibioticAnalysisResult(
+            encounter_id=row.encounter_id,
+            analysis_id=row.id,
+            meds=row.meds,
+            meds_source=row.meds_source,
+            allergies=row.allergies,
+            findings=AntibioticFindings(
+                findings=[
+                    RuleFinding(
+                        id=f.finding_id,
+                        title=f.title,
+                        severity=f.severity,
+                        details=f.details,
+                        rule_set_version=f.rule_set_version,
+                    )
+                    for f in findings
+                ],
+                rule_set_version=row.rule_set_version,
+                rule_set_hash=row.rule_set_hash,
+                ontology_version=rules.ontology.version if row.ontology_hash == rules.ontology.version_hash else None,
+            ),
+            recommendations=RuleRecommendationList(recommendations=[
+                RuleRecommendation(findingId=r.finding_id, reason=r.reason, alternatives=r.alternatives or [])
+                for r in sorted(row.recommendations, key=lambda r: r.id)
+            ]),
+            input_fingerprint=row.input_fingerprint,
+            cached=cached,
+            created_at=row.created_at,
+        )
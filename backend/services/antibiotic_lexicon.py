@@ -0,0 +1,278 @@
+"""
+Compiled antibiotic lexicon for plan-text medication extraction.
+
+Generic names, common brand names and frequent misspellings are compiled
+once into an Aho-Corasick automaton, so a plan is scanned in a single pass
+regardless of lexicon size (tens of microseconds for typical text).
+Each hit is scored from how it matched (generic/brand vs misspelling) and
+whether dose, frequency or route context follows it. The caller falls back
+to the LLM only when the result is low confidence: a fuzzy hit without
+context, or an antibiotic-like word the lexicon doesn't know (with or
+without a dose: "switch to cefdinir" counts as much as "cefdinir 300 mg").
+"""
+from collections import deque
+from typing import Dict, Iterator, List, Tuple
+import re
+
+# generic -> aliases (brands, combinations, regional names)
+GENERICS: Dict[str, List[str]] = {
+    "amoxicillin": ["amoxil", "amoxyl", "moxatag"],
+    "amoxicillin-clavulanate": [
+        "augmentin", "co-amoxiclav", "amoxiclav", "amoxicillin-clavulanate", "amoxicillin/clavulanate",
+        "amoxicillin clavulanate", "amoxicillin/clavulanic acid", "amoxicillin and clavulanate",
+        "amoxicillin-clavulanic acid", "clavulin",
+    ],
+    "ampicillin": ["penbritin"],
+    "ampicillin-sulbactam": ["unasyn", "ampicillin/sulbactam", "ampicillin-sulbactam"],
+    "penicillin": ["penicillin g", "penicillin v", "benzylpenicillin", "phenoxymethylpenicillin", "pen v", "pen vk"],
+    "benzathine penicillin": ["bicillin", "benzathine benzylpenicillin", "benzathine penicillin g"],
+    "flucloxacillin": ["floxapen"],
+    "cloxacillin": ["orbenin"],
+    "dicloxacillin": [],
+    "nafcillin": [],
+    "oxacillin": [],
+    "piperacillin": ["pipracil"],
+    "piperacillin-tazobactam": ["tazocin", "zosyn", "piperacillin/tazobactam", "pip-tazo", "pip/tazo"],
+    "cefalexin": ["cephalexin", "keflex"],
+    "cefadroxil": ["duricef"],
+    "cefazolin": ["ancef"],
+    "cefuroxime": ["zinnat", "zinacef"],
+    "cefaclor": ["distaclor"],
+    "cefixime": ["suprax"],
+    "cefpodoxime": ["vantin", "orelox"],
+    "ceftriaxone": ["rocephin"],
+    "cefotaxime": ["claforan"],
+    "ceftazidime": ["fortum", "fortaz"],
+    "cefepime": ["maxipime"],
+    "meropenem": ["meronem"],
+    "imipenem": ["imipenem-cilastatin", "primaxin", "tienam"],
+    "ertapenem": ["invanz"],
+    "aztreonam": ["azactam"],
+    "azithromycin": ["zithromax", "azithral", "azee", "z-pak", "zpak"],
+    "clarithromycin": ["klacid", "biaxin"],
+    "erythromycin": ["erythrocin", "ery-tab"],
+    "doxycycline": ["vibramycin", "doxy", "doryx"],
+    "tetracycline": [],
+    "minocycline": ["minocin"],
+    "ciprofloxacin": ["cipro", "ciprobid", "ciproxin"],
+    "levofloxacin": ["levaquin", "tavanic"],
+    "moxifloxacin": ["avelox"],
+    "ofloxacin": ["tarivid"],
+    "norfloxacin": [],
+    "gentamicin": ["garamycin"],
+    "amikacin": [],
+    "tobramycin": [],
+    "streptomycin": [],
+    "vancomycin": ["vancocin"],
+    "teicoplanin": ["targocid"],
+    "linezolid": ["zyvox"],
+    "clindamycin": ["dalacin", "cleocin"],
+    "metronidazole": ["flagyl"],
+    "tinidazole": ["fasigyn"],
+    "nitrofurantoin": ["macrobid", "macrodantin"],
+    "trimethoprim": [],
+    "sulfamethoxazole-trimethoprim": [
+        "co-trimoxazole", "cotrimoxazole", "septrin", "bactrim", "tmp-smx", "tmp/smx",
+        "sulfamethoxazole/trimethoprim", "sulfamethoxazole-trimethoprim", "trimethoprim-sulfamethoxazole",
+    ],
+    "chloramphenicol": [],
+    "fosfomycin": ["monurol"],
+    "rifampicin": ["rifampin", "rifadin"],
+    "isoniazid": [],
+    "ethambutol": [],
+    "pyrazinamide": [],
+    "colistin": [],
+    "fusidic acid": ["fucidin"],
+    "mupirocin": ["bactroban"],
+}
+
+# Frequent misspellings seen in transcribed speech and typed notes
+MISSPELLINGS: Dict[str, List[str]] = {
+    "amoxicillin": ["amoxycillin", "amoxicilin", "amoxacillin", "amoxicillan", "amoxcillin", "amoxilin"],
+    "ampicillin": ["ampicilin"],
+    "penicillin": ["penicilin", "pencillin", "penicillen"],
+    "flucloxacillin": ["flucloxacilin", "flucloxacillan"],
+    "cefalexin": ["cefalexine", "cephalexine", "keflax"],
+    "cefuroxime": ["cefuroxim"],
+    "ceftriaxone": ["ceftriaxon", "ceftriazone", "cefriaxone", "ceftriaxzone"],
+    "azithromycin": ["azithromicin", "azithromycine", "azithromyacin", "azitromycin", "azythromycin"],
+    "clarithromycin": ["clarithromicin", "clarythromycin"],
+    "erythromycin": ["erythromicin", "erythromycine"],
+    "doxycycline": ["doxycyline", "doxycyclin", "doxicycline", "doxycylin"],
+    "ciprofloxacin": ["ciprofloxacine", "ciprofloxacen", "ciproflaxacin", "ciprofloxicin"],
+    "levofloxacin": ["levofloxacine", "levofloxicin"],
+    "gentamicin": ["gentamycin", "gentamicine"],
+    "vancomycin": ["vancomicin", "vancomycine", "vanco"],
+    "clindamycin": ["clindamicin", "clindamycine"],
+    "metronidazole": ["metronidazol", "metronidazone", "metronizadole", "metronidazol"],
+    "nitrofurantoin": ["nitrofurantion", "nitrofurantoine"],
+    "sulfamethoxazole-trimethoprim": ["cotrimoxazol", "co-trimoxazol", "septran"],
+    "meropenem": ["meropenum", "meropenam"],
+}
+
+CONFIDENCE_EXACT = 0.85
+CONFIDENCE_FUZZY = 0.7
+CONTEXT_BONUS = 0.1
+
+# Dose / frequency / route shortly after a name
+_CONTEXT = re.compile(
+    r"\b(\d+(?:\.\d+)?\s*(?:mg|mcg|g|gm|grams?|ml|iu|units?|mu)\b|"
+    r"(?:po|iv|im|sc|oral(?:ly)?|intravenous(?:ly)?|intramuscular(?:ly)?|by mouth|topical(?:ly)?|"
+    r"od|bd|bid|tds|tid|qds|qid|stat|prn|q\d+h|once|twice|three times|four times|daily|nightly|"
+    r"every \d+ hours|for \d+ days))\b",
+    re.I,
+)
+CONTEXT_WINDOW = 40
+
+# "penicillin allergy", "allergic to amoxicillin": a mention, not a medication.
+# Anchored to the adjacent words so "penicillin allergy; start amoxicillin" keeps amoxicillin
+_ALLERGY_AFTER = re.compile(r"\W{0,3}(?:allerg|anaphyla|intoleran|sensitiv)", re.I)
+_ALLERGY_BEFORE = re.compile(r"(?:allerg\w*|anaphylaxis|intoleran\w*|reaction|sensitiv\w*)\s+to\s+$", re.I)
+
+# Candidate drug words; unknown ones with an antibiotic stem, e.g. "start xyzomycin", need the LLM.
+# Only antibiotic-specific stems: a bare "azole" or "sulfa" would also catch omeprazole, albendazole,
+# fluconazole and ferrous sulfate, routine plans the lexicon should resolve on its own
+_WORD = re.compile(r"\b[a-z][a-z-]{4,}\b", re.I)
+_ANTIBIOTIC_STEMS = re.compile(
+    r"(cillin|mycin|micin|floxacin|cef|ceph|cycline|penem|bactam|oxazole|nidazole|"
+    r"sulf(?:a(?:meth|diaz|cet|dox|guan)|isox)|oxacin|thromycin|planin|furantoin)",
+    re.I,
+)
+
+# Non-alphanumerics are mapped 1:1 to spaces so spans stay aligned with the input
+_FOLD = str.maketrans({c: " " for c in "-/+,;:()[]{}.'\"\n\t"})
+
+
+def _fold(text: str) -> str:
+    return text.lower().translate(_FOLD)
+
+
+class _Automaton:
+    """Aho-Corasick automaton over folded surface forms"""
+
+    def __init__(self, patterns: List[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[List[int]] = [[]]
+        self.lengths = [len(p) for p in patterns]
+        for pid, pattern in enumerate(patterns):
+            state = 0
+            for ch in pattern:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.goto[state][ch] = nxt
+                state = nxt
+            self.out[state].append(pid)
+
+        # BFS to set failure links and merge outputs
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(ch, 0)
+                # Depth-1 states fail to the root, not to themselves
+                self.fail[nxt] = target if target != nxt else 0
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def iter(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Yield (start, pattern_id) for every occurrence"""
+        goto, fail, out, lengths = self.goto, self.fail, self.out, self.lengths
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pid in out[state]:
+                yield i - lengths[pid] + 1, pid
+
+
+class LexiconMatch:
+    __slots__ = ("generic", "surface", "start", "end", "fuzzy", "has_context", "confidence")
+
+    def __init__(self, generic: str, surface: str, start: int, end: int, fuzzy: bool, has_context: bool):
+        self.generic = generic
+        self.surface = surface
+        self.start = start
+        self.end = end
+        self.fuzzy = fuzzy
+        self.has_context = has_context
+        base = CONFIDENCE_FUZZY if fuzzy else CONFIDENCE_EXACT
+        self.confidence = round(min(1.0, base + (CONTEXT_BONUS if has_context else 0.0)), 2)
+
+
+class LexiconResult:
+    __slots__ = ("meds", "matches", "unknown_candidates", "confidence")
+
+    def __init__(self, matches: List[LexiconMatch], unknown_candidates: List[str]):
+        self.matches = matches
+        self.meds = sorted({m.generic for m in matches})
+        self.unknown_candidates = unknown_candidates
+        if unknown_candidates:
+            self.confidence = 0.0
+        elif matches:
+            self.confidence = min(m.confidence for m in matches)
+        else:
+            # Nothing antibiotic-like anywhere in the text
+            self.confidence = 1.0
+
+
+def _build() -> Tuple[_Automaton, List[Tuple[str, str, bool]]]:
+    entries: Dict[str, Tuple[str, str, bool]] = {}
+    for generic, aliases in GENERICS.items():
+        for surface in [generic, *aliases]:
+            entries.setdefault(_fold(surface), (generic, surface, False))
+    for generic, typos in MISSPELLINGS.items():
+        for surface in typos:
+            entries.setdefault(_fold(surface), (generic, surface, True))
+    folded = list(entries)
+    return _Automaton(folded), [entries[f] for f in folded]
+
+
+_automaton, _entries = _build()
+_known_words = {w for f in (_fold(s) for _, s, _ in _entries) for w in f.split()}
+
+
+def match(text: str) -> LexiconResult:
+    """
+    Scan text for antibiotics; overlapping hits resolve leftmost-longest
+    (so "amoxicillin/clavulanate" is one combination, not two drugs)
+    """
+    folded = _fold(text)
+    n = len(folded)
+    hits = []
+    for start, pid in _automaton.iter(folded):
+        end = start + _automaton.lengths[pid]
+        # Whole words only
+        if (start > 0 and folded[start - 1].isalnum()) or (end < n and folded[end].isalnum()):
+            continue
+        hits.append((start, -(end - start), pid))
+    hits.sort()
+
+    matches: List[LexiconMatch] = []
+    covered_to = -1
+    for start, neg_len, pid in hits:
+        if start < covered_to:
+            continue
+        end = start - neg_len
+        covered_to = end
+        if _ALLERGY_AFTER.match(text, end) or _ALLERGY_BEFORE.search(text, max(0, start - 30), start):
+            continue
+        generic, surface, fuzzy = _entries[pid]
+        has_context = _CONTEXT.search(text, end, min(n, end + CONTEXT_WINDOW)) is not None
+        matches.append(LexiconMatch(generic, surface, start, end, fuzzy, has_context))
+
+    unknown = []
+    for m in _WORD.finditer(text):
+        word = m.group(0).lower()
+        if _ANTIBIOTIC_STEMS.search(word) and not any(w in _known_words for w in _fold(word).split()):
+            unknown.append(word)
+
+    return LexiconResult(matches, unknown)
@@ -1,11 +1,18 @@
-from typing import List
-from schemas.rules import AntibioticFindings, RuleFinding
-from schemas.rec import MedExtractionResult, RuleRecommendationList, RuleRecommendation
-from openai import OpenAI
+from typing import List, Optional, Tuple
+from collections import OrderedDict
+from schemas.rules import AntibioticFindings
+from schemas.rec import MedExtractionResult, RuleRecommendationList
+from services.llm_gateway import chat_completion
+from services.single_flight import SingleFlight, make_key
+from services import antibiotic_lexicon
+from services.rule_engine import rule_engine
+from services.med_normalizer import normalize_meds, normalize_allergies
+from services.recommendation_store import recommendation_store
 from dotenv import load_dotenv
 import os
 import logging
 import json
+import time
 
 load_dotenv()
 
@@ -19,16 +26,95 @@ You are a clinical assistant. Task: extract antibiotic GENERIC names present in
 - Examples of antibiotics: amoxicillin, azithromycin, ciprofloxacin, vancomycin, clindamycin, etc.
 """
 
+meds_flight = SingleFlight("extract_meds")
 
-def extract_meds_from_text(plan_text: str) -> list[str]:
+_meds_counts = {"calls": 0, "lexicon_runs": 0, "lexicon_resolved": 0, "llm_calls": 0, "lexicon_s_total": 0.0, "combined_reused": 0}
+
+# Plan text -> meds from a combined SOAP + meds extraction, so the rules
+# reuse them instead of paying a second LLM round trip
+_plan_meds: "OrderedDict[str, List[str]]" = OrderedDict()
+_PLAN_MEDS_MAX = int(os.getenv("PLAN_MEDS_CACHE_MAX_ENTRIES", "1024"))
+
+
+def _plan_key(plan_text: str) -> str:
+    return " ".join(plan_text.split())
+
+
+def remember_plan_meds(plan_text: str, meds: List[str]) -> None:
+    """Record the antibiotics a combined extraction found in this plan"""
+    if not plan_text or not plan_text.strip():
+        return
+    key = _plan_key(plan_text)
+    _plan_meds[key] = sorted(set(normalize_meds(meds)))
+    _plan_meds.move_to_end(key)
+    while len(_plan_meds) > _PLAN_MEDS_MAX:
+        _plan_meds.popitem(last=False)
+
+
+def remembered_plan_meds(plan_text: str) -> Optional[List[str]]:
+    meds = _plan_meds.get(_plan_key(plan_text or ""))
+    return list(meds) if meds is not None else None
+
+
+async def extract_meds_from_text(plan_text: str) -> list[str]:
     """
     Extracts medications from the plan text that is retrieved after SOAP extraction.
+    Meds already returned by a combined SOAP + meds extraction of this plan
+    are reused. Otherwise the compiled lexicon resolves the common cases locally; the LLM is only
+    asked when the lexicon's confidence is below MEDS_LEXICON_MIN_CONFIDENCE.
+    MEDS_EXTRACTOR_IMPL=llm always asks the LLM, =lexicon never does.
     """
     if not plan_text or not plan_text.strip():
         return []
-    
-    
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+    impl = os.getenv("MEDS_EXTRACTOR_IMPL", "hybrid")
+    _meds_counts["calls"] += 1
+    remembered = remembered_plan_meds(plan_text)
+    if remembered is not None:
+        _meds_counts["combined_reused"] += 1
+        if impl == "llm":
+            return remembered
+        # Same union as the LLM path: keep lexicon hits the model missed
+        return sorted(set(remembered) | set(antibiotic_lexicon.match(plan_text).meds))
+
+    lexicon_meds: list[str] = []
+    if impl != "llm":
+        start = time.perf_counter()
+        result = antibiotic_lexicon.match(plan_text)
+        _meds_counts["lexicon_s_total"] += time.perf_counter() - start
+        _meds_counts["lexicon_runs"] += 1
+        lexicon_meds = result.meds
+        if impl == "lexicon" or result.confidence >= float(os.getenv("MEDS_LEXICON_MIN_CONFIDENCE", "0.8")):
+            _meds_counts["lexicon_resolved"] += 1
+            return list(lexicon_meds)
+        logging.debug(
+            "Lexicon confidence %.2f (unknown=%s), asking LLM", result.confidence, result.unknown_candidates,
+        )
+
+    _meds_counts["llm_calls"] += 1
+    # Coalesced callers share the result list; hand each its own copy
+    llm_meds = await meds_flight.do(make_key(plan_text.strip()), lambda: _extract_meds_with_llm(plan_text))
+    # Keep lexicon hits even if the LLM misses them
+    return sorted(set(llm_meds) | set(lexicon_meds))
+
+
+def meds_extraction_stats() -> dict:
+    calls = _meds_counts["calls"]
+    lexicon_runs = _meds_counts["lexicon_runs"]
+    return {
+        "calls": calls,
+        "lexicon_resolved": _meds_counts["lexicon_resolved"],
+        "combined_reused": _meds_counts["combined_reused"],
+        "llm_calls": _meds_counts["llm_calls"],
+        "llm_avoidance_rate": round((_meds_counts["lexicon_resolved"] + _meds_counts["combined_reused"]) / calls, 4) if calls else 0.0,
+        "lexicon_us_avg": round(_meds_counts["lexicon_s_total"] / lexicon_runs * 1e6, 1) if lexicon_runs else 0.0,
+    }
+
+
+async def _extract_meds_with_llm(plan_text: str) -> list[str]:
+    """
+    LLM call behind extract_meds_from_text; identical concurrent inputs share one call
+    """
     schema = MedExtractionResult.model_json_schema() | {"additionalProperties": False}
 
     user_prompt = (
@@ -38,9 +124,8 @@ def extract_meds_from_text(plan_text: str) -> list[str]:
     )
 
     try:
-        resp = client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
-            messages=[
+        raw = await chat_completion(
+            [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": "Example input:\nStart amoxicillin 500 mg TID and consider vancomycin if needed\nReturn strictly JSON: {\"meds\": [\"amoxicillin\", \"vancomycin\"]}"},
                 {"role": "assistant", "content": "{\"meds\":[\"amoxicillin\", \"vancomycin\"]}"},
@@ -52,15 +137,14 @@ def extract_meds_from_text(plan_text: str) -> list[str]:
             timeout=15,
         )
 
-        raw = resp.choices[0].message.content
         logging.debug("LLM meds raw len=%d head=%.200s", len(raw or ""), raw or "")
         obj = json.loads(raw)  # raise if not valid JSON
         # Handle cases where model returns wrapped content
         if isinstance(obj, str):
             obj = json.loads(obj)
         meds = MedExtractionResult.model_validate(obj).meds
-        # normalize + dedupe
-        meds = sorted({m.strip().lower() for m in meds if isinstance(m, str) and m.strip()})
+        # normalize (brands, misspellings) + dedupe
+        meds = sorted(set(normalize_meds(meds)))
         logging.debug("LLM meds normalized: %s", meds)
         return meds
     
@@ -69,22 +153,27 @@ def extract_meds_from_text(plan_text: str) -> list[str]:
         return []
 
 
-def generate_recommendations(findings_dict: dict) -> RuleRecommendationList:
+async def generate_recommendations(findings_dict: dict) -> Tuple[RuleRecommendationList, str]:
     """
-    Given deterministic findings, ask the LLM to explain and suggest alternatives.
+    Given deterministic findings, explain them and suggest alternatives.
     Never changes findings; only augments with rationale/alternatives.
+    Curated and stored recommendations are served without an LLM call; the
+    LLM only fills findings the recommendation store has not seen. Also
+    returns the source ("curated", "stored" or "llm").
     """
+    return await recommendation_store.recommend(findings_dict, _generate_recommendations_with_llm)
+
+
+async def _generate_recommendations_with_llm(findings_dict: dict) -> RuleRecommendationList:
     try:
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
         schema = RuleRecommendationList.model_json_schema()
         schema["additionalProperties"] = False
 
         payload = json.dumps(findings_dict, ensure_ascii=False)
 
         return_instr = 'Return: {"recommendations":[{"findingId":"...","reason":"...","alternatives":["..."]}]}'
-        resp = client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
-            messages=[
+        content = await chat_completion(
+            [
                 {"role": "system", "content": "Explain antibiotic safety findings and propose safe alternatives. JSON only."},
                 {"role": "user", "content": f"Findings JSON:\n{payload}\n{return_instr}"},
             ],
@@ -93,7 +182,7 @@ def generate_recommendations(findings_dict: dict) -> RuleRecommendationList:
             max_tokens=250,
             timeout=15,
         )
-        return RuleRecommendationList.model_validate_json(resp.choices[0].message.content)
+        return RuleRecommendationList.model_validate_json(content)
     except Exception as e:
         logging.error(f"Error generating recommendations: {e}")
         return RuleRecommendationList(recommendations=[])
@@ -102,42 +191,66 @@ def generate_recommendations(findings_dict: dict) -> RuleRecommendationList:
 def check_antibiotics(meds: List[str], allergies: List[str]) -> AntibioticFindings:
     """
     Deterministic safety checks. Authoritative source of truth.
-    Example rule: amoxicillin contraindicated in penicillin allergy.
+    Evaluated against the compiled active rule set plus the drug-class
+    ontology; findings carry the rule set version. Names are normalized
+    first so brands and misspellings still match.
     """
-    def _normalize(values: List[str]) -> List[str]:
-        return [v.strip().lower() for v in values if isinstance(v, str)]
-
-    meds_n = set(_normalize(meds))
-    allergies_n = set(_normalize(allergies))
-
-    findings: List[RuleFinding] = []
-    if "amoxicillin" in meds_n and "penicillin" in allergies_n:
-        findings.append(
-            RuleFinding(
-                id="abx-penicillin-cross-reactivity",
-                title="Penicillin allergy with amoxicillin",
-                severity="high",
-                details=(
-                    "Patient has a documented penicillin allergy while amoxicillin is in the medication list. "
-                    "Consider alternative therapy and verify allergy history."
-                ),
-            )
-        )
+    rules = rule_engine.current
+    return AntibioticFindings(
+        findings=rules.evaluate(normalize_meds(meds, rules), normalize_allergies(allergies, rules)),
+        rule_set_version=rules.version,
+        rule_set_hash=rules.sha256_hash,
+        ontology_version=rules.ontology.version,
+    )
 
-    return AntibioticFindings(findings=findings)
+
+def safe_alternatives(recs: RuleRecommendationList, allergies: List[str]) -> RuleRecommendationList:
+    """
+    Stored recommendations are shared between patients, so drop any
+    alternative that would itself trip a rule for this patient's allergies
+    """
+    rules = rule_engine.current
+    allergies_n = normalize_allergies(allergies, rules)
+    if not allergies_n:
+        return recs
+    verdicts: dict = {}
+
+    def ok(alt: str) -> bool:
+        if alt not in verdicts:
+            verdicts[alt] = not rules.evaluate(normalize_meds([alt], rules), allergies_n)
+        return verdicts[alt]
+
+    return RuleRecommendationList(recommendations=[
+        rec.model_copy(update={"alternatives": [a for a in rec.alternatives if ok(a)]})
+        for rec in recs.recommendations
+    ])
 
 
-def analyze_antibiotics(meds: List[str] | None, allergies: List[str], plan_text: str | None = None) -> dict:
+async def analyze_antibiotics(meds: List[str] | None, allergies: List[str], plan_text: str | None = None) -> dict:
     """
     Orchestrate extraction (if needed), deterministic checks, and LLM augmentation.
     Returns a combined dict suitable for WS or HTTP responses.
     """
-    resolved_meds = meds or (extract_meds_from_text(plan_text or "") if plan_text else [])
+    resolved_meds = normalize_meds(meds) if meds else (await extract_meds_from_text(plan_text or "") if plan_text else [])
+    return await analyze_with_meds(resolved_meds, allergies)
+
+
+async def analyze_with_meds(resolved_meds: List[str], allergies: List[str]) -> dict:
+    """
+    Deterministic checks plus LLM augmentation for meds that are already
+    resolved, in the same shape as analyze_antibiotics
+    """
     findings_obj = check_antibiotics(resolved_meds, allergies)
-    recs = generate_recommendations(findings_obj.model_dump()) if findings_obj.findings else RuleRecommendationList(recommendations=[])
+    if findings_obj.findings:
+        recs, source = await generate_recommendations(findings_obj.model_dump())
+    else:
+        recs, source = RuleRecommendationList(recommendations=[]), None
+    recs = safe_alternatives(recs, allergies)
 
     return {
         "meds": resolved_meds,
         "findings": findings_obj.model_dump(),
         "recommendations": recs.model_dump(),
+        # "curated", "stored" or "llm"; None without findings
+        "recommendations_source": source,
     }
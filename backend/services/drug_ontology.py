@@ -0,0 +1,185 @@
+"""
+Antibiotic class ontology with precomputed allergy conflict sets.
+
+Every drug gets a dense integer id; every class is a bitset (a Python int)
+of the drugs in it or any descendant class. At load time each possible
+allergen (class or drug) is resolved to the allergy group it implies, and
+the transitive closure of cross-reactivity edges from that group is walked
+once, producing a short list of (severity, bitset) conflicts with higher
+severities claiming drugs first. A patient check is then one OR over their
+meds and one AND per conflict, independent of formulary size.
+"""
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from pathlib import Path
+import hashlib
+import heapq
+import json
+import yaml
+
+ONTOLOGY_PATH = Path(__file__).resolve().parent.parent / "rules" / "drug_classes.yaml"
+
+SEVERITY_RANK = {"low": 1, "medium": 2, "high": 3}
+_RANK_SEVERITY = {v: k for k, v in SEVERITY_RANK.items()}
+
+
+def _norm(value: str) -> str:
+    return " ".join(value.strip().lower().split())
+
+
+def _slug(value: str) -> str:
+    return "-".join(value.split())
+
+
+class ClassConflict:
+    __slots__ = ("finding_id", "severity", "mask", "scope", "target", "details")
+
+    def __init__(self, finding_id: str, severity: str, mask: int, scope: str, target: Optional[str], details: str):
+        self.finding_id = finding_id
+        self.severity = severity
+        self.mask = mask
+        # Allergy group the allergen resolved to, and the cross-reactive class (None for same-class)
+        self.scope = scope
+        self.target = target
+        self.details = details
+
+
+class DrugOntology:
+    def __init__(self, raw: dict):
+        self.version = str(raw.get("version", "unversioned"))
+        self.version_hash = hashlib.sha256(json.dumps(raw, sort_keys=True, default=str).encode()).hexdigest()
+
+        classes: Dict[str, dict] = {_norm(k): (v or {}) for k, v in (raw.get("classes") or {}).items()}
+        self.parent: Dict[str, Optional[str]] = {c: (_norm(v["parent"]) if v.get("parent") else None) for c, v in classes.items()}
+        self.allergy_groups: Set[str] = {c for c, v in classes.items() if v.get("allergy_group")}
+        for c, p in self.parent.items():
+            if p is not None and p not in classes:
+                raise ValueError(f"Class {c!r} has unknown parent {p!r}")
+
+        drugs = {_norm(d): [_norm(c) for c in cs] for d, cs in (raw.get("drugs") or {}).items()}
+        self.drug_names: List[str] = sorted(drugs)
+        self.drug_ids: Dict[str, int] = {d: i for i, d in enumerate(self.drug_names)}
+        self.drug_classes: Dict[str, List[str]] = drugs
+
+        # Class membership closure: a drug belongs to its classes and all their ancestors
+        self.class_mask: Dict[str, int] = {c: 0 for c in classes}
+        for drug, direct in drugs.items():
+            bit = 1 << self.drug_ids[drug]
+            for c in direct:
+                if c not in classes:
+                    raise ValueError(f"Drug {drug!r} has unknown class {c!r}")
+                for ancestor in self.ancestors(c):
+                    self.class_mask[ancestor] |= bit
+
+        self.aliases: Dict[str, str] = {_norm(k): _norm(v) for k, v in (raw.get("allergen_aliases") or {}).items()}
+
+        self.cross_edges: Dict[str, List[Tuple[str, int, str]]] = {}
+        for edge in raw.get("cross_reactivity") or []:
+            src, dst = _norm(edge["from"]), _norm(edge["to"])
+            if src not in classes or dst not in classes:
+                raise ValueError(f"Cross-reactivity edge {src!r} -> {dst!r} references an unknown class")
+            self.cross_edges.setdefault(src, []).append((dst, SEVERITY_RANK[edge.get("severity", "low")], edge.get("details", "")))
+
+        self._conflicts: Dict[str, Tuple[ClassConflict, ...]] = {}
+        for key in list(classes) + self.drug_names:
+            self._conflicts[key] = self._compile_conflicts(key)
+
+    def ancestors(self, cls: str) -> List[str]:
+        """cls and its ancestors, nearest first"""
+        out = []
+        while cls is not None:
+            out.append(cls)
+            cls = self.parent.get(cls)
+        return out
+
+    def _depth(self, cls: str) -> int:
+        return len(self.ancestors(cls))
+
+    def _scope(self, key: str) -> Optional[str]:
+        """The class an allergy to `key` applies to"""
+        if key in self.class_mask:
+            return key
+        for direct in self.drug_classes.get(key, []):
+            for ancestor in self.ancestors(direct):
+                if ancestor in self.allergy_groups:
+                    return ancestor
+        return None
+
+    def _compile_conflicts(self, key: str) -> Tuple[ClassConflict, ...]:
+        scope = self._scope(key)
+        if scope is None:
+            return ()
+
+        # Best (weakest-link) severity to every class reachable through cross-reactivity,
+        # starting from edges declared on the scope or any of its ancestors
+        best: Dict[str, Tuple[int, str]] = {}
+        heap: List[Tuple[int, str, str]] = []
+        for origin in self.ancestors(scope):
+            for dst, rank, details in self.cross_edges.get(origin, []):
+                heapq.heappush(heap, (-rank, dst, details))
+        while heap:
+            neg_rank, cls, details = heapq.heappop(heap)
+            if cls in best:
+                continue
+            best[cls] = (-neg_rank, details)
+            for origin in self.ancestors(cls):
+                for dst, rank, d in self.cross_edges.get(origin, []):
+                    if dst not in best:
+                        heapq.heappush(heap, (-min(-neg_rank, rank), dst, d))
+
+        conflicts = [ClassConflict(f"abx-{_slug(scope)}-class-allergy", "high", self.class_mask[scope], scope, None, "")]
+        claimed = self.class_mask[scope]
+        # Higher severity first, then more specific class, so each drug lands in exactly one conflict
+        for cls, (rank, details) in sorted(best.items(), key=lambda kv: (-kv[1][0], -self._depth(kv[0]), kv[0])):
+            mask = self.class_mask[cls] & ~claimed
+            if not mask:
+                continue
+            claimed |= mask
+            conflicts.append(ClassConflict(
+                f"abx-{_slug(scope)}-{_slug(cls)}-cross-reactivity", _RANK_SEVERITY[rank], mask, scope, cls, details,
+            ))
+        return tuple(conflicts)
+
+    def canonical(self, name: str) -> str:
+        """Normalized allergen/drug name with aliases applied"""
+        n = _norm(name)
+        return self.aliases.get(n, n)
+
+    def allergens(self) -> List[str]:
+        """Every canonical allergen with compiled conflicts"""
+        return list(self._conflicts)
+
+    def conflicts(self, allergen: str) -> Tuple[ClassConflict, ...]:
+        return self._conflicts.get(self.canonical(allergen), ())
+
+    def mask(self, drugs: Iterable[str]) -> int:
+        out = 0
+        ids = self.drug_ids
+        for d in drugs:
+            i = ids.get(d)
+            if i is not None:
+                out |= 1 << i
+        return out
+
+    def names(self, mask: int) -> List[str]:
+        out = []
+        while mask:
+            low = mask & -mask
+            out.append(self.drug_names[low.bit_length() - 1])
+            mask ^= low
+        return out
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "drugs": len(self.drug_names),
+            "classes": len(self.class_mask),
+            "allergens_compiled": len(self._conflicts),
+        }
+
+
+def load_ontology(path: Path = ONTOLOGY_PATH) -> DrugOntology:
+    with open(path, encoding="utf-8") as f:
+        return DrugOntology(yaml.safe_load(f) or {})
+
+
+drug_ontology = load_ontology()
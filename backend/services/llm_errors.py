@@ -0,0 +1,37 @@
+"""
+Error types raised by the LLM gateway. Routers map these to status codes.
+"""
+from typing import Optional
+
+
+class LLMError(Exception):
+    # False for errors raised locally without reaching the provider; those
+    # must not count against the circuit breaker
+    upstream = True
+
+    def __init__(self, message: str = "", retry_after: Optional[float] = None):
+        super().__init__(message)
+        # Seconds the upstream asked us to wait (Retry-After), if any
+        self.retry_after = retry_after
+
+
+class LLMTimeoutError(LLMError):
+    pass
+
+
+class LLMRateLimitError(LLMError):
+    pass
+
+
+class LLMOverloadedError(LLMError):
+    pass
+
+
+class LLMCircuitOpenError(LLMError):
+    """Raised without calling upstream while the circuit breaker is open"""
+    upstream = False
+
+
+class LLMQueueFullError(LLMError):
+    """Raised when the scheduler queue for the caller's priority is full"""
+    upstream = False
@@ -0,0 +1,238 @@
+"""
+Shared async gateway for all OpenAI traffic.
+
+One pooled AsyncOpenAI client (httpx keep-alive) is created lazily per process
+and reused by every caller, so LLM round trips never block the event loop and
+don't pay a connection/TLS handshake per request.
+"""
+from typing import Any, AsyncIterator, List, Optional
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from openai import AsyncOpenAI
+import openai
+import httpx
+from dotenv import load_dotenv
+import os
+import logging
+
+from services.llm_errors import (
+    LLMError,
+    LLMTimeoutError,
+    LLMRateLimitError,
+    LLMOverloadedError,
+    LLMCircuitOpenError,
+    LLMQueueFullError,
+)
+from services.llm_resilience import call_with_resilience
+from services.llm_scheduler import llm_scheduler, estimate_tokens
+
+load_dotenv()
+
+_client: Optional[AsyncOpenAI] = None
+
+
+def default_model() -> str:
+    return os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+
+def get_client() -> AsyncOpenAI:
+    """
+    Return the process-wide AsyncOpenAI client, creating it on first use
+    """
+    global _client
+    if _client is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "100")),
+                max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20")),
+                keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY_S", "60")),
+            ),
+            timeout=httpx.Timeout(60.0, connect=5.0),
+        )
+        # Retries are owned by llm_resilience (backoff, Retry-After, breaker)
+        _client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client, max_retries=0)
+        logging.info("LLM gateway client created base_url=%s", _client.base_url)
+    return _client
+
+
+def set_client(client: Optional[AsyncOpenAI]) -> None:
+    """
+    Swap the shared client (benchmarks and stub servers inject their own)
+    """
+    global _client
+    _client = client
+
+
+async def close_client() -> None:
+    """
+    Close the pooled connections; called on application shutdown
+    """
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def _retry_after(e: openai.APIStatusError) -> Optional[float]:
+    """
+    Seconds from Retry-After / retry-after-ms, if the upstream sent one
+    """
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            when = parsedate_to_datetime(value)
+            return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def _map_error(e: Exception, what: str) -> Exception:
+    """
+    Translate SDK/transport errors into LLM* errors; others pass through
+    """
+    if isinstance(e, (httpx.TimeoutException, openai.APITimeoutError)):
+        return LLMTimeoutError(f"{what} request timed out")
+    if isinstance(e, openai.RateLimitError):
+        return LLMRateLimitError(f"{what} rate limit exceeded", retry_after=_retry_after(e))
+    if isinstance(e, openai.APIStatusError):
+        # Map 5xx to overloaded
+        status = getattr(e, "status_code", None)
+        if status and 500 <= int(status) <= 599:
+            return LLMOverloadedError(f"{what} service overloaded (status {status})", retry_after=_retry_after(e))
+    elif isinstance(e, openai.APIConnectionError):
+        return LLMOverloadedError(f"{what} service unreachable")
+    return e
+
+
+async def chat_completion(
+    messages: List[dict],
+    *,
+    temperature: float = 0.0,
+    max_tokens: int = 300,
+    timeout: float = 20,
+    response_format: Optional[dict] = None,
+    model: Optional[str] = None,
+) -> str:
+    """
+    Run a chat completion and return the message content.
+    Transport failures are mapped to the LLM* exceptions so routers can turn
+    them into proper status codes; retryable ones are retried with backoff.
+    Every attempt is admitted by the rate-limit scheduler first.
+    """
+    kwargs: dict[str, Any] = {}
+    if response_format is not None:
+        kwargs["response_format"] = response_format
+    estimated = estimate_tokens(messages, max_tokens)
+
+    async def once():
+        await llm_scheduler.acquire(estimated)
+        try:
+            response = await get_client().chat.completions.create(
+                model=model or default_model(),
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=timeout,
+                **kwargs,
+            )
+        except Exception as e:
+            mapped = _map_error(e, "LLM")
+            if mapped is e:
+                raise
+            raise mapped from e
+        usage = getattr(response, "usage", None)
+        llm_scheduler.record_usage(estimated, getattr(usage, "total_tokens", None))
+        return response
+
+    response = await call_with_resilience(once)
+    return response.choices[0].message.content
+
+
+async def chat_completion_stream(
+    messages: List[dict],
+    *,
+    temperature: float = 0.0,
+    max_tokens: int = 300,
+    timeout: float = 20,
+    response_format: Optional[dict] = None,
+    model: Optional[str] = None,
+) -> AsyncIterator[str]:
+    """
+    Stream a chat completion, yielding content deltas as they arrive.
+    Opening the stream goes through the scheduler and resilience policy like
+    chat_completion; once content has started flowing a failure is mapped
+    and raised, not retried, since the caller has already consumed output.
+    `timeout` applies to each read, so a stalled stream still times out.
+    """
+    kwargs: dict[str, Any] = {}
+    if response_format is not None:
+        kwargs["response_format"] = response_format
+    estimated = estimate_tokens(messages, max_tokens)
+
+    async def open_stream():
+        await llm_scheduler.acquire(estimated)
+        try:
+            return await get_client().chat.completions.create(
+                model=model or default_model(),
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=timeout,
+                stream=True,
+                stream_options={"include_usage": True},
+                **kwargs,
+            )
+        except Exception as e:
+            mapped = _map_error(e, "LLM")
+            if mapped is e:
+                raise
+            raise mapped from e
+
+    stream = await call_with_resilience(open_stream)
+    actual_tokens = None
+    try:
+        async for chunk in stream:
+            usage = getattr(chunk, "usage", None)
+            if usage is not None:
+                actual_tokens = usage.total_tokens
+            for choice in chunk.choices:
+                if choice.delta and choice.delta.content:
+                    yield choice.delta.content
+    except Exception as e:
+        mapped = _map_error(e, "LLM")
+        if mapped is e:
+            raise
+        raise mapped from e
+    finally:
+        await stream.close()
+        llm_scheduler.record_usage(estimated, actual_tokens)
+
+
+async def transcribe(filename: str, audio_bytes: bytes, *, model: Optional[str] = None) -> Optional[str]:
+    """
+    Transcribe an in-memory audio file and return the text
+    """
+    async def once():
+        # Transcriptions are billed per audio minute; they only use a request slot
+        await llm_scheduler.acquire(0)
+        try:
+            return await get_client().audio.transcriptions.create(
+                model=model or os.getenv("STT_MODEL", "gpt-4o-mini-transcribe"),
+                file=(filename, audio_bytes),
+                response_format="json",
+            )
+        except Exception as e:
+            mapped = _map_error(e, "STT")
+            if mapped is e:
+                raise
+            raise mapped from e
+
+    result = await call_with_resilience(once)
+    return getattr(result, "text", None) or (result["text"] if isinstance(result, dict) else None)
@@ -0,0 +1,186 @@
+"""
+Retry and circuit-breaker policy for LLM calls.
+
+Retries use exponential backoff with full jitter and never wait less than the
+upstream's Retry-After. Each error class has its own policy. A process-wide
+circuit breaker trips after consecutive upstream failures so that during a
+brownout requests fail fast instead of queueing up behind doomed retries.
+"""
+from typing import Awaitable, Callable, Dict, Optional, Type, TypeVar
+from dotenv import load_dotenv
+import asyncio
+import logging
+import os
+import random
+import time
+
+from services.llm_errors import (
+    LLMError,
+    LLMTimeoutError,
+    LLMRateLimitError,
+    LLMOverloadedError,
+    LLMCircuitOpenError,
+)
+
+load_dotenv()
+
+T = TypeVar("T")
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int, base_delay: float, max_delay: float, max_retry_after: float = 30.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # A Retry-After longer than this is not worth waiting for in a request
+        self.max_retry_after = max_retry_after
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> Optional[float]:
+        """
+        Seconds to sleep before the next attempt, or None to give up
+        """
+        if attempt >= self.max_attempts:
+            return None
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+        if retry_after is not None:
+            if retry_after > self.max_retry_after:
+                return None
+            return max(backoff, retry_after)
+        return backoff
+
+
+DEFAULT_POLICIES: Dict[Type[LLMError], RetryPolicy] = {
+    LLMRateLimitError: RetryPolicy(max_attempts=4, base_delay=1.0, max_delay=10.0),
+    LLMOverloadedError: RetryPolicy(max_attempts=3, base_delay=0.5, max_delay=4.0),
+    # A timed-out call already burned its full timeout; retry once at most
+    LLMTimeoutError: RetryPolicy(max_attempts=2, base_delay=0.2, max_delay=1.0),
+}
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures;
+    open -> half_open after `reset_timeout` seconds;
+    half_open lets one probe through and closes on success, reopens on failure;
+    callers arriving while the probe is in flight wait for its outcome.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_settled: Optional[asyncio.Event] = None
+        self.times_opened = 0
+        self.rejected = 0
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker will let a probe through"""
+        if self.state != "open":
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    async def before_call(self) -> None:
+        while True:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    raise LLMCircuitOpenError(f"LLM circuit '{self.name}' is open", retry_after=self.retry_after())
+                self.state = "half_open"
+            if self.state == "half_open":
+                if self._probe_in_flight:
+                    await self._probe_settled.wait()
+                    continue
+                self._probe_in_flight = True
+                self._probe_settled = asyncio.Event()
+            return
+
+    def release_probe(self) -> None:
+        if self._probe_in_flight:
+            self._probe_in_flight = False
+            self._probe_settled.set()
+
+    def record_success(self) -> None:
+        self.release_probe()
+        self.consecutive_failures = 0
+        if self.state != "closed":
+            logging.info("LLM circuit %s closed", self.name)
+        self.state = "closed"
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+                logging.warning("LLM circuit %s opened after %d failures", self.name, self.consecutive_failures)
+            self.state = "open"
+            self.opened_at = time.monotonic()
+        # Released after the state change so waiters observe the reopened breaker
+        self.release_probe()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "retry_after_s": round(self.retry_after(), 2),
+        }
+
+
+llm_breaker = CircuitBreaker(
+    "openai",
+    failure_threshold=int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5")),
+    reset_timeout=float(os.getenv("LLM_BREAKER_RESET_TIMEOUT_S", "30")),
+)
+
+retry_counts: Dict[str, int] = {"retries": 0, "gave_up": 0}
+
+
+async def call_with_resilience(
+    fn: Callable[[], Awaitable[T]],
+    breaker: Optional[CircuitBreaker] = None,
+    policies: Dict[Type[LLMError], RetryPolicy] = DEFAULT_POLICIES,
+) -> T:
+    """
+    Call fn() under the breaker, retrying LLM errors per their class policy.
+    Non-LLM errors (bad requests, validation) are raised immediately and do
+    not count against the breaker.
+    """
+    breaker = breaker or llm_breaker
+    attempt = 1
+    while True:
+        await breaker.before_call()
+        try:
+            result = await fn()
+        except LLMError as e:
+            if not e.upstream:
+                breaker.release_probe()
+                raise
+            breaker.record_failure()
+            policy = policies.get(type(e))
+            delay = policy.delay(attempt, e.retry_after) if policy else None
+            if delay is None or breaker.state == "open":
+                retry_counts["gave_up"] += 1
+                raise
+            logging.warning("LLM call failed (%s), retry %d in %.2fs", type(e).__name__, attempt, delay)
+            retry_counts["retries"] += 1
+            attempt += 1
+            await asyncio.sleep(delay)
+            continue
+        except asyncio.CancelledError:
+            # Don't leave a half-open probe slot held by a cancelled caller
+            breaker.release_probe()
+            raise
+        except Exception:
+            breaker.record_success()
+            raise
+        breaker.record_success()
+        return result
+
+
+def stats() -> dict:
+    return {"breaker": llm_breaker.stats(), **retry_counts}
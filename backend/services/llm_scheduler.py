@@ -0,0 +1,212 @@
+"""
+Process-wide admission control for OpenAI calls.
+
+Two token buckets (requests/min and tokens/min) mirror the account quota so we
+throttle ourselves before OpenAI answers 429. Callers that can't be admitted
+immediately wait in a bounded priority queue: interactive traffic (HTTP and
+WebSocket requests) is always served before batch work. Priority travels with
+the request through a context variable, so call sites only need to wrap batch
+jobs in `llm_priority(BATCH)`.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+from dotenv import load_dotenv
+import asyncio
+import heapq
+import itertools
+import os
+import time
+
+from services.llm_errors import LLMQueueFullError
+
+load_dotenv()
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+_priority: ContextVar[int] = ContextVar("llm_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def llm_priority(level: int) -> Iterator[None]:
+    """Run the enclosed LLM calls at the given priority class"""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """
+    Continuous-refill bucket; rate <= 0 means unlimited. The level may go
+    negative when actual usage exceeds the estimate, which delays later callers.
+    """
+
+    def __init__(self, rate_per_s: float, capacity: float):
+        self.rate_per_s = rate_per_s
+        self.capacity = capacity
+        self.level = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate_per_s)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be taken (0 if now)"""
+        if self.rate_per_s <= 0:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate_per_s
+
+    def take(self, amount: float) -> None:
+        if self.rate_per_s <= 0:
+            return
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, delta: float) -> None:
+        """Charge (positive) or refund (negative) after the fact"""
+        if self.rate_per_s <= 0:
+            return
+        self._refill()
+        self.level = min(self.capacity, self.level - delta)
+
+
+class _Waiter:
+    __slots__ = ("future", "tokens", "priority", "enqueued_at")
+
+    def __init__(self, future: asyncio.Future, tokens: int, priority: int):
+        self.future = future
+        self.tokens = tokens
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+
+
+class LLMScheduler:
+    def __init__(self, requests_per_min: float, tokens_per_min: float, max_queue: Dict[int, int]):
+        self.requests = TokenBucket(requests_per_min / 60, requests_per_min)
+        self.tokens = TokenBucket(tokens_per_min / 60, tokens_per_min)
+        self.max_queue = max_queue
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._queued = {p: 0 for p in max_queue}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._metrics = {
+            p: {"admitted": 0, "queued": 0, "dequeued": 0, "rejected": 0, "wait_s_total": 0.0, "wait_s_max": 0.0}
+            for p in max_queue
+        }
+
+    async def acquire(self, estimated_tokens: int, priority: Optional[int] = None) -> None:
+        """
+        Wait until the call may be sent; raises LLMQueueFullError when the
+        queue for this priority class is full
+        """
+        priority = _priority.get() if priority is None else priority
+        metrics = self._metrics[priority]
+
+        # Fast path: nothing queued ahead of us and both buckets have room
+        if not self._heap and self._wait_time(estimated_tokens) == 0:
+            self._grant(estimated_tokens)
+            metrics["admitted"] += 1
+            return
+
+        if self._queued[priority] >= self.max_queue[priority]:
+            metrics["rejected"] += 1
+            raise LLMQueueFullError(f"LLM {PRIORITY_NAMES[priority]} queue is full", retry_after=1.0)
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), estimated_tokens, priority)
+        heapq.heappush(self._heap, (priority, next(self._seq), waiter))
+        self._queued[priority] += 1
+        metrics["queued"] += 1
+        self._pump()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if not waiter.future.cancelled():
+                # Granted just as we were cancelled: give the capacity back
+                self.requests.adjust(-1)
+                self.tokens.adjust(-waiter.tokens)
+            else:
+                self._queued[priority] -= 1
+            self._pump()
+            raise
+
+        waited = time.monotonic() - waiter.enqueued_at
+        metrics["admitted"] += 1
+        metrics["dequeued"] += 1
+        metrics["wait_s_total"] += waited
+        metrics["wait_s_max"] = max(metrics["wait_s_max"], waited)
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Reconcile the token bucket once the real usage is known"""
+        if actual_tokens is not None:
+            self.tokens.adjust(actual_tokens - estimated_tokens)
+
+    def _wait_time(self, tokens: int) -> float:
+        return max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+
+    def _grant(self, tokens: int) -> None:
+        self.requests.take(1)
+        self.tokens.take(tokens)
+
+    def _pump(self) -> None:
+        """Admit queued waiters in priority order while the buckets allow"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._heap:
+            _, _, waiter = self._heap[0]
+            if waiter.future.done():
+                heapq.heappop(self._heap)
+                continue
+            wait = self._wait_time(waiter.tokens)
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._pump)
+                return
+            heapq.heappop(self._heap)
+            self._queued[waiter.priority] -= 1
+            self._grant(waiter.tokens)
+            waiter.future.set_result(None)
+
+    def stats(self) -> dict:
+        out = {}
+        for p, m in self._metrics.items():
+            waited = m["dequeued"]
+            out[PRIORITY_NAMES[p]] = {
+                "admitted": m["admitted"],
+                "queued_total": m["queued"],
+                "queue_depth": self._queued[p],
+                "rejected": m["rejected"],
+                "wait_ms_avg": round(m["wait_s_total"] / waited * 1000, 2) if waited > 0 else 0.0,
+                "wait_ms_max": round(m["wait_s_max"] * 1000, 2),
+            }
+        out["requests_available"] = round(self.requests.level, 1)
+        out["tokens_available"] = round(self.tokens.level, 1)
+        return out
+
+
+def estimate_tokens(messages: List[dict], max_tokens: int) -> int:
+    """
+    Rough prompt size (~4 chars per token) plus the completion budget
+    """
+    chars = sum(len(m.get("content") or "") for m in messages)
+    return chars // 4 + max_tokens
+
+
+llm_scheduler = LLMScheduler(
+    requests_per_min=float(os.getenv("LLM_REQUESTS_PER_MIN", "500")),
+    tokens_per_min=float(os.getenv("LLM_TOKENS_PER_MIN", "200000")),
+    max_queue={
+        INTERACTIVE: int(os.getenv("LLM_QUEUE_MAX_INTERACTIVE", "100")),
+        BATCH: int(os.getenv("LLM_QUEUE_MAX_BATCH", "1000")),
+    },
+)
@@ -0,0 +1,297 @@
+"""
+Fuzzy medication and allergen name normalization.
+
+Free-text names ("Augmentin", "amoxicilin 500 mg", "amox-clav", "PCN")
+are resolved to the canonical names the rule engine indexes. Surfaces come
+from the lexicon (generics, brands, misspellings), the drug ontology
+(drugs, classes, allergen aliases) and the drugs named by the active rule
+set. Exact surfaces resolve with one dict lookup; everything else goes
+through a SymSpell index (precomputed deletes over a term prefix) with a
+length-dependent edit-distance bound, so lookup cost does not grow with the
+table. Fuzzy matches must keep the first letter, and one equally close to
+two different drugs is left unresolved rather than guessed. Results are
+memoized in an LRU cache, and the index is rebuilt when the active rule set
+changes.
+"""
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import os
+import re
+import time
+
+import numpy as np
+
+from services.antibiotic_lexicon import GENERICS, MISSPELLINGS
+from services.rule_engine import CompiledRuleSet, normalize_name, rule_engine
+
+MAX_EDIT_DISTANCE = int(os.getenv("MED_NORMALIZER_MAX_EDIT_DISTANCE", "2"))
+CACHE_SIZE = int(os.getenv("MED_NORMALIZER_CACHE_SIZE", "8192"))
+PREFIX_LENGTH = 7
+# Longer inputs are sentences, not names; don't spend fuzzy lookups on them
+MAX_FUZZY_LENGTH = 48
+
+_PARENTHETICAL = re.compile(r"\([^)]*\)|\[[^\]]*\]")
+_FOLD = str.maketrans({c: " " for c in "-/+,;:()[]{}.'\"_*"})
+_TRAILING_WORDS = {"allergy", "allergies", "allergic", "intolerance", "sensitivity", "tablet", "tablets", "tab",
+                   "tabs", "capsule", "capsules", "cap", "caps", "syrup", "suspension", "injection", "iv", "po", "im",
+                   "ds", "ss", "xr", "er", "sr", "xl"}
+
+
+def fold(text: str) -> str:
+    """Lowercase, punctuation to spaces, and drop notes, the dose and anything after it"""
+    tokens = _PARENTHETICAL.sub(" ", text.lower()).translate(_FOLD).split()
+    for i, token in enumerate(tokens):
+        if token[0].isdigit():
+            del tokens[i:]
+            break
+    while tokens and tokens[-1] in _TRAILING_WORDS:
+        tokens.pop()
+    return " ".join(tokens)
+
+
+def max_distance_for(length: int, cap: int = MAX_EDIT_DISTANCE) -> int:
+    # Short names are too close to each other for typo tolerance to be safe
+    if length <= 4:
+        return 0
+    if length <= 8:
+        return min(1, cap)
+    return cap
+
+
+def bounded_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance, or limit + 1 once it must exceed limit"""
+    if a == b:
+        return 0
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    # Typos are local: only the differing core needs the DP
+    start, end_a, end_b = 0, len(a), len(b)
+    while start < end_a and start < end_b and a[start] == b[start]:
+        start += 1
+    while end_a > start and end_b > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+    a, b = a[start:end_a], b[start:end_b]
+    la, lb = len(a), len(b)
+    if not la or not lb:
+        return max(la, lb) if max(la, lb) <= limit else limit + 1
+    if la == lb == 2 and a[0] == b[1] and a[1] == b[0]:
+        return 1
+
+    prev2: List[int] = []
+    prev = list(range(lb + 1))
+    for i in range(1, la + 1):
+        cur = [i] + [0] * lb
+        row_min = i
+        ca = a[i - 1]
+        for j in range(1, lb + 1):
+            cost = 0 if ca == b[j - 1] else 1
+            v = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == b[j - 1]:
+                v = min(v, prev2[j - 2] + 1)
+            cur[j] = v
+            if v < row_min:
+                row_min = v
+        if row_min > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[lb] if prev[lb] <= limit else limit + 1
+
+
+def _deletes(word: str, distance: int) -> Set[str]:
+    out = {word}
+    frontier = {word}
+    for _ in range(distance):
+        nxt = set()
+        for w in frontier:
+            for i in range(len(w)):
+                nxt.add(w[:i] + w[i + 1:])
+        nxt -= out
+        out |= nxt
+        frontier = nxt
+    return out
+
+
+def _char_codes(word: str) -> np.ndarray:
+    codes = np.frombuffer(word.encode("ascii", "replace"), dtype=np.uint8).astype(np.int16) - ord("a")
+    codes[(codes < 0) | (codes > 25)] = 26
+    return codes
+
+
+class SymSpellIndex:
+    """
+    Symmetric-delete index: every term's prefix deletes (up to max_distance)
+    map back to the term, so a lookup only generates the query's own deletes.
+    Candidates are filtered in bulk on length, first letter and a
+    letter-count lower bound before any DP runs.
+    """
+
+    def __init__(self, terms: Dict[str, str], max_distance: int = MAX_EDIT_DISTANCE, prefix_length: int = PREFIX_LENGTH):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.surfaces: List[str] = list(terms)
+        self.canonical: List[str] = [terms[s] for s in self.surfaces]
+        self.exact: Dict[str, int] = {s: i for i, s in enumerate(self.surfaces)}
+        deletes: Dict[str, List[int]] = {}
+        # Synonym tables share prefixes heavily; generate each prefix's deletes once
+        by_prefix: Dict[str, List[int]] = {}
+        for i, surface in enumerate(self.surfaces):
+            by_prefix.setdefault(surface[:prefix_length], []).append(i)
+        for prefix, ids in by_prefix.items():
+            for d in _deletes(prefix, max_distance):
+                deletes.setdefault(d, []).extend(ids)
+        self.deletes: Dict[str, np.ndarray] = {d: np.asarray(ids, dtype=np.int32) for d, ids in deletes.items()}
+
+        n = len(self.surfaces)
+        self.lengths = np.fromiter((len(s) for s in self.surfaces), dtype=np.int16, count=n)
+        codes = _char_codes("".join(self.surfaces))
+        rows = np.repeat(np.arange(n), self.lengths)
+        self.letter_counts = np.zeros((n, 27), dtype=np.int16)
+        np.add.at(self.letter_counts, (rows, codes), 1)
+        starts = np.concatenate(([0], np.cumsum(self.lengths[:-1], dtype=np.int64))) if n else np.zeros(0, dtype=np.int64)
+        self.first = codes[starts] if n else np.zeros(0, dtype=np.int16)
+
+    def lookup(self, word: str, max_distance: Optional[int] = None) -> Optional[Tuple[str, str, int]]:
+        """(canonical, surface, distance) of the closest term, None if absent or ambiguous"""
+        i = self.exact.get(word)
+        if i is not None:
+            return self.canonical[i], self.surfaces[i], 0
+        limit = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        if limit <= 0:
+            return None
+
+        hits = [ids for d in _deletes(word[:self.prefix_length], limit) if (ids := self.deletes.get(d)) is not None]
+        if not hits:
+            return None
+        ids = np.unique(np.concatenate(hits))
+        codes = _char_codes(word)
+        # Typos rarely change the first letter; different drugs often differ only there
+        # (pefloxacin / ofloxacin)
+        ids = ids[(np.abs(self.lengths[ids] - len(word)) <= limit) & (self.first[ids] == codes[0])]
+        if not ids.size:
+            return None
+        # Every edit fixes at most one surplus and one missing letter
+        counts = np.bincount(codes, minlength=27).astype(np.int16)
+        diff = self.letter_counts[ids] - counts
+        lower = np.maximum(np.clip(diff, 0, None).sum(axis=1), np.clip(-diff, 0, None).sum(axis=1))
+        keep = lower <= limit
+        ids, lower = ids[keep], lower[keep]
+
+        best_distance = limit + 1
+        best: List[int] = []
+        order = np.argsort(lower, kind="stable")
+        for tid, bound in zip(ids[order].tolist(), lower[order].tolist()):
+            if bound > best_distance:
+                break
+            distance = bounded_distance(word, self.surfaces[tid], min(limit, best_distance))
+            if distance < best_distance:
+                best_distance, best = distance, [tid]
+            elif distance == best_distance and distance <= limit:
+                best.append(tid)
+        if not best:
+            return None
+        canonicals = {self.canonical[t] for t in best}
+        if len(canonicals) > 1:
+            return None
+        t = min(best)
+        return self.canonical[t], self.surfaces[t], best_distance
+
+
+class MedNormalizer:
+    def __init__(self, rules: CompiledRuleSet, cache_size: int = CACHE_SIZE):
+        onto = rules.ontology
+        self.rules_hash = f"{rules.sha256_hash}:{onto.version_hash}"
+
+        # Earlier sources win on collisions: generics and brands before misspellings
+        meds: Dict[str, str] = {}
+        for generic, aliases in GENERICS.items():
+            for surface in (generic, *aliases):
+                meds.setdefault(fold(surface), generic)
+        for generic, typos in MISSPELLINGS.items():
+            for surface in typos:
+                meds.setdefault(fold(surface), generic)
+        for drug in (*onto.drug_names, *rules.by_drug, *rules.partners):
+            meds.setdefault(fold(drug), drug)
+
+        allergens = dict(meds)
+        for alias, target in onto.aliases.items():
+            allergens.setdefault(fold(alias), target)
+        for cls in onto.class_mask:
+            allergens.setdefault(fold(cls), cls)
+        for allergen in rules.contraindications:
+            allergens.setdefault(fold(allergen), allergen)
+        meds.pop("", None)
+        allergens.pop("", None)
+
+        start = time.perf_counter()
+        self.med_index = SymSpellIndex(meds)
+        self.allergen_index = SymSpellIndex(allergens)
+        self.build_ms = (time.perf_counter() - start) * 1000
+        self.fuzzy_hits = 0
+        self.unresolved = 0
+
+        self.med = lru_cache(maxsize=cache_size)(self._med)
+        self.allergen = lru_cache(maxsize=cache_size)(self._allergen)
+
+    def _resolve(self, index: SymSpellIndex, name: str) -> str:
+        folded = fold(name)
+        if folded:
+            hit = index.lookup(folded, 0 if len(folded) > MAX_FUZZY_LENGTH else max_distance_for(len(folded)))
+            if hit is not None:
+                if hit[2]:
+                    self.fuzzy_hits += 1
+                return hit[0]
+        # Unknown names pass through as the engine would have seen them
+        self.unresolved += 1
+        return normalize_name(name)
+
+    def _med(self, name: str) -> str:
+        return self._resolve(self.med_index, name)
+
+    def _allergen(self, name: str) -> str:
+        return self._resolve(self.allergen_index, name)
+
+    def stats(self) -> dict:
+        med_cache, allergen_cache = self.med.cache_info(), self.allergen.cache_info()
+        hits = med_cache.hits + allergen_cache.hits
+        lookups = hits + med_cache.misses + allergen_cache.misses
+        return {
+            "med_terms": len(self.med_index.surfaces),
+            "allergen_terms": len(self.allergen_index.surfaces),
+            "delete_keys": len(self.med_index.deletes) + len(self.allergen_index.deletes),
+            "build_ms": round(self.build_ms, 2),
+            "cache_hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "cache_size": med_cache.currsize + allergen_cache.currsize,
+            "fuzzy_hits": self.fuzzy_hits,
+            "unresolved": self.unresolved,
+        }
+
+
+_normalizer: Optional[MedNormalizer] = None
+
+
+def normalizer_for(rules: CompiledRuleSet) -> MedNormalizer:
+    """Normalizer indexing this rule set's drugs, rebuilt only when the rule set changes"""
+    global _normalizer
+    current = _normalizer
+    if current is None or current.rules_hash != f"{rules.sha256_hash}:{rules.ontology.version_hash}":
+        current = _normalizer = MedNormalizer(rules)
+    return current
+
+
+def _dedupe(names: Iterable[str]) -> List[str]:
+    return list(dict.fromkeys(n for n in names if n))
+
+
+def normalize_meds(names: Iterable[str], rules: Optional[CompiledRuleSet] = None) -> List[str]:
+    n = normalizer_for(rules or rule_engine.current)
+    return _dedupe(n.med(name) for name in names if isinstance(name, str) and name.strip())
+
+
+def normalize_allergies(names: Iterable[str], rules: Optional[CompiledRuleSet] = None) -> List[str]:
+    n = normalizer_for(rules or rule_engine.current)
+    return _dedupe(n.allergen(name) for name in names if isinstance(name, str) and name.strip())
+
+
+def normalizer_stats() -> dict:
+    return normalizer_for(rule_engine.current).stats()
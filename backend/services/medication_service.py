@@ -0,0 +1,17 @@
+from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+
+from .base_service import BaseService
+from models.medication import Medication
+
+class MedicationService(BaseService[Medication]):
+    def __init__(self):
+        super().__init__(Medication)
+
+    async def get_by_encounter(self, db: AsyncSession, encounter_id: int) -> List[Medication]:
+        """Medications recorded on an encounter"""
+        result = await db.execute(
+            select(Medication).where(Medication.encounter_id == encounter_id).order_by(Medication.id)
+        )
+        return result.scalars().all()
@@ -0,0 +1,158 @@
+"""
+Incremental parser for a streamed flat JSON object.
+
+Fed arbitrary slices of a JSON document as they arrive from the LLM, it
+reports the newly decoded characters of each top-level string field, so the
+caller can forward them before the object is complete. Escapes split across
+slices (including \\uXXXX surrogate pairs) are handled. Non-string values
+are skipped; the caller is expected to validate the full text at the end.
+"""
+from typing import Dict, List, Optional, Tuple
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+# Parser states
+_START, _KEY_OR_END, _KEY, _COLON, _VALUE, _STRING, _OTHER, _COMMA_OR_END, _DONE = range(9)
+
+
+class PartialJSONObjectParser:
+    def __init__(self):
+        self.values: Dict[str, str] = {}
+        self.done = False
+        self._state = _START
+        self._key: List[str] = []
+        self._field: Optional[str] = None
+        self._escape: Optional[str] = None  # None, "" (after backslash) or partial "uXXXX"
+        self._high_surrogate: Optional[int] = None
+        # Skipping a non-string value: nesting depth and whether inside a string
+        self._depth = 0
+        self._other_in_string = False
+        self._other_escape = False
+
+    def feed(self, text: str) -> List[Tuple[str, str]]:
+        """
+        Consume the next slice; returns (field, delta) pairs in order,
+        consecutive deltas of the same field merged
+        """
+        out: List[Tuple[str, str]] = []
+        buf: List[str] = []
+
+        def flush():
+            if buf and self._field is not None:
+                delta = "".join(buf)
+                self.values[self._field] = self.values.get(self._field, "") + delta
+                if out and out[-1][0] == self._field:
+                    out[-1] = (self._field, out[-1][1] + delta)
+                else:
+                    out.append((self._field, delta))
+            buf.clear()
+
+        for ch in text:
+            state = self._state
+            if state == _STRING:
+                if self._escape is not None:
+                    decoded = self._consume_escape(ch)
+                    if decoded:
+                        buf.append(decoded)
+                elif ch == "\\":
+                    self._escape = ""
+                elif ch == '"':
+                    flush()
+                    self._field = None
+                    self._state = _COMMA_OR_END
+                else:
+                    buf.append(ch)
+            elif state == _KEY:
+                if self._escape is not None:
+                    decoded = self._consume_escape(ch)
+                    if decoded:
+                        self._key.append(decoded)
+                elif ch == "\\":
+                    self._escape = ""
+                elif ch == '"':
+                    self._field = "".join(self._key)
+                    self._key.clear()
+                    self._state = _COLON
+                else:
+                    self._key.append(ch)
+            elif state == _OTHER:
+                self._skip_other(ch)
+            elif ch.isspace():
+                continue
+            elif state == _START:
+                # Tolerate leading junk such as a ```json fence
+                if ch == "{":
+                    self._state = _KEY_OR_END
+            elif state == _KEY_OR_END:
+                if ch == '"':
+                    self._state = _KEY
+                elif ch == "}":
+                    self._finish()
+            elif state == _COLON:
+                if ch == ":":
+                    self._state = _VALUE
+            elif state == _VALUE:
+                if ch == '"':
+                    self.values.setdefault(self._field, "")
+                    self._state = _STRING
+                else:
+                    self._field = None
+                    self._depth = 0
+                    self._other_in_string = False
+                    self._state = _OTHER
+                    self._skip_other(ch)
+            elif state == _COMMA_OR_END:
+                if ch == ",":
+                    self._state = _KEY_OR_END
+                elif ch == "}":
+                    self._finish()
+            # _DONE: ignore trailing text
+        flush()
+        return out
+
+    def _consume_escape(self, ch: str) -> str:
+        """Advance an escape sequence; returns decoded text once complete"""
+        if self._escape == "":
+            if ch == "u":
+                self._escape = "u"
+                return ""
+            self._escape = None
+            return _ESCAPES.get(ch, ch)
+        self._escape += ch
+        if len(self._escape) < 5:
+            return ""
+        code = int(self._escape[1:], 16)
+        self._escape = None
+        if 0xD800 <= code <= 0xDBFF:
+            self._high_surrogate = code
+            return ""
+        if 0xDC00 <= code <= 0xDFFF and self._high_surrogate is not None:
+            code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self._high_surrogate = None
+        return chr(code)
+
+    def _skip_other(self, ch: str) -> None:
+        if self._other_in_string:
+            if self._other_escape:
+                self._other_escape = False
+            elif ch == "\\":
+                self._other_escape = True
+            elif ch == '"':
+                self._other_in_string = False
+            return
+        if ch == '"':
+            self._other_in_string = True
+        elif ch in "[{":
+            self._depth += 1
+        elif ch in "]}":
+            if self._depth == 0:
+                # Closing brace of the top-level object
+                self._finish()
+                return
+            self._depth -= 1
+        elif ch == "," and self._depth == 0:
+            self._state = _KEY_OR_END
+
+    def _finish(self) -> None:
+        self._state = _DONE
+        self.done = True
@@ -0,0 +1,341 @@
+"""
+Recommendation store for antibiotic safety findings.
+
+Recommendations depend on which findings fired, not on the patient, so
+they are looked up by finding id rather than generated per request:
+
+1. Curated entries from rules/recommendations.yaml, per finding id (exact
+   ids first, then fnmatch patterns in file order). Served as-is.
+2. Findings without a curated entry are looked up together under a key
+   over their sorted ids plus the rule set version, model and prompt
+   version, in an in-process LRU and then the recommendation_cache table.
+3. On a miss the LLM is asked for just those findings and the answer is
+   stored. Entries past their TTL are still served for a grace window
+   while one background call refreshes them; after that they are misses.
+
+Known findings therefore never wait on the LLM. Empty LLM answers (the
+generator's error path) are never stored.
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from sqlalchemy import delete, select
+from dotenv import load_dotenv
+import asyncio
+import logging
+import os
+import time
+import yaml
+
+from core.database import AsyncSessionLocal
+from models.recommendation_cache import RecommendationCacheEntry
+from schemas.rec import RuleRecommendation, RuleRecommendationList
+from services.llm_gateway import default_model
+from services.single_flight import SingleFlight, make_key
+
+load_dotenv()
+
+RECOMMENDATIONS_PATH = Path(os.getenv(
+    "RECOMMENDATIONS_PATH", Path(__file__).resolve().parent.parent / "rules" / "recommendations.yaml"
+))
+PROMPT_VERSION = "1"
+
+fill_flight = SingleFlight("recommendation_fill")
+
+Fill = Callable[[dict], Awaitable[RuleRecommendationList]]
+
+
+class CuratedRecommendations:
+    def __init__(self, raw: dict):
+        self.version = str(raw.get("version", "unversioned"))
+        self.exact: Dict[str, RuleRecommendation] = {}
+        self.patterns: List[Tuple[str, RuleRecommendation]] = []
+        for finding_id, entry in (raw.get("recommendations") or {}).items():
+            entry = entry or {}
+            if not entry.get("reason"):
+                raise ValueError(f"Curated recommendation {finding_id!r} has no reason")
+            rec = RuleRecommendation(
+                findingId=finding_id,
+                reason=" ".join(str(entry["reason"]).split()),
+                alternatives=[str(a).strip().lower() for a in entry.get("alternatives") or []],
+            )
+            if any(ch in finding_id for ch in "*?["):
+                self.patterns.append((finding_id, rec))
+            else:
+                self.exact[finding_id] = rec
+
+    @classmethod
+    def load(cls, path: Path = RECOMMENDATIONS_PATH) -> "CuratedRecommendations":
+        if not path.exists():
+            return cls({})
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(yaml.safe_load(f) or {})
+
+    def get(self, finding_id: str) -> Optional[RuleRecommendation]:
+        rec = self.exact.get(finding_id)
+        if rec is None:
+            for pattern, candidate in self.patterns:
+                if fnmatchcase(finding_id, pattern):
+                    rec = candidate
+                    break
+        if rec is None:
+            return None
+        return rec.model_copy(update={"findingId": finding_id, "alternatives": list(rec.alternatives)})
+
+    def __len__(self) -> int:
+        return len(self.exact) + len(self.patterns)
+
+
+class RecommendationStore:
+    def __init__(
+        self,
+        curated: CuratedRecommendations,
+        max_entries: int = 4096,
+        ttl_seconds: float = 7 * 86400,
+        stale_seconds: float = 86400,
+        persistent: bool = True,
+        llm_fill: bool = True,
+    ):
+        self.curated = curated
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.persistent = persistent
+        self.llm_fill = llm_fill
+        # key -> (refresh_at, expires_at, recommendations), monotonic seconds
+        self._entries: "OrderedDict[str, Tuple[float, float, List[RuleRecommendation]]]" = OrderedDict()
+        self._refreshing: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.requests = 0
+        self.llm_free = 0
+        self.curated_hits = 0
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.llm_fills = 0
+        self.refreshes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def key(self, finding_ids: List[str], rule_set_version: Optional[str]) -> str:
+        return make_key("recommendations", finding_ids, rule_set_version, default_model(), PROMPT_VERSION)
+
+    async def recommend(self, findings_dict: dict, fill: Fill) -> Tuple[RuleRecommendationList, str]:
+        """
+        Recommendations for an AntibioticFindings dump, one per finding id
+        at most, in finding order, and where they came from: "llm" when
+        fill(subset) had to ask the LLM for findings that are neither
+        curated nor stored, else "stored" or "curated"
+        """
+        self.requests += 1
+        findings = findings_dict.get("findings") or []
+        order = list(dict.fromkeys(f["id"] for f in findings))
+        by_id: Dict[str, RuleRecommendation] = {}
+        for finding_id in order:
+            rec = self.curated.get(finding_id)
+            if rec is not None:
+                by_id[finding_id] = rec
+                self.curated_hits += 1
+
+        source = "curated"
+        rest = sorted(set(order) - set(by_id))
+        if rest:
+            subset = {**findings_dict, "findings": [f for f in findings if f["id"] in rest]}
+            key = self.key(rest, findings_dict.get("rule_set_version"))
+            recs = await self._lookup(key, rest, subset, fill)
+            if recs is not None:
+                self.llm_free += 1
+                source = "stored"
+            elif self.llm_fill:
+                self.misses += 1
+                recs = await fill_flight.do(key, lambda: self._fill(key, rest, subset, fill))
+                source = "llm"
+            else:
+                self.misses += 1
+                recs = []
+            for rec in recs:
+                by_id.setdefault(rec.findingId, rec)
+        else:
+            self.llm_free += 1
+
+        return RuleRecommendationList(recommendations=[by_id[i] for i in order if i in by_id]), source
+
+    async def _lookup(self, key: str, finding_ids: List[str], subset: dict, fill: Fill) -> Optional[List[RuleRecommendation]]:
+        """Stored recommendations for key, scheduling a refresh when past TTL"""
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] < now:
+            del self._entries[key]
+            self.expirations += 1
+            entry = None
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.memory_hits += 1
+        elif self.persistent:
+            entry = await self._get_persistent(key)
+            if entry is not None:
+                self.persistent_hits += 1
+                self._put_local(key, entry)
+
+        if entry is None:
+            return None
+        refresh_at, _, recs = entry
+        if refresh_at < now and self.llm_fill:
+            self._schedule_refresh(key, finding_ids, subset, fill)
+        return recs
+
+    async def _fill(self, key: str, finding_ids: List[str], subset: dict, fill: Fill) -> List[RuleRecommendation]:
+        self.llm_fills += 1
+        wanted = set(finding_ids)
+        result = await fill(subset)
+        recs: Dict[str, RuleRecommendation] = {}
+        for rec in result.recommendations:
+            if rec.findingId in wanted:
+                recs.setdefault(rec.findingId, rec)
+        out = [recs[i] for i in finding_ids if i in recs]
+        if out:
+            await self.put(key, finding_ids, subset.get("rule_set_version"), out)
+        return out
+
+    def _schedule_refresh(self, key: str, finding_ids: List[str], subset: dict, fill: Fill) -> None:
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        self.refreshes += 1
+
+        async def refresh() -> None:
+            try:
+                await fill_flight.do(key, lambda: self._fill(key, finding_ids, subset, fill))
+            except Exception as e:
+                logging.warning("Recommendation refresh failed: %s", e)
+            finally:
+                self._refreshing.discard(key)
+
+        task = asyncio.create_task(refresh())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def put(self, key: str, finding_ids: List[str], rule_set_version: Optional[str], recs: List[RuleRecommendation]) -> None:
+        now = time.monotonic()
+        self._put_local(key, (now + self.ttl_seconds, now + self.ttl_seconds + self.stale_seconds, recs))
+        if self.persistent:
+            await self._set_persistent(key, finding_ids, rule_set_version, recs)
+
+    def _put_local(self, key: str, entry: Tuple[float, float, List[RuleRecommendation]]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def reload_curated(self) -> int:
+        self.curated = CuratedRecommendations.load()
+        return len(self.curated)
+
+    async def clear(self) -> int:
+        """Drop every stored (non-curated) entry from both tiers"""
+        count = len(self._entries)
+        self._entries.clear()
+        if self.persistent:
+            try:
+                async with AsyncSessionLocal() as db:
+                    result = await db.execute(delete(RecommendationCacheEntry))
+                    await db.commit()
+                    count = max(count, result.rowcount or 0)
+            except Exception as e:
+                logging.warning("Recommendation store persistent clear failed: %s", e)
+        return count
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.persistent_hits
+        lookups = hits + self.misses
+        return {
+            "curated_entries": len(self.curated),
+            "curated_version": self.curated.version,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "requests": self.requests,
+            "llm_free": self.llm_free,
+            "llm_free_rate": round(self.llm_free / self.requests, 4) if self.requests else 0.0,
+            "curated_hits": self.curated_hits,
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "llm_fills": self.llm_fills,
+            "background_refreshes": self.refreshes,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+    # ------- Persistent tier -------
+    # Failures here are logged and treated as misses, as in the SOAP cache.
+
+    async def _get_persistent(self, key: str) -> Optional[Tuple[float, float, List[RuleRecommendation]]]:
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(select(RecommendationCacheEntry).where(RecommendationCacheEntry.cache_key == key))
+                row = result.scalar_one_or_none()
+        except Exception as e:
+            logging.warning("Recommendation store persistent read failed: %s", e)
+            return None
+
+        if row is None:
+            return None
+        now = datetime.now(timezone.utc)
+
+        def remaining(value: Optional[datetime], default: float) -> float:
+            if value is None:
+                return default
+            if value.tzinfo is None:
+                # Some backends (sqlite) drop the offset; values are written in UTC
+                value = value.replace(tzinfo=timezone.utc)
+            return (value - now).total_seconds()
+
+        expires_in = remaining(row.expires_at, self.ttl_seconds + self.stale_seconds)
+        if expires_in <= 0:
+            self.expirations += 1
+            return None
+        try:
+            recs = [RuleRecommendation.model_validate(r) for r in row.recommendations]
+        except Exception as e:
+            logging.warning("Recommendation store entry %s unreadable: %s", key[:12], e)
+            return None
+        mono = time.monotonic()
+        return mono + remaining(row.refresh_at, self.ttl_seconds), mono + expires_in, recs
+
+    async def _set_persistent(self, key: str, finding_ids: List[str], rule_set_version: Optional[str], recs: List[RuleRecommendation]) -> None:
+        now = datetime.now(timezone.utc)
+        values = dict(
+            finding_ids=finding_ids,
+            rule_set_version=rule_set_version,
+            recommendations=[r.model_dump() for r in recs],
+            model_used=default_model(),
+            prompt_version=PROMPT_VERSION,
+            refresh_at=now + timedelta(seconds=self.ttl_seconds),
+            expires_at=now + timedelta(seconds=self.ttl_seconds + self.stale_seconds),
+        )
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(select(RecommendationCacheEntry).where(RecommendationCacheEntry.cache_key == key))
+                row = result.scalar_one_or_none()
+                if row is None:
+                    db.add(RecommendationCacheEntry(cache_key=key, **values))
+                else:
+                    for name, value in values.items():
+                        setattr(row, name, value)
+                await db.commit()
+        except Exception as e:
+            logging.warning("Recommendation store persistent write failed: %s", e)
+
+
+recommendation_store = RecommendationStore(
+    CuratedRecommendations.load(),
+    max_entries=int(os.getenv("RECOMMENDATION_STORE_MAX_ENTRIES", "4096")),
+    ttl_seconds=float(os.getenv("RECOMMENDATION_STORE_TTL_SECONDS", str(7 * 86400))),
+    stale_seconds=float(os.getenv("RECOMMENDATION_STORE_STALE_SECONDS", "86400")),
+    persistent=os.getenv("RECOMMENDATION_STORE_PERSISTENT", "true").lower() in ("1", "true", "yes"),
+    llm_fill=os.getenv("RECOMMENDATIONS_LLM_FILL", "true").lower() in ("1", "true", "yes"),
+)
@@ -0,0 +1,290 @@
+"""
+Compiled, data-driven antibiotic rule engine.
+
+The active RuleSet row (or the bundled rules/antibiotics.yaml until one is
+activated) is compiled once into hash indexes:
+
+    allergen -> {drug: rule}        allergy contraindications
+    drug     -> {allergen: rule}    the same, inverted
+    drug     -> {partner drug}      interaction adjacency
+    {a, b}   -> rule                interaction lookup
+
+so evaluating a patient touches only their meds and allergies, never the
+full rule list. Class-level conflicts (a penicillin allergy vs ampicillin,
+partial cephalosporin cross-reactivity) come from the drug ontology's
+precomputed bitsets; explicit rules take precedence for the drugs they
+cover. The compiled set is immutable and published by swapping a single
+reference, so in-flight evaluations finish on the version they started
+with. Every worker polls the active sha256_hash and recompiles only
+when it changes.
+"""
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+from dotenv import load_dotenv
+from pathlib import Path
+from sqlalchemy import select
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import yaml
+
+from core.database import AsyncSessionLocal
+from models.rule_set import RuleSet
+from services.drug_ontology import DrugOntology, ClassConflict, drug_ontology
+from schemas.rules import (
+    RuleFinding,
+    RuleDefinitions,
+    AllergyContraindicationRule,
+    InteractionRule,
+)
+
+load_dotenv()
+
+BUILTIN_RULES_PATH = Path(__file__).resolve().parent.parent / "rules" / "antibiotics.yaml"
+
+_SEVERITY_ORDER = {"high": 0, "medium": 1, "low": 2}
+
+
+def normalize_name(value: str) -> str:
+    return " ".join(value.strip().lower().split())
+
+
+def rules_hash(definitions: RuleDefinitions) -> str:
+    """sha256 over the canonical JSON form, stable across key order and whitespace"""
+    canonical = json.dumps(definitions.model_dump(), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class CompiledRuleSet:
+    def __init__(
+        self,
+        name: str,
+        version: str,
+        definitions: RuleDefinitions,
+        sha256_hash: Optional[str] = None,
+        rule_set_id: Optional[int] = None,
+        ontology: Optional[DrugOntology] = None,
+    ):
+        self.ontology = ontology or drug_ontology
+        self.name = name
+        self.version = version
+        self.sha256_hash = sha256_hash or rules_hash(definitions)
+        self.rule_set_id = rule_set_id
+        self.allergy_rule_count = len(definitions.allergy_contraindications)
+        self.interaction_rule_count = len(definitions.interactions)
+
+        self.contraindications: Dict[str, Dict[str, AllergyContraindicationRule]] = {}
+        self.by_drug: Dict[str, Dict[str, AllergyContraindicationRule]] = {}
+        for rule in definitions.allergy_contraindications:
+            for template in (rule.title, rule.details):
+                try:
+                    template.format(drug="", allergen="")
+                except (KeyError, IndexError, ValueError) as e:
+                    raise ValueError(f"Rule {rule.id}: invalid template placeholder ({e})") from e
+            allergen = self.ontology.canonical(rule.allergen)
+            for drug in rule.drugs:
+                drug = normalize_name(drug)
+                self.contraindications.setdefault(allergen, {})[drug] = rule
+                self.by_drug.setdefault(drug, {})[allergen] = rule
+
+        self.partners: Dict[str, Set[str]] = {}
+        self.interactions: Dict[FrozenSet[str], InteractionRule] = {}
+        for rule in definitions.interactions:
+            a, b = (normalize_name(d) for d in rule.drugs)
+            self.interactions[frozenset((a, b))] = rule
+            self.partners.setdefault(a, set()).add(b)
+            self.partners.setdefault(b, set()).add(a)
+
+    def evaluate(self, meds: Iterable[str], allergies: Iterable[str]) -> List[RuleFinding]:
+        """
+        One finding per (rule, allergen) listing every affected drug, one per
+        class-level conflict for drugs no explicit rule flagged, and one per
+        interacting pair. Cost is O(meds + allergies + findings).
+        """
+        onto = self.ontology
+        meds_n = {normalize_name(m) for m in meds if isinstance(m, str) and m.strip()}
+        allergies_n = {onto.canonical(a) for a in allergies if isinstance(a, str) and a.strip()}
+
+        hits: Dict[Tuple[str, str], Tuple[AllergyContraindicationRule, List[str]]] = {}
+        for drug in meds_n:
+            by_allergen = self.by_drug.get(drug)
+            if not by_allergen:
+                continue
+            # Walk whichever side is smaller
+            if len(by_allergen) <= len(allergies_n):
+                matched = [a for a in by_allergen if a in allergies_n]
+            else:
+                matched = [a for a in allergies_n if a in by_allergen]
+            for allergen in matched:
+                rule = by_allergen[allergen]
+                hits.setdefault((rule.id, allergen), (rule, []))[1].append(drug)
+
+        findings: List[RuleFinding] = []
+        flagged: Set[str] = set()
+        for (_, allergen), (rule, drugs) in hits.items():
+            flagged.update(drugs)
+            drug_list = ", ".join(sorted(drugs))
+            findings.append(RuleFinding(
+                id=rule.id,
+                title=rule.title.format(drug=drug_list, allergen=allergen),
+                severity=rule.severity,
+                details=rule.details.format(drug=drug_list, allergen=allergen),
+                rule_set_version=self.version,
+            ))
+
+        uncovered = onto.mask(meds_n) & ~onto.mask(flagged)
+        if uncovered:
+            emitted: Set[str] = set()
+            for allergen in sorted(allergies_n):
+                for conflict in onto.conflicts(allergen):
+                    hit = uncovered & conflict.mask
+                    # Allergies resolving to the same group ("penicillin", "amoxicillin") share conflicts
+                    if hit and conflict.finding_id not in emitted:
+                        emitted.add(conflict.finding_id)
+                        findings.append(self.class_finding(allergen, conflict, onto.names(hit)))
+
+        seen: Set[FrozenSet[str]] = set()
+        for drug in meds_n:
+            partners = self.partners.get(drug)
+            if not partners:
+                continue
+            others = [p for p in partners if p in meds_n] if len(partners) <= len(meds_n) else [m for m in meds_n if m in partners]
+            for other in others:
+                pair = frozenset((drug, other))
+                if pair in seen:
+                    continue
+                seen.add(pair)
+                rule = self.interactions[pair]
+                findings.append(RuleFinding(
+                    id=rule.id,
+                    title=rule.title,
+                    severity=rule.severity,
+                    details=rule.details,
+                    rule_set_version=self.version,
+                ))
+
+        findings.sort(key=lambda f: (_SEVERITY_ORDER[f.severity], f.id, f.title))
+        return findings
+
+    def class_finding(self, allergen: str, conflict: ClassConflict, drugs: List[str]) -> RuleFinding:
+        drug_list = ", ".join(drugs)
+        if conflict.target is None:
+            title = f"{allergen.capitalize()} allergy with {drug_list}"
+            details = (
+                f"Patient has a documented {allergen} allergy and {drug_list} belong to the {conflict.scope} class. "
+                "Avoid unless the allergy has been verified as not applicable."
+            )
+        else:
+            title = f"Possible {conflict.scope}/{conflict.target} cross-reactivity with {drug_list}"
+            details = f"Documented {allergen} allergy. {conflict.details}".strip()
+        return RuleFinding(
+            id=conflict.finding_id,
+            title=title[:100],
+            severity=conflict.severity,
+            details=details,
+            rule_set_version=self.version,
+        )
+
+
+def load_builtin() -> CompiledRuleSet:
+    with open(BUILTIN_RULES_PATH, encoding="utf-8") as f:
+        raw = yaml.safe_load(f) or {}
+    definitions = RuleDefinitions.model_validate({k: v for k, v in raw.items() if k not in ("name", "version")})
+    return CompiledRuleSet(raw.get("name", "builtin"), str(raw.get("version", "builtin")), definitions)
+
+
+def compile_row(row: RuleSet) -> CompiledRuleSet:
+    definitions = RuleDefinitions.model_validate(row.rules)
+    return CompiledRuleSet(row.name, row.version, definitions, sha256_hash=row.sha256_hash, rule_set_id=row.id)
+
+
+class RuleEngine:
+    def __init__(self):
+        self._builtin = load_builtin()
+        self._current = self._builtin
+        self.swaps = 0
+        self.refresh_errors = 0
+        self.compile_ms_last = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def current(self) -> CompiledRuleSet:
+        return self._current
+
+    def install(self, compiled: CompiledRuleSet) -> None:
+        """Publish a compiled rule set; a single reference assignment is atomic"""
+        if compiled.sha256_hash == self._current.sha256_hash:
+            return
+        previous = self._current
+        self._current = compiled
+        self.swaps += 1
+        logging.info(
+            "Rule set swapped %s@%s (%s) -> %s@%s (%s)",
+            previous.name, previous.version, previous.sha256_hash[:12],
+            compiled.name, compiled.version, compiled.sha256_hash[:12],
+        )
+
+    async def refresh(self) -> bool:
+        """
+        Compare the active row's hash with what is installed and recompile
+        only on change; with no active row, revert to the built-in rules.
+        Returns True if a swap happened.
+        """
+        async with self._lock:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    select(RuleSet.id, RuleSet.sha256_hash)
+                    .where(RuleSet.is_active.is_(True))
+                    .order_by(RuleSet.id.desc())
+                    .limit(1)
+                )
+                active = result.first()
+                if active is None:
+                    if self._current is self._builtin:
+                        return False
+                    self.install(self._builtin)
+                    return True
+                if active.sha256_hash == self._current.sha256_hash:
+                    return False
+                row = await db.get(RuleSet, active.id)
+                start = time.perf_counter()
+                compiled = compile_row(row)
+                self.compile_ms_last = (time.perf_counter() - start) * 1000
+            self.install(compiled)
+            return True
+
+    async def run_refresher(self, interval_s: float) -> None:
+        """Background poll so every worker converges on the active rule set"""
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.refresh_errors += 1
+                logging.warning("Rule set refresh failed, keeping %s@%s: %s", self._current.name, self._current.version, e)
+            await asyncio.sleep(interval_s)
+
+    def stats(self) -> dict:
+        c = self._current
+        return {
+            "name": c.name,
+            "version": c.version,
+            "sha256_hash": c.sha256_hash,
+            "rule_set_id": c.rule_set_id,
+            "allergy_rules": c.allergy_rule_count,
+            "interaction_rules": c.interaction_rule_count,
+            "swaps": self.swaps,
+            "refresh_errors": self.refresh_errors,
+            "compile_ms_last": round(self.compile_ms_last, 2),
+            "ontology": c.ontology.stats(),
+        }
+
+
+rule_engine = RuleEngine()
+
+
+def refresh_interval() -> float:
+    return float(os.getenv("RULES_REFRESH_INTERVAL_S", "30"))
@@ -0,0 +1,54 @@
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update
+
+from .base_service import BaseService
+from models.rule_set import RuleSet
+from schemas.rules import RuleSetCreate
+from services.rule_engine import CompiledRuleSet, rules_hash, compile_row, rule_engine
+
+
+class RuleSetService(BaseService[RuleSet]):
+    def __init__(self):
+        super().__init__(RuleSet)
+
+    async def get_by_hash(self, db: AsyncSession, sha256_hash: str) -> Optional[RuleSet]:
+        result = await db.execute(select(RuleSet).where(RuleSet.sha256_hash == sha256_hash))
+        return result.scalar_one_or_none()
+
+    async def create_from_definitions(self, db: AsyncSession, req: RuleSetCreate) -> RuleSet:
+        """
+        Store a rule set (compiled first, so invalid rules are rejected with
+        ValueError before anything is written). Identical rules return the
+        existing row, since sha256_hash is unique.
+        """
+        CompiledRuleSet(req.name, req.version, req.rules)
+        sha = rules_hash(req.rules)
+        existing = await self.get_by_hash(db, sha)
+        if existing:
+            return existing
+        return await self.create(
+            db,
+            name=req.name,
+            version=req.version,
+            description=req.description,
+            rules=req.rules.model_dump(),
+            sha256_hash=sha,
+            is_active=False,
+        )
+
+    async def activate(self, db: AsyncSession, rule_set_id: int) -> Optional[RuleSet]:
+        """
+        Make this the only active rule set and install it in this worker
+        right away; other workers pick it up on their next refresh
+        """
+        row = await self.get(db, rule_set_id)
+        if row is None:
+            return None
+        compiled = compile_row(row)
+        await db.execute(update(RuleSet).where(RuleSet.id != rule_set_id).values(is_active=False))
+        await db.execute(update(RuleSet).where(RuleSet.id == rule_set_id).values(is_active=True))
+        await db.commit()
+        await db.refresh(row)
+        rule_engine.install(compiled)
+        return row
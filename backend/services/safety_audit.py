@@ -0,0 +1,485 @@
+"""
+Population-wide antibiotic safety audit.
+
+Encounters are read in keyset-paged chunks together with their medications
+and the patient's active allergies. Each chunk is encoded as two matrices:
+
+    M  (encounters x words) uint64   packed medication bits
+    L  (encounters x allergens) bool allergy presence
+
+and the active CompiledRuleSet is lowered once into per-allergen packed
+drug masks (explicit rules and ontology class conflicts) plus a list of
+interaction bit pairs. Rules are then applied with whole-column NumPy ops
+over only the rows carrying each allergen, so Python work scales with the
+number of findings rather than encounters x rules. Findings match
+CompiledRuleSet.evaluate exactly (same precedence, grouping and text) and
+are bulk-inserted as SafetyFinding rows; a rerun skips findings already
+stored for the same encounter and rule set version. Every encounter with
+rule-visible meds also gets a digest of the facts it was evaluated on in
+Encounter.safety_fingerprint, findings or not, so incremental
+re-evaluation (services/safety_reevaluation.py) can tell which ones changed.
+
+A full audit takes as long as the population is large, so it never runs
+inside a request: the nightly pharmacy job runs
+
+    python -m services.safety_audit [--chunk-size N] [--status active ...] [--dry-run]
+
+and POST /rules/audit only starts a background job (AuditJobs) whose
+progress is read from GET /rules/audit/{job_id}.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from datetime import datetime, timezone
+from itertools import chain
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert, update, or_
+from collections import OrderedDict, defaultdict
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import uuid
+
+import numpy as np
+
+from core.database import AsyncSessionLocal
+from models.encounter import Encounter
+from models.medication import Medication
+from models.allergy import Allergy
+from models.safety_finding import SafetyFinding
+from schemas.rules import RuleFinding, AuditReport, AuditJob
+from services.drug_ontology import ClassConflict
+from services.rule_engine import CompiledRuleSet, rule_engine, _SEVERITY_ORDER
+from services.med_normalizer import normalizer_for
+
+AUDIT_CHUNK_SIZE = int(os.getenv("SAFETY_AUDIT_CHUNK_SIZE", "5000"))
+
+_ONE = np.uint64(1)
+_RESOLVE_CACHE_MAX = 100_000
+
+
+class AuditPlan:
+    """A CompiledRuleSet lowered to packed bit masks over a fixed drug/allergen vocabulary"""
+
+    def __init__(self, rules: CompiledRuleSet):
+        onto = rules.ontology
+        self.rules = rules
+
+        self.drug_names: List[str] = sorted(set(onto.drug_names) | set(rules.by_drug) | set(rules.partners))
+        self.drug_ids: Dict[str, int] = {d: i for i, d in enumerate(self.drug_names)}
+        self.words = max(1, (len(self.drug_names) + 63) // 64)
+
+        # Sorted so class conflicts are claimed in the same allergen order as evaluate()
+        self.allergen_names: List[str] = sorted(set(rules.contraindications) | set(onto.allergens()))
+        self.allergen_ids: Dict[str, int] = {a: i for i, a in enumerate(self.allergen_names)}
+
+        self.explicit: List[List[Tuple[object, np.ndarray]]] = []
+        self.class_terms: List[List[Tuple[ClassConflict, np.ndarray]]] = []
+        for allergen in self.allergen_names:
+            by_rule: Dict[str, Tuple[object, List[str]]] = {}
+            for drug, rule in rules.contraindications.get(allergen, {}).items():
+                by_rule.setdefault(rule.id, (rule, []))[1].append(drug)
+            self.explicit.append([(rule, self.pack(drugs)) for rule, drugs in by_rule.values()])
+            self.class_terms.append([(c, self.pack(onto.names(c.mask))) for c in onto.conflicts(allergen)])
+
+        self.pairs: Dict[int, List[Tuple[int, object]]] = {}
+        for pair, rule in rules.interactions.items():
+            a, b = sorted(self.drug_ids[d] for d in pair)
+            self.pairs.setdefault(a, []).append((b, rule))
+
+        self._drug_cache: Dict[str, int] = {}
+        self._allergen_cache: Dict[str, int] = {}
+        # The vocabulary order follows from the rule set and ontology alone
+        self._fingerprint_key = f"{rules.sha256_hash}:{onto.version_hash}".encode()
+
+    def pack(self, drugs: Iterable[str]) -> np.ndarray:
+        out = np.zeros(self.words, dtype=np.uint64)
+        for d in drugs:
+            i = self.drug_ids[d]
+            out[i >> 6] |= _ONE << np.uint64(i & 63)
+        return out
+
+    def names(self, packed: np.ndarray) -> List[str]:
+        out = []
+        for w, word in enumerate(packed.tolist()):
+            while word:
+                low = word & -word
+                out.append(self.drug_names[(w << 6) + low.bit_length() - 1])
+                word ^= low
+        return out
+
+    def column(self, M: np.ndarray, drug_id: int, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        words = M[:, drug_id >> 6] if rows is None else M[rows, drug_id >> 6]
+        return ((words >> np.uint64(drug_id & 63)) & _ONE).astype(bool)
+
+    def _ids(self, names: List[str], cache: Dict[str, int], resolve) -> np.ndarray:
+        # Raw spellings repeat heavily across a population, so normalize each one once
+        out = np.empty(len(names), dtype=np.intp)
+        for k, name in enumerate(names):
+            i = cache.get(name)
+            if i is None:
+                if len(cache) >= _RESOLVE_CACHE_MAX:
+                    cache.clear()
+                i = cache[name] = resolve(name)
+            out[k] = i
+        return out
+
+    def drug_id(self, name: str) -> int:
+        """Column for a raw medication name, -1 if no rule can involve it"""
+        # Same normalization as check_antibiotics, so brands and misspellings in the DB still match
+        return self.drug_ids.get(normalizer_for(self.rules).med(name), -1)
+
+    def allergen_id(self, name: str) -> int:
+        """Column for a raw allergen, -1 if no rule or class conflict can involve it"""
+        return self.allergen_ids.get(self.rules.ontology.canonical(normalizer_for(self.rules).allergen(name)), -1)
+
+    def depends_on(self, M: np.ndarray, L: np.ndarray, row: int) -> dict:
+        """
+        The facts a row's findings were computed from: only meds and
+        allergens the rules can see, canonicalized, plus the rule set
+        """
+        return {
+            "meds": self.names(M[row]),
+            "allergies": [self.allergen_names[a] for a in np.flatnonzero(L[row]).tolist()],
+            "rule_set_hash": self.rules.sha256_hash,
+        }
+
+    def fingerprints(self, M: np.ndarray, L: np.ndarray, rows: Iterable[int]) -> List[str]:
+        """
+        Digest of each row's depends_on facts: the same bits under the same
+        plan are the same canonical meds and allergens
+        """
+        packed = np.packbits(L, axis=1)
+        key = self._fingerprint_key
+        return [hashlib.blake2b(key + M[r].tobytes() + packed[r].tobytes(), digest_size=16).hexdigest() for r in rows]
+
+    def encode(
+        self,
+        meds: Sequence[Sequence[str]],
+        allergies: Sequence[Sequence[str]],
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        n = len(meds)
+
+        M = np.zeros((n, self.words), dtype=np.uint64)
+        rows = np.repeat(np.arange(n), np.fromiter(map(len, meds), dtype=np.intp, count=n))
+        cols = self._ids(list(chain.from_iterable(meds)), self._drug_cache, self.drug_id)
+        known = cols >= 0
+        if known.any():
+            rows, cols = rows[known], cols[known].astype(np.uint64)
+            np.bitwise_or.at(M, (rows, (cols >> np.uint64(6)).astype(np.intp)), _ONE << (cols & np.uint64(63)))
+
+        L = np.zeros((n, len(self.allergen_names)), dtype=bool)
+        rows = np.repeat(np.arange(n), np.fromiter(map(len, allergies), dtype=np.intp, count=n))
+        cols = self._ids(list(chain.from_iterable(allergies)), self._allergen_cache, self.allergen_id)
+        known = cols >= 0
+        L[rows[known], cols[known]] = True
+        return M, L
+
+    def evaluate(self, M: np.ndarray, L: np.ndarray) -> Dict[int, List[RuleFinding]]:
+        """
+        Findings keyed by row, for rows that have any; each list is identical
+        to CompiledRuleSet.evaluate on the same inputs
+        """
+        rules = self.rules
+        n = M.shape[0]
+        out: Dict[int, List[RuleFinding]] = defaultdict(list)
+        if n == 0:
+            return out
+
+        present = np.flatnonzero(L.any(axis=0))
+        allergen_rows = {a: np.flatnonzero(L[:, a]) for a in present.tolist()}
+
+        flagged = np.zeros_like(M)
+        for a, rows in allergen_rows.items():
+            terms = self.explicit[a]
+            if not terms:
+                continue
+            sub = M[rows]
+            for rule, mask in terms:
+                hit = sub & mask
+                idx = np.flatnonzero(hit.any(axis=1))
+                if not idx.size:
+                    continue
+                flagged[rows[idx]] |= hit[idx]
+                allergen = self.allergen_names[a]
+                for r, packed in zip(rows[idx].tolist(), hit[idx]):
+                    drug_list = ", ".join(self.names(packed))
+                    out[r].append(RuleFinding(
+                        id=rule.id,
+                        title=rule.title.format(drug=drug_list, allergen=allergen),
+                        severity=rule.severity,
+                        details=rule.details.format(drug=drug_list, allergen=allergen),
+                        rule_set_version=rules.version,
+                    ))
+
+        uncovered = M & ~flagged
+        emitted: Dict[str, np.ndarray] = {}
+        for a, rows in allergen_rows.items():
+            terms = self.class_terms[a]
+            if not terms:
+                continue
+            sub = uncovered[rows]
+            allergen = self.allergen_names[a]
+            for conflict, mask in terms:
+                hit = sub & mask
+                seen = emitted.get(conflict.finding_id)
+                if seen is None:
+                    seen = emitted[conflict.finding_id] = np.zeros(n, dtype=bool)
+                idx = np.flatnonzero(hit.any(axis=1) & ~seen[rows])
+                if not idx.size:
+                    continue
+                seen[rows[idx]] = True
+                for r, packed in zip(rows[idx].tolist(), hit[idx]):
+                    out[r].append(rules.class_finding(allergen, conflict, self.names(packed)))
+
+        for a, partners in self.pairs.items():
+            rows = np.flatnonzero(self.column(M, a))
+            if not rows.size:
+                continue
+            for b, rule in partners:
+                for r in rows[self.column(M, b, rows)].tolist():
+                    out[r].append(RuleFinding(
+                        id=rule.id,
+                        title=rule.title,
+                        severity=rule.severity,
+                        details=rule.details,
+                        rule_set_version=rules.version,
+                    ))
+
+        for findings in out.values():
+            if len(findings) > 1:
+                findings.sort(key=lambda f: (_SEVERITY_ORDER[f.severity], f.id, f.title))
+        return out
+
+
+_plan_cache: Dict[str, AuditPlan] = {}
+
+
+def audit_plan(rules: CompiledRuleSet) -> AuditPlan:
+    """Lowered plan for a rule set, rebuilt only when the rule set or ontology changes"""
+    key = f"{rules.sha256_hash}:{rules.ontology.version_hash}"
+    plan = _plan_cache.get(key)
+    if plan is None:
+        _plan_cache.clear()
+        plan = _plan_cache[key] = AuditPlan(rules)
+    return plan
+
+
+async def _load_chunk(
+    db: AsyncSession, after_id: int, limit: int, statuses: Sequence[str]
+) -> Tuple[List[int], List[List[str]], List[List[str]], List[Optional[str]]]:
+    result = await db.execute(
+        select(Encounter.id, Encounter.patient_id, Encounter.safety_fingerprint)
+        .where(Encounter.id > after_id, Encounter.status.in_(statuses))
+        .order_by(Encounter.id)
+        .limit(limit)
+    )
+    rows = result.all()
+    return (*await load_facts(db, rows), [e.safety_fingerprint for e in rows])
+
+
+async def load_facts(
+    db: AsyncSession, encounters: Sequence
+) -> Tuple[List[int], List[List[str]], List[List[str]]]:
+    """Medications and the patient's active allergies for (id, patient_id) encounter rows"""
+    if not encounters:
+        return [], [], []
+    encounter_ids = [e.id for e in encounters]
+    patient_ids = {e.patient_id for e in encounters}
+
+    meds: Dict[int, List[str]] = {}
+    result = await db.execute(
+        select(Medication.encounter_id, Medication.generic_name).where(Medication.encounter_id.in_(encounter_ids))
+    )
+    for encounter_id, name in result:
+        meds.setdefault(encounter_id, []).append(name)
+
+    allergies: Dict[int, List[str]] = {}
+    result = await db.execute(
+        select(Allergy.patient_id, Allergy.allergen).where(
+            Allergy.patient_id.in_(patient_ids),
+            or_(Allergy.is_active.is_(True), Allergy.is_active.is_(None)),
+        )
+    )
+    for patient_id, allergen in result:
+        allergies.setdefault(patient_id, []).append(allergen)
+
+    return (
+        encounter_ids,
+        [meds.get(e.id, []) for e in encounters],
+        [allergies.get(e.patient_id, []) for e in encounters],
+    )
+
+
+async def _existing_keys(db: AsyncSession, encounter_ids: List[int], version: str) -> Set[Tuple[int, str]]:
+    result = await db.execute(
+        select(SafetyFinding.encounter_id, SafetyFinding.finding_id).where(
+            SafetyFinding.encounter_id.in_(encounter_ids),
+            SafetyFinding.rule_set_version == version,
+            # Rows written by per-encounter analyses are managed separately
+            SafetyFinding.analysis_id.is_(None),
+        )
+    )
+    return {(row.encounter_id, row.finding_id) for row in result}
+
+
+async def run_audit(
+    db: AsyncSession,
+    chunk_size: int = AUDIT_CHUNK_SIZE,
+    statuses: Sequence[str] = ("active",),
+    persist: bool = True,
+) -> AuditReport:
+    """
+    Evaluate the active rule set over every encounter in `statuses` and
+    bulk-insert new findings, one commit per chunk so a long audit never
+    holds a single large transaction
+    """
+    start = time.perf_counter()
+    rules = rule_engine.current
+    plan = audit_plan(rules)
+
+    encounters = with_findings = total = inserted = skipped = chunks = 0
+    evaluate_s = 0.0
+    after_id = 0
+    while True:
+        encounter_ids, meds, allergies, recorded = await _load_chunk(db, after_id, chunk_size, statuses)
+        if not encounter_ids:
+            break
+        after_id = encounter_ids[-1]
+        chunks += 1
+        encounters += len(encounter_ids)
+
+        t0 = time.perf_counter()
+        M, L = plan.encode(meds, allergies)
+        per_row = plan.evaluate(M, L)
+        evaluate_s += time.perf_counter() - t0
+
+        with_findings += len(per_row)
+        total += sum(len(f) for f in per_row.values())
+        if not persist:
+            continue
+
+        # Only rows with rule-visible meds can ever fire; the rest keep no record
+        visible = np.flatnonzero(M.any(axis=1)).tolist()
+        changed = [
+            {"id": encounter_ids[r], "safety_fingerprint": fp}
+            for r, fp in zip(visible, plan.fingerprints(M, L, visible)) if recorded[r] != fp
+        ]
+        existing = await _existing_keys(db, [encounter_ids[r] for r in per_row], rules.version) if per_row else set()
+        rows = []
+        for r, findings in sorted(per_row.items()):
+            encounter_id = encounter_ids[r]
+            depends = plan.depends_on(M, L, r)
+            for f in findings:
+                if (encounter_id, f.id) in existing:
+                    skipped += 1
+                    continue
+                rows.append({
+                    "encounter_id": encounter_id,
+                    "finding_id": f.id,
+                    "title": f.title[:100],
+                    "severity": f.severity,
+                    "details": f.details,
+                    "rule_set_version": f.rule_set_version,
+                    "depends_on": depends,
+                })
+        if rows:
+            await db.execute(insert(SafetyFinding), rows)
+            inserted += len(rows)
+        if changed:
+            await db.execute(update(Encounter), changed)
+        if rows or changed:
+            await db.commit()
+
+    report = AuditReport(
+        rule_set_version=rules.version,
+        rule_set_hash=rules.sha256_hash,
+        encounters=encounters,
+        encounters_with_findings=with_findings,
+        findings=total,
+        inserted=inserted,
+        skipped_existing=skipped,
+        chunks=chunks,
+        elapsed_ms=round((time.perf_counter() - start) * 1000, 2),
+        evaluate_ms=round(evaluate_s * 1000, 2),
+    )
+    logging.info(
+        "Safety audit %s@%s: %d encounters, %d findings (%d inserted, %d already stored) in %.0f ms",
+        rules.name, rules.version, encounters, total, inserted, skipped, report.elapsed_ms,
+    )
+    return report
+
+
+class AuditJobs:
+    """
+    Background audits started over HTTP. One runs at a time (starting
+    another while it runs returns the running job); each uses its own
+    database session, and the last `keep` jobs stay queryable.
+    """
+
+    def __init__(self, keep: int = 20):
+        self.keep = keep
+        self._jobs: "OrderedDict[str, AuditJob]" = OrderedDict()
+        self._running: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> AuditJob:
+        if self._running is not None:
+            return self._jobs[self._running]
+        job = AuditJob(id=uuid.uuid4().hex[:12], status="running", started_at=datetime.now(timezone.utc))
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.keep:
+            self._jobs.popitem(last=False)
+        self._running = job.id
+        self._task = asyncio.create_task(self._run(job))
+        return job
+
+    def get(self, job_id: str) -> Optional[AuditJob]:
+        return self._jobs.get(job_id)
+
+    async def _run(self, job: AuditJob) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                job.report = await run_audit(db)
+            job.status = "succeeded"
+        except asyncio.CancelledError:
+            job.status = "failed"
+            job.error = "Cancelled at shutdown"
+            raise
+        except Exception as e:
+            logging.error("Safety audit job %s failed: %s", job.id, e)
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.now(timezone.utc)
+            self._running = None
+
+    async def cancel(self) -> None:
+        """Stop a running audit (shutdown); committed chunks are kept and a rerun skips them"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+audit_jobs = AuditJobs()
+
+
+async def _main(args: argparse.Namespace) -> None:
+    # Audit against the active rule set, not the built-in one a fresh process starts with
+    await rule_engine.refresh()
+    async with AsyncSessionLocal() as db:
+        report = await run_audit(db, chunk_size=args.chunk_size, statuses=args.status, persist=not args.dry_run)
+    print(report.model_dump_json(indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Run the antibiotic safety audit over the encounter population")
+    parser.add_argument("--chunk-size", type=int, default=AUDIT_CHUNK_SIZE)
+    parser.add_argument("--status", nargs="+", default=["active"], help="Encounter statuses to audit")
+    parser.add_argument("--dry-run", action="store_true", help="Evaluate and report without storing findings")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,224 @@
+"""
+Incremental antibiotic safety re-evaluation.
+
+Every audit SafetyFinding records in depends_on the facts it was computed
+from: the encounter's meds and the patient's allergies that the active
+rules can see (canonicalized), plus the rule set hash. Findings are a pure
+function of those, and every evaluated encounter keeps a digest of them in
+Encounter.safety_fingerprint, including when nothing fired. So when an
+allergy or medication changes:
+
+- a change to a fact no rule can involve (e.g. a peanut allergy,
+  paracetamol) schedules nothing;
+- otherwise only the affected patient's (or the one encounter's) active
+  encounters are loaded, and of those only encounters whose rule-relevant
+  facts differ from the recorded fingerprint are evaluated (an encounter
+  that never had a rule-visible med has nothing recorded and nothing to
+  evaluate);
+- the new findings are diffed against the stored ones and only the deltas
+  are inserted, updated or deleted, in one transaction.
+
+Changes are applied by a background worker. Bursts coalesce: everything
+scheduled while a pass runs is handled by the next pass.
+"""
+from typing import Dict, Iterable, List, Optional, Set
+from collections import defaultdict
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert, update, delete, or_
+import asyncio
+import logging
+import time
+
+import numpy as np
+
+from core.database import AsyncSessionLocal
+from models.encounter import Encounter
+from models.safety_finding import SafetyFinding
+from schemas.rules import ReevaluationReport
+from services.rule_engine import rule_engine
+from services.safety_audit import audit_plan, load_facts
+
+
+async def reevaluate(
+    db: AsyncSession,
+    patient_ids: Iterable[int] = (),
+    encounter_ids: Iterable[int] = (),
+    statuses: Iterable[str] = ("active",),
+) -> ReevaluationReport:
+    """
+    Bring the stored audit findings of these patients' (and these)
+    encounters up to date, recomputing only encounters whose facts changed
+    """
+    start = time.perf_counter()
+    rules = rule_engine.current
+    plan = audit_plan(rules)
+    patient_ids, encounter_ids = set(patient_ids), set(encounter_ids)
+
+    conditions = []
+    if patient_ids:
+        conditions.append(Encounter.patient_id.in_(patient_ids))
+    if encounter_ids:
+        conditions.append(Encounter.id.in_(encounter_ids))
+    rows = []
+    if conditions:
+        result = await db.execute(
+            select(Encounter.id, Encounter.patient_id, Encounter.safety_fingerprint)
+            .where(Encounter.status.in_(list(statuses)), or_(*conditions))
+            .order_by(Encounter.id)
+        )
+        rows = result.all()
+    ids, meds, allergies = await load_facts(db, rows)
+
+    stored: Dict[int, List[SafetyFinding]] = defaultdict(list)
+    if ids:
+        result = await db.execute(
+            select(SafetyFinding)
+            .where(SafetyFinding.encounter_id.in_(ids), SafetyFinding.analysis_id.is_(None))
+            .order_by(SafetyFinding.id)
+        )
+        for row in result.scalars():
+            stored[row.encounter_id].append(row)
+
+    M, L = plan.encode(meds, allergies)
+    fingerprints = plan.fingerprints(M, L, range(len(ids)))
+    todo = []
+    for r, encounter_id in enumerate(ids):
+        recorded = rows[r].safety_fingerprint
+        if recorded is None and encounter_id not in stored and not M[r].any():
+            # Never had rule-visible meds: nothing can fire and nothing is stored
+            continue
+        if recorded == fingerprints[r]:
+            continue
+        todo.append(r)
+    depends = {r: plan.depends_on(M, L, r) for r in todo}
+
+    inserted = updated = 0
+    stale: List[int] = []
+    if todo:
+        sub = np.asarray(todo, dtype=np.intp)
+        per_row = plan.evaluate(M[sub], L[sub])
+        new_rows = []
+        for k, r in enumerate(todo):
+            encounter_id = ids[r]
+            fresh = {}
+            for f in per_row.get(k, []):
+                fresh.setdefault(f.id, f)
+            current: Dict[str, SafetyFinding] = {}
+            for row in stored.get(encounter_id, []):
+                if row.finding_id in fresh and row.finding_id not in current:
+                    current[row.finding_id] = row
+                else:
+                    # No longer produced, or a duplicate left by an older audit
+                    stale.append(row.id)
+            for finding_id, f in fresh.items():
+                values = {
+                    "title": f.title[:100],
+                    "severity": f.severity,
+                    "details": f.details,
+                    "rule_set_version": f.rule_set_version,
+                    "depends_on": depends[r],
+                }
+                row = current.get(finding_id)
+                if row is None:
+                    new_rows.append({"encounter_id": encounter_id, "finding_id": finding_id, **values})
+                elif any(getattr(row, name) != value for name, value in values.items()):
+                    for name, value in values.items():
+                        setattr(row, name, value)
+                    updated += 1
+        if stale:
+            await db.execute(delete(SafetyFinding).where(SafetyFinding.id.in_(stale)))
+        if new_rows:
+            await db.execute(insert(SafetyFinding), new_rows)
+            inserted = len(new_rows)
+        await db.execute(update(Encounter), [{"id": ids[r], "safety_fingerprint": fingerprints[r]} for r in todo])
+        await db.commit()
+
+    return ReevaluationReport(
+        rule_set_version=rules.version,
+        encounters=len(ids),
+        recomputed=len(todo),
+        unchanged=len(ids) - len(todo),
+        inserted=inserted,
+        updated=updated,
+        deleted=len(stale),
+        elapsed_ms=round((time.perf_counter() - start) * 1000, 2),
+    )
+
+
+class SafetyReevaluator:
+    """Coalescing background worker around reevaluate()"""
+
+    def __init__(self):
+        self._patients: Set[int] = set()
+        self._encounters: Set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.scheduled = 0
+        self.skipped_irrelevant = 0
+        self.passes = 0
+        self.failures = 0
+        self.totals = {"encounters": 0, "recomputed": 0, "unchanged": 0, "inserted": 0, "updated": 0, "deleted": 0}
+        self.last_elapsed_ms = 0.0
+
+    def allergy_changed(self, patient_id: int, allergen: str) -> bool:
+        """Schedule the patient's encounters if any rule can involve this allergen"""
+        if audit_plan(rule_engine.current).allergen_id(allergen) < 0:
+            self.skipped_irrelevant += 1
+            return False
+        self.schedule(patient_ids=[patient_id])
+        return True
+
+    def medication_changed(self, encounter_id: int, name: str) -> bool:
+        """Schedule the encounter if any rule can involve this medication"""
+        if audit_plan(rule_engine.current).drug_id(name) < 0:
+            self.skipped_irrelevant += 1
+            return False
+        self.schedule(encounter_ids=[encounter_id])
+        return True
+
+    def schedule(self, patient_ids: Iterable[int] = (), encounter_ids: Iterable[int] = ()) -> None:
+        self._patients.update(patient_ids)
+        self._encounters.update(encounter_ids)
+        self.scheduled += 1
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while self._patients or self._encounters:
+            patients, self._patients = self._patients, set()
+            encounters, self._encounters = self._encounters, set()
+            try:
+                async with AsyncSessionLocal() as db:
+                    report = await reevaluate(db, patients, encounters)
+            except Exception as e:
+                self.failures += 1
+                logging.error("Safety re-evaluation failed for patients=%s encounters=%s: %s", sorted(patients), sorted(encounters), e)
+                continue
+            self.passes += 1
+            self.last_elapsed_ms = report.elapsed_ms
+            for name in self.totals:
+                self.totals[name] += getattr(report, name)
+            logging.info(
+                "Safety re-evaluation: %d encounters, %d recomputed (+%d ~%d -%d) in %.0f ms",
+                report.encounters, report.recomputed, report.inserted, report.updated, report.deleted, report.elapsed_ms,
+            )
+
+    async def drain(self) -> None:
+        """Wait until every scheduled change has been applied"""
+        while self._task is not None and not self._task.done():
+            await asyncio.shield(self._task)
+
+    def stats(self) -> dict:
+        return {
+            "scheduled": self.scheduled,
+            "skipped_irrelevant": self.skipped_irrelevant,
+            "pending_patients": len(self._patients),
+            "pending_encounters": len(self._encounters),
+            "running": self._task is not None and not self._task.done(),
+            "passes": self.passes,
+            "failures": self.failures,
+            **self.totals,
+            "last_elapsed_ms": self.last_elapsed_ms,
+        }
+
+
+safety_reevaluator = SafetyReevaluator()
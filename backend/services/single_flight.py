@@ -0,0 +1,87 @@
+"""
+Single-flight request coalescing.
+
+Concurrent callers asking for the same key share one in-flight call instead
+of each paying for an identical LLM round trip. The shared work runs in its
+own task: a caller that is cancelled just stops waiting, and the task is only
+cancelled once nobody is waiting on it any more. Errors propagate to every
+waiter. Keys are forgotten as soon as the call finishes, so this never serves
+stale results (caching is a separate concern).
+"""
+from typing import Awaitable, Callable, Dict, List, TypeVar
+import asyncio
+import hashlib
+import json
+
+T = TypeVar("T")
+
+_registry: List["SingleFlight"] = []
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, _Flight] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        _registry.append(self)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run fn() for key, or join the call already running for key
+        """
+        self.calls += 1
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(fn()))
+            self._inflight[key] = flight
+            flight.task.add_done_callback(lambda _, key=key, flight=flight: self._forget(key, flight))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            # shield: cancelling one caller must not cancel the shared call
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Last interested caller went away; stop paying for the call
+                flight.task.cancel()
+
+    def _forget(self, key: str, flight: _Flight) -> None:
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+        # Mark the exception as retrieved when every waiter was cancelled
+        if not flight.task.cancelled():
+            flight.task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+        }
+
+
+def make_key(*parts: object) -> str:
+    """
+    Stable key over JSON-serializable parts
+    """
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def stats() -> dict:
+    return {flight.name: flight.stats() for flight in _registry}
@@ -0,0 +1,71 @@
+"""
+Batch SOAP extraction for backfills and clinic onboarding.
+
+Transcripts fan out through the normal extractor (cache, single-flight,
+chunking, resilience) under a semaphore, at BATCH priority so a large
+backfill never delays interactive requests waiting on the LLM scheduler.
+Each item succeeds or fails on its own; outcomes keep input order.
+"""
+from typing import List, Optional, Sequence
+from dotenv import load_dotenv
+import asyncio
+import logging
+import os
+import time
+
+from schemas.soap import SOAPNote
+from services.soap_extractor import extract_soap_note
+from services.llm_scheduler import llm_priority, BATCH
+
+load_dotenv()
+
+
+class BatchOutcome:
+    __slots__ = ("index", "note", "error", "processing_time_ms")
+
+    def __init__(self, index: int, note: Optional[SOAPNote], error: Optional[Exception], processing_time_ms: int):
+        self.index = index
+        self.note = note
+        self.error = error
+        self.processing_time_ms = processing_time_ms
+
+
+def batch_concurrency(requested: Optional[int] = None) -> int:
+    """
+    Requested concurrency clamped to SOAP_BATCH_MAX_CONCURRENCY
+    """
+    limit = int(os.getenv("SOAP_BATCH_MAX_CONCURRENCY", "64"))
+    default = int(os.getenv("SOAP_BATCH_CONCURRENCY", "16"))
+    return max(1, min(requested or default, limit))
+
+
+async def extract_soap_notes_batch(
+    transcripts: Sequence[str],
+    concurrency: Optional[int] = None,
+) -> List[BatchOutcome]:
+    """
+    Extract every transcript with at most `concurrency` in flight; failures
+    are captured per item instead of aborting the batch
+    """
+    sem = asyncio.Semaphore(batch_concurrency(concurrency))
+
+    async def one(index: int, transcript: str) -> BatchOutcome:
+        async with sem:
+            start = time.perf_counter()
+            try:
+                note = await extract_soap_note(transcript)
+                error = None
+            except Exception as e:
+                note, error = None, e
+            return BatchOutcome(index, note, error, int((time.perf_counter() - start) * 1000))
+
+    start = time.perf_counter()
+    with llm_priority(BATCH):
+        # Tasks copy the current context, so every item inherits BATCH priority
+        outcomes = await asyncio.gather(*(one(i, t) for i, t in enumerate(transcripts)))
+    failed = sum(1 for o in outcomes if o.error is not None)
+    logging.info(
+        "SOAP batch items=%d failed=%d elapsed_ms=%d",
+        len(outcomes), failed, int((time.perf_counter() - start) * 1000),
+    )
+    return list(outcomes)
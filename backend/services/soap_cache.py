@@ -0,0 +1,215 @@
+"""
+Content-addressed cache for SOAP extraction results.
+
+Two tiers: an in-process LRU with TTL, and a persistent tier in the
+soap_extraction_cache table so results survive restarts and are shared
+between workers. Keys are a sha256 over the normalized transcript plus
+everything that changes the LLM output (model, prompt version, max tokens).
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import delete, select
+from dotenv import load_dotenv
+import hashlib
+import logging
+import os
+import re
+import time
+import unicodedata
+
+from core.database import AsyncSessionLocal
+from models.soap_extraction_cache import SOAPExtractionCache
+from schemas.soap import SOAPNote, SOAPNoteWithMeds
+
+load_dotenv()
+
+_WHITESPACE = re.compile(r"[ \t\f\v]+")
+
+
+def normalize_transcript(transcript: str) -> str:
+    """
+    Canonical form used for hashing: NFC, collapsed intra-line whitespace,
+    no blank lines or trailing spaces
+    """
+    text = unicodedata.normalize("NFC", transcript)
+    lines = (_WHITESPACE.sub(" ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def make_key(transcript: str, model: str, prompt_version: str, max_tokens: int) -> str:
+    h = hashlib.sha256()
+    for part in (normalize_transcript(transcript), model, prompt_version, str(max_tokens)):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class SOAPCache:
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 86400, persistent: bool = True):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persistent = persistent
+        self._entries: "OrderedDict[str, tuple[float, SOAPNote]]" = OrderedDict()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    # ------- In-process tier -------
+
+    def get_local(self, key: str) -> Optional[SOAPNote]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, note = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return note
+
+    def put_local(self, key: str, note: SOAPNote) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, note)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    # ------- Both tiers -------
+
+    async def get(self, key: str) -> Optional[SOAPNote]:
+        """
+        Look up a key in memory, then in the database; a persistent hit is
+        promoted into memory
+        """
+        note = self.get_local(key)
+        if note is not None:
+            self.memory_hits += 1
+            return note
+
+        if self.persistent:
+            note = await self._get_persistent(key)
+            if note is not None:
+                self.persistent_hits += 1
+                self.put_local(key, note)
+                return note
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, note: SOAPNote, model_used: str, prompt_version: str) -> None:
+        self.put_local(key, note)
+        if self.persistent:
+            await self._set_persistent(key, note, model_used, prompt_version)
+
+    async def invalidate(self, key: str) -> bool:
+        """Drop a single key from both tiers"""
+        removed = self._entries.pop(key, None) is not None
+        if self.persistent:
+            removed = await self._delete_persistent(key) or removed
+        if removed:
+            self.invalidations += 1
+        return removed
+
+    async def clear(self) -> int:
+        """Drop every entry from both tiers"""
+        count = len(self._entries)
+        self._entries.clear()
+        if self.persistent:
+            try:
+                async with AsyncSessionLocal() as db:
+                    result = await db.execute(delete(SOAPExtractionCache))
+                    await db.commit()
+                    count = max(count, result.rowcount or 0)
+            except Exception as e:
+                logging.warning("SOAP cache persistent clear failed: %s", e)
+        self.invalidations += count
+        return count
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.persistent_hits
+        lookups = hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+    # ------- Persistent tier -------
+    # Failures here are logged and treated as misses: the cache must never
+    # make extraction fail.
+
+    async def _get_persistent(self, key: str) -> Optional[SOAPNote]:
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(select(SOAPExtractionCache).where(SOAPExtractionCache.cache_key == key))
+                row = result.scalar_one_or_none()
+        except Exception as e:
+            logging.warning("SOAP cache persistent read failed: %s", e)
+            return None
+
+        if row is None:
+            return None
+        expires_at = row.expires_at
+        if expires_at is not None and expires_at.tzinfo is None:
+            # Some backends (sqlite) drop the offset; values are written in UTC
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        if expires_at is not None and expires_at < datetime.now(timezone.utc):
+            self.expirations += 1
+            return None
+        if row.meds is not None:
+            return SOAPNoteWithMeds(
+                subjective=row.subjective, objective=row.objective, assessment=row.assessment, plan=row.plan, meds=row.meds,
+            )
+        return SOAPNote(subjective=row.subjective, objective=row.objective, assessment=row.assessment, plan=row.plan)
+
+    async def _set_persistent(self, key: str, note: SOAPNote, model_used: str, prompt_version: str) -> None:
+        values = dict(
+            subjective=note.subjective,
+            objective=note.objective,
+            assessment=note.assessment,
+            plan=note.plan,
+            meds=getattr(note, "meds", None),
+            model_used=model_used,
+            prompt_version=prompt_version,
+            expires_at=datetime.now(timezone.utc) + timedelta(seconds=self.ttl_seconds),
+        )
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(select(SOAPExtractionCache).where(SOAPExtractionCache.cache_key == key))
+                row = result.scalar_one_or_none()
+                if row is None:
+                    db.add(SOAPExtractionCache(cache_key=key, **values))
+                else:
+                    for name, value in values.items():
+                        setattr(row, name, value)
+                await db.commit()
+        except Exception as e:
+            logging.warning("SOAP cache persistent write failed: %s", e)
+
+    async def _delete_persistent(self, key: str) -> bool:
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(delete(SOAPExtractionCache).where(SOAPExtractionCache.cache_key == key))
+                await db.commit()
+                return (result.rowcount or 0) > 0
+        except Exception as e:
+            logging.warning("SOAP cache persistent delete failed: %s", e)
+            return False
+
+
+soap_cache = SOAPCache(
+    max_entries=int(os.getenv("SOAP_CACHE_MAX_ENTRIES", "1024")),
+    ttl_seconds=float(os.getenv("SOAP_CACHE_TTL_SECONDS", "86400")),
+    persistent=os.getenv("SOAP_CACHE_PERSISTENT", "true").lower() in ("1", "true", "yes"),
+)
@@ -0,0 +1,158 @@
+"""
+Map-reduce SOAP extraction for long transcripts.
+
+Long consults are split on speaker-turn boundaries into token-budgeted
+windows. Each window is extracted into a partial SOAP note in parallel (map),
+then the partials are merged by a final LLM call (reduce). Large reduce
+inputs are merged hierarchically so no single prompt outgrows the budget.
+"""
+from typing import Awaitable, Callable, List
+from dotenv import load_dotenv
+import asyncio
+import json
+import logging
+import os
+import re
+
+from schemas.soap import SOAPNote
+
+load_dotenv()
+
+# "Doctor:", "Patient:", "Dr. Otieno:", "Nurse:" ... at the start of a line
+_SPEAKER = re.compile(r"^\s*(?:[A-Z][\w.'-]*)(?: [A-Z][\w.'-]*){0,2}\s*:", re.MULTILINE)
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+CompleteFn = Callable[[str, str, int], Awaitable[SOAPNote]]
+
+MAP_PROMPT = """
+You are a SOAP (subjective, objective, assessment, plan) note extractor. You will be given ONE PART of a longer
+transcript of a session between a patient and a doctor in Kenya. Extract only what this part contains. Only output
+JSON matching (subjective, objective, assessment, plan). No prose. Use concise sentences. If this part has nothing
+for a field, write 'Not stated in this part.'
+"""
+
+REDUCE_PROMPT = """
+You are merging partial SOAP notes extracted from consecutive parts of one patient-doctor session in Kenya into a
+single SOAP note. Combine and deduplicate; later parts override earlier ones when they conflict (e.g. a changed
+plan). Only output JSON matching (subjective, objective, assessment, plan). No prose. Always populate all four
+fields with concise sentences. If info is missing from every part, write 'Not explicitly stated in transcript.'
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """~4 characters per token; good enough for budgeting"""
+    return len(text) // 4 + 1
+
+
+def split_turns(transcript: str) -> List[str]:
+    """
+    Split into speaker turns; text before the first label or lines without a
+    label stay with the preceding turn
+    """
+    starts = [m.start() for m in _SPEAKER.finditer(transcript)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    bounds = starts + [len(transcript)]
+    turns = (transcript[a:b].strip() for a, b in zip(bounds, bounds[1:]))
+    return [t for t in turns if t]
+
+
+def _split_long_turn(turn: str, budget: int) -> List[str]:
+    """Fall back to sentence boundaries for a single turn over the budget"""
+    pieces, current = [], ""
+    for sentence in _SENTENCE_END.split(turn):
+        candidate = f"{current} {sentence}".strip()
+        if current and estimate_tokens(candidate) > budget:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_transcript(transcript: str, budget_tokens: int) -> List[str]:
+    """
+    Greedily pack whole turns into windows of at most budget_tokens
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for turn in split_turns(transcript):
+        turn_tokens = estimate_tokens(turn)
+        pieces = [turn] if turn_tokens <= budget_tokens else _split_long_turn(turn, budget_tokens)
+        for piece in pieces:
+            piece_tokens = estimate_tokens(piece)
+            if current and size + piece_tokens > budget_tokens:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += piece_tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def needs_chunking(transcript: str) -> bool:
+    return estimate_tokens(transcript) > int(os.getenv("SOAP_CHUNKING_THRESHOLD_TOKENS", "6000"))
+
+
+async def extract_chunked(transcript: str, complete: CompleteFn) -> SOAPNote:
+    """
+    Map each window to a partial note in parallel, then reduce to one note
+    """
+    budget = int(os.getenv("SOAP_CHUNK_TOKENS", "3000"))
+    max_tokens = int(os.getenv("SOAP_EXTRACTOR_MAX_TOKENS", "300"))
+    sem = asyncio.Semaphore(int(os.getenv("SOAP_CHUNK_CONCURRENCY", "8")))
+    chunks = chunk_transcript(transcript, budget)
+    logging.info("Chunked SOAP extraction: %d chunks (budget=%d tokens)", len(chunks), budget)
+
+    async def map_one(i: int, chunk: str) -> SOAPNote:
+        user_prompt = (
+            f"Transcript part {i + 1} of {len(chunks)}:\n"
+            f"{chunk}\n\n"
+            "Produce strictly this JSON object: {\"subjective\": \"...\", \"objective\": \"...\", \"assessment\": \"...\", \"plan\": \"...\"}"
+        )
+        async with sem:
+            return await complete(MAP_PROMPT, user_prompt, max_tokens)
+
+    partials = await asyncio.gather(*(map_one(i, c) for i, c in enumerate(chunks)))
+    return await _reduce(list(partials), complete, budget)
+
+
+async def _reduce(partials: List[SOAPNote], complete: CompleteFn, budget: int) -> SOAPNote:
+    if len(partials) == 1:
+        return partials[0]
+
+    reduce_max_tokens = int(os.getenv("SOAP_REDUCE_MAX_TOKENS", "600"))
+
+    # Group consecutive partials so each merge prompt stays within budget;
+    # at least two per group so every round shrinks the list
+    groups: List[List[SOAPNote]] = [[]]
+    size = 0
+    for note in partials:
+        note_tokens = estimate_tokens(note.model_dump_json())
+        if len(groups[-1]) >= 2 and size + note_tokens > budget:
+            groups.append([])
+            size = 0
+        groups[-1].append(note)
+        size += note_tokens
+
+    async def merge(group: List[SOAPNote]) -> SOAPNote:
+        if len(group) == 1:
+            return group[0]
+        payload = json.dumps(
+            [{"part": i + 1, **note.model_dump()} for i, note in enumerate(group)],
+            ensure_ascii=False,
+        )
+        user_prompt = (
+            f"Partial SOAP notes in session order:\n{payload}\n\n"
+            "Produce strictly this JSON object: {\"subjective\": \"...\", \"objective\": \"...\", \"assessment\": \"...\", \"plan\": \"...\"}"
+        )
+        return await complete(REDUCE_PROMPT, user_prompt, reduce_max_tokens)
+
+    merged = await asyncio.gather(*(merge(g) for g in groups))
+    if len(groups) == 1:
+        return merged[0]
+    return await _reduce(list(merged), complete, budget)
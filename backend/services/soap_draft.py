@@ -0,0 +1,152 @@
+"""
+Rolling SOAP draft for a live transcription session.
+
+Final segments are collected as the session produces them. Every
+SOAP_DRAFT_EVERY_S seconds of newly finalized speech, the draft is
+updated in the background with update_soap_note. That call sends only
+the new transcript and the current draft, so each update costs about
+the same however long the session runs. Each update is pushed to the
+client as a ServerSoapDraft.
+
+At most one update runs at a time. Segments that finalize while it
+runs wait for the next one, and a failed update leaves its segments
+for the next one as well. That one is not started from the failure
+itself: a later segment starts it once SOAP_DRAFT_RETRY_S has passed,
+doubling per consecutive failure up to a minute, so an LLM that is down
+costs one call per backoff rather than a call per event loop turn. At the end of the session, finish() waits
+for the update in flight and folds in only what is left, a few seconds
+of transcript at most, so the final note follows the last ServerFinal
+almost at once instead of after a cold extraction of the whole session.
+"""
+from typing import Awaitable, Callable, List, Optional, Tuple
+from dotenv import load_dotenv
+import asyncio
+import logging
+import os
+import time
+
+from schemas.soap import SOAPNote
+from schemas.transcription import ServerError, ServerSoapDraft
+from services.soap_extractor import update_soap_note
+
+load_dotenv()
+
+Send = Callable[[dict], Awaitable[None]]
+
+
+class SoapDraft:
+    def __init__(self, session_id: str, send: Send, every_ms: float, retry_s: float = 5.0):
+        self.session_id = session_id
+        self._send = send
+        self.every_ms = every_ms
+        self.retry_s = retry_s
+        self.note: Optional[SOAPNote] = None
+        self.version = 0
+        # (text, start_ms, end_ms) of every final segment; the first _included are in the note
+        self._segments: List[Tuple[str, float, float]] = []
+        self._included = 0
+        self._pending_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._finishing = False
+        # time.monotonic() before which no update is started after a failure
+        self._retry_at = 0.0
+        self._failed_in_row = 0
+        self.failures = 0
+        self.update_ms: List[float] = []
+
+    def add(self, text: str, start_ms: float, end_ms: float) -> None:
+        """A final segment; starts an update once enough new speech has accumulated"""
+        if not text.strip():
+            return
+        self._segments.append((text.strip(), start_ms, end_ms))
+        self._pending_ms += end_ms - start_ms
+        self._maybe_update()
+
+    async def finish(self) -> None:
+        """Fold in whatever is left and send the final draft (nothing if nothing was said)"""
+        self._finishing = True
+        if self._task is not None:
+            await asyncio.shield(self._task)
+        if not self._segments:
+            return
+        if self._included == len(self._segments):
+            await self._push(final=True)
+        elif not await self._update(final=True):
+            await self._send(ServerError(
+                message="Could not finish the SOAP draft",
+                code="SOAP_DRAFT_ERROR",
+            ).model_dump())
+
+    async def close(self) -> None:
+        """Drop an update still running (the client is gone)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _maybe_update(self) -> None:
+        if (self._task is None and not self._finishing and self._pending_ms >= self.every_ms
+                and time.monotonic() >= self._retry_at):
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        try:
+            updated = await self._update(final=False)
+        finally:
+            self._task = None
+        # Segments that finalized during the update may already be due; after a
+        # failure the next add() past the backoff retries instead
+        if updated:
+            self._maybe_update()
+
+    async def _update(self, final: bool) -> bool:
+        upto = len(self._segments)
+        texts = [text for text, _, _ in self._segments[:upto]]
+        t0 = time.perf_counter()
+        try:
+            note = await update_soap_note(self.note, "\n".join(texts[self._included:]), "\n".join(texts))
+        except Exception as e:
+            self.failures += 1
+            self._failed_in_row += 1
+            self._retry_at = time.monotonic() + min(60.0, self.retry_s * 2 ** (self._failed_in_row - 1))
+            logging.warning("SOAP draft update failed in session %s: %s", self.session_id, e)
+            return False
+        self._failed_in_row = 0
+        self._retry_at = 0.0
+        self.update_ms.append((time.perf_counter() - t0) * 1000)
+        self.note = note
+        self._included = upto
+        self._pending_ms = sum(end - start for _, start, end in self._segments[upto:])
+        await self._push(final)
+        return True
+
+    async def _push(self, final: bool) -> None:
+        self.version += 1
+        await self._send(ServerSoapDraft(
+            version=self.version,
+            final=final,
+            note=SOAPNote(**{field: getattr(self.note, field) for field in SOAPNote.model_fields}),
+            segments=self._included,
+            throughMs=round(self._segments[self._included - 1][2]),
+        ).model_dump())
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "segments": len(self._segments),
+            "included": self._included,
+            "updates": len(self.update_ms),
+            "failures": self.failures,
+            "update_ms_max": round(max(self.update_ms), 1) if self.update_ms else 0.0,
+        }
+
+
+def create_draft(session_id: str, send: Send) -> Optional[SoapDraft]:
+    """None when SOAP_DRAFT_EVERY_S is 0"""
+    every_s = float(os.getenv("SOAP_DRAFT_EVERY_S", "30"))
+    if every_s <= 0:
+        return None
+    return SoapDraft(session_id, send, every_s * 1000, float(os.getenv("SOAP_DRAFT_RETRY_S", "5")))
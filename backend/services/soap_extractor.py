@@ -1,32 +1,110 @@
-from schemas.soap import SOAPNote
-from openai import OpenAI
-import openai
-import httpx
+from typing import AsyncIterator, List, Optional, Set, Tuple
+from schemas.soap import SOAPNote, SOAPNoteUpdate, SOAPNoteWithMeds
+from services.llm_gateway import (
+    chat_completion,
+    chat_completion_stream,
+    default_model,
+    LLMTimeoutError,
+    LLMRateLimitError,
+    LLMOverloadedError,
+    LLMCircuitOpenError,
+    LLMQueueFullError,
+)
+from services.soap_cache import soap_cache, make_key
+from services.single_flight import SingleFlight
+from services.soap_chunking import needs_chunking, extract_chunked
+from services.partial_json import PartialJSONObjectParser
+from services.soap_manual import extract_manual
+from services.antibiotic_rules import remember_plan_meds
 from dotenv import load_dotenv
+import asyncio
 import os
 import json
 import logging
 
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Bump whenever the extraction prompt or schema changes so cached notes
+# produced by the old prompt are no longer served
+PROMPT_VERSION = "v1"
+# Combined SOAP + antibiotics extraction (SOAP_EXTRACT_MEDS); cached separately
+COMBINED_PROMPT_VERSION = f"{PROMPT_VERSION}+meds"
 
+SOAP_FIELDS = ("subjective", "objective", "assessment", "plan")
 
-class LLMTimeoutError(Exception):
-    pass
+soap_flight = SingleFlight("soap_extract")
 
+# Budgeted LLM extractions; they outlive a budget overrun so the result still fills the cache
+_budgeted_tasks: Set[asyncio.Task] = set()
 
-class LLMRateLimitError(Exception):
-    pass
 
+def combined_mode() -> bool:
+    """
+    SOAP_EXTRACT_MEDS=true makes every LLM extraction return the plan's
+    antibiotics alongside the note, so the rules need no second LLM call
+    """
+    return os.getenv("SOAP_EXTRACT_MEDS", "false").lower() in ("1", "true", "yes")
+
+
+def _max_tokens(combined: bool) -> int:
+    max_tokens = int(os.getenv("SOAP_EXTRACTOR_MAX_TOKENS", "300"))
+    # Room for the meds list on top of the four sections
+    return max_tokens + int(os.getenv("SOAP_MEDS_EXTRA_TOKENS", "60")) if combined else max_tokens
+
+
+def soap_cache_key(transcript: str, combined: Optional[bool] = None) -> str:
+    """
+    Cache key for an LLM extraction of this transcript under the current config
+    """
+    combined = combined_mode() if combined is None else combined
+    return make_key(
+        transcript,
+        default_model(),
+        COMBINED_PROMPT_VERSION if combined else PROMPT_VERSION,
+        _max_tokens(combined),
+    )
 
-class LLMOverloadedError(Exception):
-    pass
 
-def extract_soap_note(transcript: str) -> SOAPNote:
+def current_model_name() -> str:
+    """
+    Name recorded as model_used for notes produced under the current config
+    """
+    if os.getenv("SOAP_EXTRACTOR_IMPL", "llm") == "manual":
+        return "manual"
+    return default_model()
+
+
+async def extract_soap_note(transcript: str) -> SOAPNote:
     """
     Extracts the SOAP note from the transcript
     """
+    if combined_mode():
+        note, _ = await extract_soap_note_with_meds(transcript)
+        return note
+    return await _extract_soap_note(transcript, combined=False)
+
+
+async def extract_soap_note_with_meds(transcript: str) -> Tuple[SOAPNote, Optional[List[str]]]:
+    """
+    SOAP note plus the plan's antibiotics from one schema-validated LLM
+    call. The meds are remembered against the plan text so a later
+    analyze_antibiotics on that plan reuses them instead of asking the LLM.
+    meds is None when the note did not come from a combined extraction
+    (manual extractor, fallback, chunked transcripts); callers then
+    extract from the plan as before.
+    """
+    if needs_chunking(transcript or "") and os.getenv("SOAP_EXTRACTOR_IMPL", "llm") == "llm":
+        # Map-reduce extraction has no single response to carry the meds
+        return await _extract_soap_note(transcript, combined=False), None
+
+    note = await _extract_soap_note(transcript, combined=True)
+    meds = getattr(note, "meds", None)
+    if meds is not None:
+        remember_plan_meds(note.plan, meds)
+    return note, meds
+
+
+async def _extract_soap_note(transcript: str, combined: bool) -> SOAPNote:
     logging.info("Extracting SOAP note from transcript (length=%d)", len(transcript or ""))
 
     # Guard: empty/whitespace-only transcripts return a safe default
@@ -38,17 +116,42 @@ def extract_soap_note(transcript: str) -> SOAPNote:
             plan="No plan provided."
         )
 
-    attempts = 1
     extractor = os.getenv("SOAP_EXTRACTOR_IMPL", "llm")
 
+    cache_key = soap_cache_key(transcript, combined) if extractor == "llm" else None
+    if cache_key:
+        cached = await soap_cache.get(cache_key)
+        if cached is not None:
+            logging.info("SOAP cache hit key=%s", cache_key[:12])
+            return cached
+
+        # Identical concurrent requests share one LLM call
+        return await soap_flight.do(cache_key, lambda: _extract_with_retries(transcript, extractor, cache_key, combined))
+
+    return await _extract_with_retries(transcript, extractor, cache_key, combined)
+
+
+async def _extract_with_retries(transcript: str, extractor: str, cache_key: Optional[str], combined: bool = False) -> SOAPNote:
+    """
+    Run the configured extractor, retrying unexpected failures up to 3 times
+    """
+    attempts = 1
+
     while attempts <= 3:
         try:
             if extractor == "llm":
-                return _extract_with_llm(transcript)
+                return await _extract_llm_within_budget(transcript, cache_key, combined)
             elif extractor == "manual":
                 return _extract_with_manual(transcript)
             else:
                 raise ValueError(f"Invalid extractor: {extractor}")
+        except (LLMCircuitOpenError, LLMQueueFullError) as e:
+            # Upstream is known-bad or we're saturated: degrade to the fallback extractor if configured
+            fallback = os.getenv("SOAP_FALLBACK_IMPL", "")
+            if extractor == "llm" and fallback == "manual":
+                logging.warning("LLM unavailable (%s), using %s fallback extractor", type(e).__name__, fallback)
+                return _extract_with_manual(transcript)
+            raise
         except (LLMTimeoutError, LLMRateLimitError, LLMOverloadedError) as e:
             # Re-raise known errors so router can map to proper status codes
             raise
@@ -61,9 +164,48 @@ def extract_soap_note(transcript: str) -> SOAPNote:
     raise Exception("Failed to extract SOAP note after 3 attempts")
 
 
-def _extract_with_llm(transcript: str) -> SOAPNote:
+async def _extract_and_cache(transcript: str, cache_key: Optional[str], combined: bool = False) -> SOAPNote:
+    if needs_chunking(transcript):
+        note = await extract_chunked(transcript, _complete_soap)
+    elif combined:
+        note = await _extract_combined_with_llm(transcript)
+    else:
+        note = await _extract_with_llm(transcript)
+    await soap_cache.set(cache_key, note, default_model(), COMBINED_PROMPT_VERSION if combined else PROMPT_VERSION)
+    return note
+
+
+async def _extract_llm_within_budget(transcript: str, cache_key: Optional[str], combined: bool = False) -> SOAPNote:
     """
-    Extracts the SOAP note from the transcript using the LLM
+    LLM extraction bounded by SOAP_LLM_LATENCY_BUDGET_S when the manual
+    fallback is enabled. On overrun the rule-based note is returned right
+    away and the LLM call keeps running so its result lands in the cache
+    for the next request (the manual note itself is never cached).
+    """
+    budget = float(os.getenv("SOAP_LLM_LATENCY_BUDGET_S", "0"))
+    if budget <= 0 or os.getenv("SOAP_FALLBACK_IMPL", "") != "manual":
+        return await _extract_and_cache(transcript, cache_key, combined)
+
+    task = asyncio.ensure_future(_extract_and_cache(transcript, cache_key, combined))
+    _budgeted_tasks.add(task)
+    task.add_done_callback(_budgeted_done)
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), budget)
+    except asyncio.TimeoutError:
+        logging.warning("LLM extraction exceeded %.2fs budget, using manual fallback extractor", budget)
+        return _extract_with_manual(transcript)
+
+
+def _budgeted_done(task: asyncio.Task) -> None:
+    _budgeted_tasks.discard(task)
+    # Retrieve the exception so an overrun task that later fails isn't reported as unhandled
+    if not task.cancelled() and task.exception() is not None:
+        logging.debug("Budgeted LLM extraction failed: %s", task.exception())
+
+
+def _soap_prompts(transcript: str) -> Tuple[str, str]:
+    """
+    System and user prompts for a single-pass extraction
     """
     prompt = f"""
     You are a SOAP (subjective, objective, assessment, plan) note extractor. You will be given a transcript of a session that is between
@@ -77,46 +219,116 @@ def _extract_with_llm(transcript: str) -> SOAPNote:
         f"{transcript}\n\n"
         "Produce strictly this JSON object: {\"subjective\": \"...\", \"objective\": \"...\", \"assessment\": \"...\", \"plan\": \"...\"}"
     )
+    return prompt, user_prompt
 
-    # Build strict JSON schema and disallow additional properties
-    schema = SOAPNote.model_json_schema()
-    if isinstance(schema, dict):
-        schema.setdefault("additionalProperties", False)
 
+UPDATE_PROMPT = """
+You are keeping a draft SOAP (subjective, objective, assessment, plan) note up to date while a session between a
+patient and a doctor in Kenya is still going on. You will be given the current draft and ONLY the transcript that
+came after it. For each field the new transcript adds to or changes, return the whole rewritten field: keep what
+the draft says unless the new transcript changes it, add what is new, and let the new transcript override the
+draft when they conflict (e.g. a changed plan). Return null for every field the new transcript does not affect.
+Only output JSON matching (subjective, objective, assessment, plan). No prose. Use concise sentences.
+"""
+
+
+def _update_prompts(draft: SOAPNote, delta: str) -> Tuple[str, str]:
+    """
+    System and user prompts folding new transcript into a draft note
+    """
+    draft_json = json.dumps({field: getattr(draft, field) for field in SOAP_FIELDS}, ensure_ascii=False)
+    user_prompt = (
+        f"Current draft:\n{draft_json}\n\n"
+        "New transcript:\n"
+        f"{delta}\n\n"
+        "Produce strictly this JSON object, null for unchanged fields: "
+        "{\"subjective\": \"...\", \"objective\": \"...\", \"assessment\": \"...\", \"plan\": \"...\"}"
+    )
+    return UPDATE_PROMPT, user_prompt
+
+
+async def update_soap_note(draft: Optional[SOAPNote], delta: str, transcript: str) -> SOAPNote:
+    """
+    Fold `delta`, the transcript since `draft` was made, into the draft.
+    Only the draft and the delta are sent to the LLM, and it rewrites only
+    the fields the delta affects, so an update costs about the same however
+    long the session is, and less when little changed. Without a draft this
+    is a normal extraction of the delta; the manual extractor is local and
+    re-reads the whole `transcript` instead.
+    """
+    extractor = os.getenv("SOAP_EXTRACTOR_IMPL", "llm")
+    if extractor == "manual":
+        return _extract_with_manual(transcript)
+    if draft is None:
+        return await extract_soap_note(delta)
+    if not delta.strip():
+        return draft
+
+    prompt, user_prompt = _update_prompts(draft, delta)
     try:
-        response = client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
-            messages=[
+        content = await chat_completion(
+            [
                 {"role": "system", "content": prompt},
                 {"role": "user", "content": user_prompt},
             ],
             temperature=0.2,
-            response_format={
-                "type": "json_schema",
-                "json_schema": {
-                    "name": "soap_note",
-                    "strict": True,
-                    "schema": schema,
-                },
-            },
+            response_format=_soap_response_format(SOAPNoteUpdate, "soap_note_update"),
             max_tokens=int(os.getenv("SOAP_EXTRACTOR_MAX_TOKENS", "300")),
             timeout=20,
         )
-    except httpx.TimeoutException as e:
-        raise LLMTimeoutError("LLM request timed out") from e
-    except openai.RateLimitError as e:
-        raise LLMRateLimitError("LLM rate limit exceeded") from e
-    except openai.APIStatusError as e:
-        # Map 5xx to overloaded
-        status = getattr(e, "status_code", None)
-        if status and 500 <= int(status) <= 599:
-            raise LLMOverloadedError(f"LLM service overloaded (status {status})") from e
-        raise
-
-    content = response.choices[0].message.content
+    except (LLMCircuitOpenError, LLMQueueFullError) as e:
+        if os.getenv("SOAP_FALLBACK_IMPL", "") != "manual":
+            raise
+        logging.warning("LLM unavailable (%s), using manual fallback extractor for the draft", type(e).__name__)
+        return _extract_with_manual(transcript)
+    update = _parse_soap(content, SOAPNoteUpdate)
+    return SOAPNote(**{
+        field: getattr(update, field) if getattr(update, field) is not None else getattr(draft, field)
+        for field in SOAP_FIELDS
+    })
+
+
+def _combined_prompts(transcript: str) -> Tuple[str, str]:
+    """
+    The single-pass prompts extended with the plan's antibiotics
+    """
+    prompt, _ = _soap_prompts(transcript)
+    prompt += """
+    Also list in "meds" every antibiotic/antimicrobial the plan starts, continues or changes to, as lowercase
+    GENERIC names (brands mapped to generics). Other medications are not listed. If none, use an empty list.
+    """
+    user_prompt = (
+        "Transcript:\n"
+        f"{transcript}\n\n"
+        "Produce strictly this JSON object: "
+        "{\"subjective\": \"...\", \"objective\": \"...\", \"assessment\": \"...\", \"plan\": \"...\", \"meds\": [\"...\"]}"
+    )
+    return prompt, user_prompt
+
+
+def _soap_response_format(model=SOAPNote, name: str = "soap_note") -> dict:
+    # Build strict JSON schema and disallow additional properties
+    schema = model.model_json_schema()
+    if isinstance(schema, dict):
+        schema.setdefault("additionalProperties", False)
+        # Strict mode requires every property to be listed as required, without defaults
+        schema["required"] = list(schema.get("properties", {}))
+        for prop in schema.get("properties", {}).values():
+            prop.pop("default", None)
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": name,
+            "strict": True,
+            "schema": schema,
+        },
+    }
+
+
+def _parse_soap(content: str, model=SOAPNote) -> SOAPNote:
     try:
         # Validate strictly against the Pydantic model
-        return SOAPNote.model_validate_json(content)
+        return model.model_validate_json(content)
     except Exception:
         # Some models sometimes wrap JSON in code fences; attempt to strip
         cleaned = content.strip()
@@ -125,15 +337,122 @@ def _extract_with_llm(transcript: str) -> SOAPNote:
             # If there's a language tag, remove the first line
             if "\n" in cleaned:
                 cleaned = "\n".join(cleaned.splitlines()[1:])
-        return SOAPNote.model_validate_json(cleaned)
+        return model.model_validate_json(cleaned)
+
+
+async def _extract_with_llm(transcript: str) -> SOAPNote:
+    """
+    Extracts the SOAP note from the transcript using the LLM
+    """
+    prompt, user_prompt = _soap_prompts(transcript)
+    return await _complete_soap(prompt, user_prompt, int(os.getenv("SOAP_EXTRACTOR_MAX_TOKENS", "300")))
+
+
+async def _extract_combined_with_llm(transcript: str) -> SOAPNoteWithMeds:
+    """
+    SOAP note and the plan's antibiotics in one schema-constrained call
+    """
+    prompt, user_prompt = _combined_prompts(transcript)
+    content = await chat_completion(
+        [
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        temperature=0.2,
+        response_format=_soap_response_format(SOAPNoteWithMeds, "soap_note_with_meds"),
+        max_tokens=_max_tokens(True),
+        timeout=20,
+    )
+    return _parse_soap(content, SOAPNoteWithMeds)
+
+
+async def _complete_soap(system_prompt: str, user_prompt: str, max_tokens: int) -> SOAPNote:
+    """
+    One schema-constrained LLM call that returns a validated SOAPNote
+    """
+    content = await chat_completion(
+        [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        temperature=0.2,
+        response_format=_soap_response_format(),
+        max_tokens=max_tokens,
+        timeout=20,
+    )
+    return _parse_soap(content)
+
+
+async def stream_soap_note(transcript: str) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    Extract a SOAP note, yielding ("delta", {"field", "text"}) events as
+    field text is decoded from the LLM stream and a final ("note", {...})
+    event carrying the validated note. The final note is authoritative:
+    if the streamed JSON fails validation it is re-extracted without
+    streaming. Cache hits, long (chunked) transcripts, the manual extractor
+    and the fallback path emit each field whole.
+    """
+    extractor = os.getenv("SOAP_EXTRACTOR_IMPL", "llm")
+    if extractor != "llm" or not transcript or not transcript.strip() or needs_chunking(transcript):
+        async for event in _whole_note_events(await extract_soap_note(transcript)):
+            yield event
+        return
+
+    # The streamed prompt is the SOAP-only one whatever SOAP_EXTRACT_MEDS says
+    cache_key = soap_cache_key(transcript, combined=False)
+    cached = await soap_cache.get(cache_key)
+    if cached is not None:
+        logging.info("SOAP cache hit key=%s", cache_key[:12])
+        async for event in _whole_note_events(cached, cached=True):
+            yield event
+        return
+
+    prompt, user_prompt = _soap_prompts(transcript)
+    parser = PartialJSONObjectParser()
+    content: List[str] = []
+    try:
+        async for piece in chat_completion_stream(
+            [
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            temperature=0.2,
+            response_format=_soap_response_format(),
+            max_tokens=int(os.getenv("SOAP_EXTRACTOR_MAX_TOKENS", "300")),
+            timeout=20,
+        ):
+            content.append(piece)
+            for field, text in parser.feed(piece):
+                if field in SOAP_FIELDS:
+                    yield "delta", {"field": field, "text": text}
+    except (LLMCircuitOpenError, LLMQueueFullError) as e:
+        # Nothing has been streamed yet when admission fails
+        if content or os.getenv("SOAP_FALLBACK_IMPL", "") != "manual":
+            raise
+        logging.warning("LLM unavailable (%s), using manual fallback extractor", type(e).__name__)
+        async for event in _whole_note_events(_extract_with_manual(transcript)):
+            yield event
+        return
+
+    try:
+        note = _parse_soap("".join(content))
+    except Exception as e:
+        logging.warning("Streamed SOAP JSON failed validation (%s); re-extracting", e)
+        note = await extract_soap_note(transcript)
+        yield "note", {"note": note.model_dump(), "cached": False}
+        return
+
+    await soap_cache.set(cache_key, note, default_model(), PROMPT_VERSION)
+    yield "note", {"note": note.model_dump(), "cached": False}
+
+
+async def _whole_note_events(note: SOAPNote, cached: bool = False) -> AsyncIterator[Tuple[str, dict]]:
+    for field in SOAP_FIELDS:
+        yield "delta", {"field": field, "text": getattr(note, field)}
+    yield "note", {"note": note.model_dump(), "cached": cached}
 
 def _extract_with_manual(transcript: str) -> SOAPNote:
     """
-    Extracts the SOAP note from the transcript using the manual method
+    Extracts the SOAP note from the transcript using the rule-based extractor
     """
-    return SOAPNote(
-        subjective = "...",
-        objective = "...",
-        assessment = "...",
-        plan = "..."
-    )
\ No newline at end of file
+    return extract_manual(transcript)
@@ -0,0 +1,153 @@
+"""
+Rule-based SOAP extraction.
+
+Deterministic, dependency-free and fast (well under a millisecond for a
+typical consult), so it can stand in when the LLM is down or too slow.
+Transcripts are split into speaker turns and sentences; each sentence is
+routed to a SOAP field by keyword and pattern heuristics:
+
+- subjective: what the patient reports (symptoms, durations, history)
+- objective: vitals parsed anywhere in the text, plus exam findings
+- assessment: clinician sentences with diagnostic language or a known condition
+- plan: clinician sentences with drugs/doses, tests, referrals or follow-up
+"""
+from typing import List, Optional, Tuple
+import re
+
+from schemas.soap import SOAPNote
+from services.soap_chunking import split_turns
+
+NOT_STATED = "Not explicitly stated in transcript."
+MAX_SENTENCES_PER_FIELD = 6
+
+_LABEL = re.compile(r"^\s*([A-Za-z][\w.' -]{0,30}?)\s*:\s*")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+
+PATIENT_SPEAKERS = {"patient", "pt", "mother", "father", "parent", "caregiver", "guardian", "client"}
+
+# Vitals: (label, pattern, formatter). Patterns run over the full transcript
+_VITALS: List[Tuple[str, "re.Pattern", str]] = [
+    ("BP", re.compile(r"\b(?:bp|blood pressure)\D{0,20}?(\d{2,3})\s*(?:/|over)\s*(\d{2,3})", re.I), "BP {0}/{1} mmHg"),
+    ("HR", re.compile(r"\b(?:hr|heart rate|pulse)\D{0,20}?(\d{2,3})\b", re.I), "HR {0} bpm"),
+    ("RR", re.compile(r"\b(?:rr|resp(?:iratory)? rate)\D{0,20}?(\d{1,2})\b", re.I), "RR {0}/min"),
+    ("Temp", re.compile(r"\b(?:temp(?:erature)?|fever of)\D{0,20}?(\d{2}(?:\.\d)?)\s*(?:°|degrees)?\s*c?\b", re.I), "Temp {0} C"),
+    ("SpO2", re.compile(r"\b(?:spo2|sats?|saturation|oxygen)\D{0,20}?(\d{2,3})\s*(?:%|percent)", re.I), "SpO2 {0}%"),
+    ("Weight", re.compile(r"\b(?:weight|weighs)\D{0,20}?(\d{1,3}(?:\.\d)?)\s*(?:kg|kilos?)\b", re.I), "Weight {0} kg"),
+]
+
+_SYMPTOMS = re.compile(
+    r"\b(pain|ache|aching|cough|fever|chills|sweats?|headache|nausea|vomit\w*|diarrh\w*|rash|itch\w*|"
+    r"swell\w*|dizz\w*|tired|fatigue|weak\w*|short(?:ness)? of breath|breathless\w*|wheez\w*|sore|bleed\w*|"
+    r"burn\w*|discharge|sputum|phlegm|appetite|weight loss|palpitations?|numb\w*|constipat\w*|urinat\w*)\b",
+    re.I,
+)
+_DURATION = re.compile(r"\b(for|since|past|last)\s+(?:about\s+)?(\w+\s+)?(days?|weeks?|months?|years?|night|morning|yesterday)\b", re.I)
+_HISTORY = re.compile(r"\b(allerg\w*|history of|i(?:'m| am) on|i take|taking|diabet\w*|hypertensi\w*|asthma|hiv|pregnan\w*)\b", re.I)
+
+_EXAM = re.compile(
+    r"\b(on exam\w*|examination|i (?:can )?(?:hear|see|feel)|auscultat\w*|palpat\w*|crackles|wheezes?|"
+    r"tender\w*|inflamed|erythema\w*|swollen|clear|afebrile|febrile|pale|jaundiced|lymph nodes?|murmur|"
+    r"abdomen is|chest is|throat is|ears? (?:is|are)|looks? (?:well|unwell|red|inflamed))\b",
+    re.I,
+)
+
+_DIAGNOSTIC = re.compile(
+    r"\b(looks like|sounds like|i think|likely|probabl\w*|consistent with|suggest\w*|diagnos\w*|"
+    r"suspect\w*|impression|rule out|differential)\b",
+    re.I,
+)
+_CONDITIONS = re.compile(
+    r"\b(pneumonia|malaria|typhoid|tubercul\w*|tb|uti|urinary tract infection|bronchitis|asthma|copd|"
+    r"gastroenteritis|otitis\w*|pharyngitis|tonsillitis|sinusitis|cellulitis|hypertension|diabetes|"
+    r"anaemia|anemia|influenza|flu|covid\w*|infection|viral|bacterial|migraine|dermatitis|eczema)\b",
+    re.I,
+)
+
+_DOSE = re.compile(r"\b\d+(?:\.\d+)?\s*(?:mg|mcg|g|ml|units?|iu|tabs?|tablets?|capsules?|puffs?)\b", re.I)
+_ORDERS = re.compile(
+    r"\b(start\w*|prescrib\w*|give you|take|continue|stop|increase|reduce|order\w*|test\w*|x-?ray|scan|"
+    r"ultrasound|blood count|fbc|cbc|culture|smear|urinalysis|refer\w*|follow[- ]?up|review|come back|"
+    r"return if|admit\w*|advise\w*|rest|fluids|times (?:a|per) day|daily|twice|bd|tds|qid)\b",
+    re.I,
+)
+
+
+def _speaker_and_text(turn: str) -> Tuple[Optional[str], str]:
+    m = _LABEL.match(turn)
+    if not m:
+        return None, turn.strip()
+    return m.group(1).strip().lower().rstrip("."), turn[m.end():].strip()
+
+
+def _is_patient(speaker: Optional[str]) -> bool:
+    return speaker is not None and speaker.split()[0] in PATIENT_SPEAKERS
+
+
+def _sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_END.split(text) if s and s.strip()]
+
+
+def _join(sentences: List[str]) -> str:
+    seen, out = set(), []
+    for s in sentences:
+        key = s.lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        out.append(s if s[-1] in ".!?" else f"{s}.")
+        if len(out) == MAX_SENTENCES_PER_FIELD:
+            break
+    return " ".join(out) if out else NOT_STATED
+
+
+def _vitals(transcript: str) -> List[str]:
+    found = []
+    for _, pattern, fmt in _VITALS:
+        m = pattern.search(transcript)
+        if m:
+            found.append(fmt.format(*m.groups()))
+    return found
+
+
+def extract_manual(transcript: str) -> SOAPNote:
+    """
+    Build a SOAP note from transcript text using heuristics only
+    """
+    subjective: List[str] = []
+    exam: List[str] = []
+    assessment: List[str] = []
+    plan: List[str] = []
+    patient_fallback: List[str] = []
+
+    for turn in split_turns(transcript):
+        speaker, text = _speaker_and_text(turn)
+        patient = _is_patient(speaker)
+        for sentence in _sentences(text):
+            if sentence.endswith("?") and not patient:
+                # Clinician questions carry no findings by themselves
+                continue
+            if patient:
+                if _SYMPTOMS.search(sentence) or _DURATION.search(sentence) or _HISTORY.search(sentence):
+                    subjective.append(sentence)
+                elif len(patient_fallback) < 2 and len(sentence.split()) > 2:
+                    patient_fallback.append(sentence)
+                continue
+            # Clinician (or unlabelled) sentence: most specific field wins
+            if _DOSE.search(sentence) or _ORDERS.search(sentence):
+                plan.append(sentence)
+            elif _DIAGNOSTIC.search(sentence) or _CONDITIONS.search(sentence):
+                assessment.append(sentence)
+            elif _EXAM.search(sentence):
+                exam.append(sentence)
+            elif speaker is None and _SYMPTOMS.search(sentence):
+                subjective.append(sentence)
+
+    vitals = _vitals(transcript)
+    objective = ([f"Vitals: {', '.join(vitals)}."] if vitals else []) + exam
+
+    return SOAPNote(
+        subjective=_join(subjective or patient_fallback),
+        objective=_join(objective),
+        assessment=_join(assessment),
+        plan=_join(plan),
+    )
@@ -0,0 +1,83 @@
+from typing import Dict, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+import logging
+import time
+
+from models.encounter import Encounter
+from models.transcript import Transcript
+from models.soap_note_record import SOAPNoteRecord
+from services.soap_extractor import extract_soap_note, current_model_name
+from services.soap_service import SOAPService
+
+
+class SOAPPipelineService:
+    """
+    Transcript -> SOAP -> database in a single pass.
+
+    The LLM runs exactly once and before anything is written, then the
+    encounter, transcript and SOAP record are inserted in one transaction, so
+    a failed extraction never leaves a half-populated encounter behind.
+    """
+
+    async def run(
+        self,
+        db: AsyncSession,
+        patient_id: int,
+        encounter_type: str,
+        transcript_content: str,
+        chief_complaint: Optional[str] = None,
+        encounter_date: Optional[datetime] = None,
+        language: Optional[str] = "en",
+        stage_timings: Optional[Dict[str, int]] = None,
+    ) -> Tuple[Encounter, Transcript, SOAPNoteRecord]:
+        """
+        Extract and persist; stage_timings may carry earlier stages (e.g. STT)
+        so the stored processing time covers the whole request
+        """
+        timings: Dict[str, int] = dict(stage_timings or {})
+
+        # 1. Extract SOAP note (single LLM call, cache-aware)
+        t0 = time.perf_counter()
+        soap_note = await extract_soap_note(transcript_content)
+        timings["extract"] = int((time.perf_counter() - t0) * 1000)
+
+        # 2. Persist everything in one unit of work
+        t0 = time.perf_counter()
+        encounter = Encounter(
+            patient_id=patient_id,
+            encounter_type=encounter_type,
+            chief_complaint=chief_complaint,
+            encounter_date=encounter_date or datetime.now(),
+            status="active",
+        )
+        transcript = Transcript(
+            encounter=encounter,
+            content=transcript_content,
+            language=language,
+            transcript_metadata={"stage_timings_ms": dict(timings)},
+        )
+        soap_record = SOAPService().build_record(
+            soap_note,
+            encounter=encounter,
+            model_used=current_model_name(),
+        )
+
+        db.add_all([encounter, transcript, soap_record])
+        try:
+            await db.flush()
+            timings["persist"] = int((time.perf_counter() - t0) * 1000)
+            soap_record.processing_time_ms = sum(timings.values())
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
+        await db.refresh(encounter)
+        await db.refresh(soap_record)
+
+        logging.info(
+            "SOAP pipeline encounter=%s stages=%s total_ms=%d",
+            encounter.id, timings, soap_record.processing_time_ms,
+        )
+        return encounter, transcript, soap_record
@@ -1,38 +1,67 @@
-from typing import Optional
+from typing import List, Optional, Sequence, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from services.soap_extractor import _extract_with_llm
+from services.soap_extractor import current_model_name
+from models.encounter import Encounter
 from models.soap_note_record import SOAPNoteRecord
+from schemas.soap import SOAPNote
 from sqlalchemy import select
 
 class SOAPService:
-    async def extract_and_save_soap(
+    def build_record(
         self,
-        db: AsyncSession,
-        encounter_id: int, 
-        transcript_content: str,
+        soap_note: SOAPNote,
+        encounter_id: Optional[int] = None,
+        encounter: Optional[Encounter] = None,
+        model_used: Optional[str] = None,
+        processing_time_ms: Optional[int] = None,
     ) -> SOAPNoteRecord:
-        """Extract SOAP note and save to database"""
-
-        # Extract SOAP note using existing service
-        soap_note = _extract_with_llm(transcript_content)
-
-        # Save to database
-        soap_record = SOAPNoteRecord(
+        """Build an unsaved SOAP record; pass encounter to link a not-yet-flushed encounter"""
+        record = SOAPNoteRecord(
             encounter_id=encounter_id,
             soap_note=f"{soap_note.subjective}\n{soap_note.objective}\n{soap_note.assessment}\n{soap_note.plan}",
             subjective=soap_note.subjective,
             objective=soap_note.objective,
             assessment=soap_note.assessment,
             plan=soap_note.plan,
-            model_used="gpt-4o-mini"
+            model_used=model_used or current_model_name(),
+            processing_time_ms=processing_time_ms,
         )
+        if encounter is not None:
+            record.encounter = encounter
+        return record
+
+    async def save_many(
+        self,
+        db: AsyncSession,
+        items: Sequence[Tuple[int, SOAPNote, Optional[int]]],
+        model_used: Optional[str] = None,
+    ) -> List[SOAPNoteRecord]:
+        """
+        Insert (encounter_id, note, processing_time_ms) rows in one flush and
+        one commit; returns the records in input order with ids assigned
+        """
+        records = [
+            self.build_record(note, encounter_id=encounter_id, model_used=model_used, processing_time_ms=ms)
+            for encounter_id, note, ms in items
+        ]
+        if not records:
+            return records
+        db.add_all(records)
+        try:
+            await db.flush()
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        return records
+
+    async def existing_encounter_ids(self, db: AsyncSession, encounter_ids: Sequence[int]) -> set:
+        """Subset of encounter_ids that exist, in one query"""
+        if not encounter_ids:
+            return set()
+        result = await db.execute(select(Encounter.id).where(Encounter.id.in_(set(encounter_ids))))
+        return set(result.scalars().all())
 
-        db.add(soap_record)
-        await db.commit()
-        await db.refresh(soap_record)
-        
-        return soap_record
-    
     async def get_by_encounter(self, db: AsyncSession, encounter_id: int) -> SOAPNoteRecord:
         """Get SOAP note by encounter ID"""
         result = await db.execute(select(SOAPNoteRecord).where(SOAPNoteRecord.encounter_id == encounter_id))
@@ -0,0 +1,217 @@
+"""
+Audio front end for live sessions: decode -> resample -> fixed frames.
+
+Every session whose audio we can decode gets an AudioProcessor that turns
+the client's chunks (any size) into fixed frames of STT_FRAME_MS (20 ms)
+of 16 kHz mono int16, which is what engines are fed:
+
+- pcm16 is read in place with np.frombuffer (no copy of the payload);
+- Opus packets are decoded with opuslib when it is installed, straight to
+  16 kHz; without it Opus sessions bypass the processor and engines get
+  the raw packets, as before;
+- 48 kHz is decimated by 3 with a polyphase FIR (Kaiser-windowed sinc,
+  cutoff just under 8 kHz): only the kept outputs are computed, as one
+  matrix-vector product over a strided view whose rows are the input
+  windows, 3 samples apart (a third of the multiply-adds of filtering at
+  48 kHz and dropping two samples in three). Filter
+  history and phase carry over between chunks, so chunk boundaries leave
+  no clicks or drift: splitting a stream into chunks any way gives the
+  same samples as processing it whole.
+
+Lost chunks are concealed with silence of the same duration so the
+timeline and filter stay continuous.
+
+Processing runs in a small thread pool (STT_AUDIO_WORKERS, 0 = always
+inline on the event loop). Chunks of one session are processed one at a
+time, in order, so processor state is never shared between threads.
+Chunks of at most STT_AUDIO_INLINE_MAX_MS of audio (60 ms) are processed
+inline anyway: they take tens of microseconds, less than the thread
+hand-off, so only large chunks are worth moving off the loop.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, List, Optional, Tuple, Union
+from dotenv import load_dotenv
+import asyncio
+import logging
+import os
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+from schemas.transcription import AudioInfo
+
+try:
+    import opuslib
+except ImportError:  # optional: Opus sessions are passed through undecoded
+    opuslib = None
+
+load_dotenv()
+
+TARGET_RATE = 16000
+
+
+def lowpass_taps(factor: int, taps: int, beta: float = 8.0) -> np.ndarray:
+    """Kaiser-windowed sinc for decimation by `factor`, unity DC gain"""
+    cutoff = 0.5 / factor * 0.92
+    n = np.arange(taps) - (taps - 1) / 2
+    h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(taps, beta)
+    return (h / h.sum()).astype(np.float32)
+
+
+class PolyphaseDecimator:
+    """Streaming FIR decimator; state (history and phase) persists across calls"""
+
+    def __init__(self, factor: int, taps: int = 72):
+        self.factor = factor
+        self.taps = taps
+        self._h = lowpass_taps(factor, taps)[::-1].copy()
+        self._history = np.zeros(taps - 1, dtype=np.float32)
+        # Start, in history+input coordinates, of the next output's window
+        self._offset = 0
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        buf = np.concatenate((self._history, x))
+        span = len(buf) - self.taps - self._offset
+        n_out = span // self.factor + 1 if span >= 0 else 0
+        if n_out:
+            # Row j is the window of output j: taps contiguous samples, rows `factor` apart
+            windows = as_strided(buf[self._offset:], shape=(n_out, self.taps),
+                                 strides=(self.factor * buf.itemsize, buf.itemsize), writeable=False)
+            out = np.dot(windows, self._h)
+        else:
+            out = np.empty(0, dtype=np.float32)
+        self._offset = self._offset + n_out * self.factor - len(x)
+        self._history = buf[len(buf) - (self.taps - 1):]
+        return out
+
+
+class AudioProcessor:
+    def __init__(self, audio: AudioInfo, frame_ms: float = 20):
+        self.audio = audio
+        self.frame_samples = int(TARGET_RATE * frame_ms / 1000)
+        self.frame_ms = frame_ms
+        self._decimator = PolyphaseDecimator(audio.sampleRateHz // TARGET_RATE) \
+            if audio.codec == "pcm16" and audio.sampleRateHz != TARGET_RATE else None
+        self._opus = opuslib.Decoder(TARGET_RATE, 1) if audio.codec == "opus" else None
+        # Undecoded odd byte of pcm16, and output samples not yet filling a frame
+        self._odd = b""
+        self._pending = np.empty(0, dtype=np.int16)
+        self.chunks = 0
+        self.frames = 0
+        self.cost_ms: Deque[float] = deque(maxlen=1024)
+
+    @staticmethod
+    def supported(audio: AudioInfo) -> bool:
+        return audio.codec == "pcm16" or opuslib is not None
+
+    def process(self, data: Union[bytes, memoryview]) -> List[np.ndarray]:
+        """Decode one chunk; returns the complete frames it finishes"""
+        t0 = time.perf_counter()
+        frames = self._frames(self._resample(self._decode(data)))
+        self.chunks += 1
+        self.cost_ms.append((time.perf_counter() - t0) * 1000)
+        return frames
+
+    def conceal(self, ms: float) -> List[np.ndarray]:
+        """Silence in place of `ms` of lost audio"""
+        rate = TARGET_RATE if self._opus is not None else self.audio.sampleRateHz
+        return self._frames(self._resample(np.zeros(int(rate * ms / 1000), dtype=np.float32)))
+
+    def flush(self) -> Tuple[List[np.ndarray], int]:
+        """
+        The last, zero-padded frame and how many of its samples are real
+        (0 when nothing is left)
+        """
+        real = len(self._pending)
+        if not real:
+            return [], 0
+        frame = np.zeros(self.frame_samples, dtype=np.int16)
+        frame[:real] = self._pending
+        self._pending = np.empty(0, dtype=np.int16)
+        self.frames += 1
+        return [frame], real
+
+    def _decode(self, data: Union[bytes, memoryview]) -> np.ndarray:
+        if self._opus is not None:
+            pcm = self._opus.decode(bytes(data), int(TARGET_RATE * 0.12))
+            return np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768
+        if self._odd:
+            data = self._odd + bytes(data)
+            self._odd = b""
+        if len(data) % 2:
+            self._odd = bytes(data[-1:])
+            data = data[:-1]
+        samples = np.frombuffer(data, dtype="<i2")
+        if self._decimator is None:
+            return samples
+        return samples.astype(np.float32) / 32768
+
+    def _resample(self, x: np.ndarray) -> np.ndarray:
+        """16 kHz int16"""
+        if self._decimator is not None:
+            if x.dtype == np.int16:
+                x = x.astype(np.float32) / 32768
+            x = self._decimator.process(x)
+        if x.dtype == np.int16:
+            return x
+        x *= 32768
+        np.rint(x, out=x)
+        np.clip(x, -32768, 32767, out=x)
+        return x.astype(np.int16)
+
+    def _frames(self, x: np.ndarray) -> List[np.ndarray]:
+        if len(self._pending):
+            x = np.concatenate((self._pending, x))
+        n = len(x) // self.frame_samples
+        self._pending = x[n * self.frame_samples:]
+        self.frames += n
+        return list(x[:n * self.frame_samples].reshape(n, self.frame_samples)) if n else []
+
+    def stats(self) -> dict:
+        cost = sorted(self.cost_ms)
+        return {
+            "chunks": self.chunks,
+            "frames": self.frames,
+            "cost_ms_p50": round(cost[len(cost) // 2], 4) if cost else 0.0,
+            "cost_ms_max": round(cost[-1], 4) if cost else 0.0,
+        }
+
+
+_warned_undecoded = False
+
+
+def create_processor(audio: AudioInfo) -> Optional[AudioProcessor]:
+    """None when this session's audio cannot be decoded here"""
+    global _warned_undecoded
+    if not AudioProcessor.supported(audio):
+        if not _warned_undecoded:
+            logging.warning("opuslib is not installed; Opus audio is passed to the STT engine undecoded")
+            _warned_undecoded = True
+        return None
+    return AudioProcessor(audio, float(os.getenv("STT_FRAME_MS", "20")))
+
+
+_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _workers() -> int:
+    return int(os.getenv("STT_AUDIO_WORKERS", "2"))
+
+
+async def run_audio(fn, *args, audio_ms: float = 0.0):
+    """Run a processor call on `audio_ms` of audio in the audio worker pool, or inline when small"""
+    global _pool
+    if _workers() <= 0 or audio_ms <= float(os.getenv("STT_AUDIO_INLINE_MAX_MS", "60")):
+        return fn(*args)
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix="stt-audio")
+    return await asyncio.get_running_loop().run_in_executor(_pool, fn, *args)
+
+
+def shutdown_audio_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True)
+        _pool = None
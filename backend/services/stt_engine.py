@@ -0,0 +1,312 @@
+"""
+Streaming speech-to-text engines behind /ws/transcribe.
+
+An engine is fed in-order AudioChunks (the session has already undone any
+network reordering and assigned each chunk its position on the audio
+clock) and answers with SttResults: partial hypotheses for the segment
+being spoken, revised as more audio arrives, and a final result when the
+segment closes. Results carry start/end on the same audio clock, in ms.
+
+STT_ENGINE_IMPL selects the backend:
+
+  stub    deterministic local engine for tests, demos and benchmarks; it
+          "recognizes" printable UTF-8 payloads as their own text and any
+          other audio as pseudo-words derived from a hash of the bytes
+  openai  windowed re-transcription of the open segment through the
+          transcription API (pcm16 only); requests run in the background
+          and their results are collected with poll()
+"""
+from collections import deque
+from typing import Deque, List, Optional, Union
+from dotenv import load_dotenv
+import asyncio
+import hashlib
+import io
+import math
+import os
+import random
+import wave
+
+from schemas.transcription import AudioInfo
+from services.llm_gateway import transcribe
+
+load_dotenv()
+
+# Samples per frame for each Opus TOC config (RFC 6716 section 3.1), in ms
+_OPUS_FRAME_MS = (
+    [10, 20, 40, 60] * 3          # 0-11 SILK
+    + [10, 20] * 2                # 12-15 hybrid
+    + [2.5, 5, 10, 20] * 4        # 16-31 CELT
+)
+
+_STUB_VOCABULARY = (
+    "patient reports cough fever for three days denies chest pain shortness of breath "
+    "history of asthma takes albuterol as needed no known drug allergies lungs clear "
+    "heart regular rate and rhythm abdomen soft plan follow up in one week"
+).split()
+
+
+class AudioChunk:
+    __slots__ = ("seq", "data", "start_ms", "end_ms", "arrived")
+
+    def __init__(self, seq: int, data: Union[bytes, memoryview], start_ms: float, end_ms: float, arrived: float):
+        self.seq = seq
+        # A memoryview into the received frame for binary framing; engines that
+        # keep audio past feed() must copy it
+        self.data = data
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        # time.perf_counter() when the chunk reached the server
+        self.arrived = arrived
+
+
+class SttResult:
+    __slots__ = ("segment", "text", "final", "start_ms", "end_ms")
+
+    def __init__(self, segment: int, text: str, final: bool, start_ms: float, end_ms: float):
+        self.segment = segment
+        self.text = text
+        self.final = final
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+
+
+def chunk_duration_ms(audio: AudioInfo, data: Union[bytes, memoryview]) -> float:
+    """
+    Audio duration of one chunk: exact for pcm16, from the TOC byte for a
+    single Opus packet
+    """
+    if audio.codec == "pcm16":
+        return len(data) / 2 / audio.sampleRateHz * 1000
+    if not data:
+        return 0.0
+    toc = data[0]
+    code = toc & 0x03
+    frames = 1 if code == 0 else 2 if code in (1, 2) else (data[1] & 0x3F if len(data) > 1 else 1)
+    return _OPUS_FRAME_MS[toc >> 3] * frames
+
+
+class SttEngine:
+    """
+    Backend interface. feed() is awaited once per chunk in seq order,
+    endpoint() at pauses the session's VAD detects, and finish() once at
+    end of stream; none of them is called concurrently. Engines that
+    transcribe in the background set `ready` when results are waiting, and
+    the session collects them with poll() under the same rule
+    """
+
+    name = "base"
+
+    def __init__(self, audio: AudioInfo):
+        self.audio = audio
+        self.ready = asyncio.Event()
+
+    def poll(self) -> List[SttResult]:
+        """Results finished in the background since the last call"""
+        return []
+
+    async def close(self) -> None:
+        """Drop background work still running (the client is gone)"""
+
+    async def feed(self, chunk: AudioChunk) -> List[SttResult]:
+        raise NotImplementedError
+
+    async def endpoint(self) -> List[SttResult]:
+        """The speaker paused: close the open segment; more audio may follow"""
+        return await self.finish()
+
+    async def finish(self) -> List[SttResult]:
+        """Close the open segment, if any, as a final result"""
+        raise NotImplementedError
+
+
+class StubSttEngine(SttEngine):
+    """
+    Deterministic engine: the same audio always yields the same words, one
+    per word_ms of non-silent audio. Digital silence (all-zero payloads),
+    sentence-ending punctuation and endpoints close a segment, as do
+    segments longer than segment_max_ms
+    """
+
+    name = "stub"
+
+    def __init__(self, audio: AudioInfo, segment_max_ms: float = 15000, word_ms: float = 350):
+        super().__init__(audio)
+        self.segment_max_ms = segment_max_ms
+        self.word_ms = word_ms
+        self._segment = 0
+        self._words: List[str] = []
+        self._start: Optional[float] = None
+        self._end = 0.0
+        # Hashed audio in the open segment, and the words already drawn for it
+        self._voiced_ms = 0.0
+        self._voiced_words = 0
+
+    async def feed(self, chunk: AudioChunk) -> List[SttResult]:
+        words = self._recognize(chunk)
+        if words is None:
+            return self._close()
+        if self._start is None:
+            self._start = chunk.start_ms
+        self._end = chunk.end_ms
+        if not words:
+            return []
+        self._words.extend(words)
+        if words[-1][-1] in ".?!" or self._end - self._start >= self.segment_max_ms:
+            return self._close()
+        return [SttResult(self._segment, " ".join(self._words), False, self._start, self._end)]
+
+    async def finish(self) -> List[SttResult]:
+        return self._close()
+
+    def _close(self) -> List[SttResult]:
+        if not self._words:
+            return []
+        result = SttResult(self._segment, " ".join(self._words), True, self._start, self._end)
+        self._segment += 1
+        self._words = []
+        self._start = None
+        self._voiced_ms = 0.0
+        self._voiced_words = 0
+        return [result]
+
+    def _recognize(self, chunk: AudioChunk) -> Optional[List[str]]:
+        """New words in this chunk; None for silence"""
+        data = chunk.data
+        if not int.from_bytes(data, "little"):
+            return None
+        try:
+            text = str(data, "utf-8")
+            if text.isprintable():
+                return text.split()
+        except UnicodeDecodeError:
+            pass
+        self._voiced_ms += chunk.end_ms - chunk.start_ms
+        count = math.ceil(self._voiced_ms / self.word_ms) - self._voiced_words
+        if count <= 0:
+            return []
+        self._voiced_words += count
+        rng = random.Random(hashlib.blake2b(data, digest_size=16).digest())
+        return rng.choices(_STUB_VOCABULARY, k=count)
+
+
+class TranscriptionApiEngine(SttEngine):
+    """
+    Streaming on top of a batch transcription API: the open segment's PCM is
+    re-transcribed every partial_every_ms of new audio (a partial) and once
+    more when it reaches segment_max_ms or the stream ends (the final).
+
+    No request is awaited in feed() or endpoint(): each runs as a task on a
+    snapshot of the segment and poll() hands back what has finished, finals
+    in segment order before any partial. At most one partial is in flight,
+    and closing a segment cancels it, since the final supersedes it. Only
+    finish() waits, for the finals still outstanding.
+    """
+
+    name = "openai"
+
+    def __init__(self, audio: AudioInfo, segment_max_ms: float = 15000, partial_every_ms: float = 1500):
+        if audio.codec != "pcm16":
+            raise ValueError(f"STT engine '{self.name}' needs pcm16 audio, got {audio.codec}")
+        super().__init__(audio)
+        self.segment_max_ms = segment_max_ms
+        self.partial_every_ms = partial_every_ms
+        self._segment = 0
+        # One segment of PCM, preallocated; chunks are copied in once
+        self._pcm = bytearray(int(segment_max_ms / 1000 * audio.sampleRateHz * 2) + 1)
+        self._pcm_len = 0
+        self._start: Optional[float] = None
+        self._end = 0.0
+        self._partial_at = 0.0
+        self._partial: Optional[asyncio.Task] = None
+        # Final transcriptions of closed segments, oldest first
+        self._finals: Deque[asyncio.Task] = deque()
+
+    async def feed(self, chunk: AudioChunk) -> List[SttResult]:
+        if self._start is None:
+            self._start = self._partial_at = chunk.start_ms
+        end = self._pcm_len + len(chunk.data)
+        if end > len(self._pcm):
+            self._pcm.extend(bytes(end - len(self._pcm)))
+        self._pcm[self._pcm_len:end] = chunk.data
+        self._pcm_len = end
+        self._end = chunk.end_ms
+        if self._end - self._start >= self.segment_max_ms:
+            self._close()
+        elif self._partial is None and self._end - self._partial_at >= self.partial_every_ms:
+            self._partial_at = self._end
+            self._partial = self._spawn(False)
+        return []
+
+    async def endpoint(self) -> List[SttResult]:
+        self._close()
+        return []
+
+    async def finish(self) -> List[SttResult]:
+        self._close()
+        results = []
+        while self._finals:
+            result = await self._finals.popleft()
+            if result is not None:
+                results.append(result)
+        return results
+
+    def poll(self) -> List[SttResult]:
+        results = []
+        while self._finals and self._finals[0].done():
+            result = self._finals.popleft().result()
+            if result is not None:
+                results.append(result)
+        if self._partial is not None and self._partial.done() and not self._finals:
+            task, self._partial = self._partial, None
+            result = task.result()
+            if result is not None:
+                results.append(result)
+        return results
+
+    async def close(self) -> None:
+        tasks = [t for t in (self._partial, *self._finals) if t is not None]
+        self._partial = None
+        self._finals.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _close(self) -> None:
+        if self._partial is not None:
+            self._partial.cancel()
+            self._partial = None
+        if not self._pcm_len:
+            return
+        self._finals.append(self._spawn(True))
+        self._segment += 1
+        self._pcm_len = 0
+        self._start = None
+
+    def _spawn(self, final: bool) -> asyncio.Task:
+        """Transcribe the open segment as it is now, in the background"""
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(self.audio.sampleRateHz)
+            w.writeframes(memoryview(self._pcm)[:self._pcm_len])
+        task = asyncio.create_task(self._transcribe(
+            buf.getvalue(), SttResult(self._segment, "", final, self._start, self._end)))
+        task.add_done_callback(lambda _: self.ready.set())
+        return task
+
+    async def _transcribe(self, wav: bytes, result: SttResult) -> Optional[SttResult]:
+        result.text = ((await transcribe("segment.wav", wav)) or "").strip()
+        return result if result.text else None
+
+
+def create_engine(audio: AudioInfo, impl: Optional[str] = None) -> SttEngine:
+    """Engine selected by STT_ENGINE_IMPL; ValueError for unknown or unsupported setups"""
+    impl = impl or os.getenv("STT_ENGINE_IMPL", "stub")
+    segment_max_ms = float(os.getenv("STT_SEGMENT_MAX_MS", "15000"))
+    if impl == "stub":
+        return StubSttEngine(audio, segment_max_ms, float(os.getenv("STT_STUB_WORD_MS", "350")))
+    if impl == "openai":
+        return TranscriptionApiEngine(audio, segment_max_ms, float(os.getenv("STT_PARTIAL_EVERY_MS", "1500")))
+    raise ValueError(f"Unknown STT engine '{impl}'")
@@ -0,0 +1,37 @@
+"""
+Binary audio framing for /ws/transcribe.
+
+A client that sends ClientInit with framing="binary" streams audio as
+WebSocket binary frames instead of base64 in JSON text frames:
+
+    byte 0      version (1)
+    byte 1      flags   (bit 0: END, the last frame of the stream)
+    bytes 2-5   seq, unsigned 32-bit big-endian
+    bytes 6-    raw codec payload (pcm16 little-endian samples or one
+                Opus packet); may be empty on an END frame
+
+Parsing returns a memoryview over the received frame, so the payload is not
+copied between the socket and the engine.
+"""
+from typing import Tuple
+import struct
+
+VERSION = 1
+FLAG_END = 0x01
+HEADER = struct.Struct("!BBI")
+HEADER_BYTES = HEADER.size
+
+
+def parse_frame(frame: bytes) -> Tuple[int, int, memoryview]:
+    """(seq, flags, payload view); ValueError for a malformed frame"""
+    if len(frame) < HEADER_BYTES:
+        raise ValueError(f"Frame shorter than the {HEADER_BYTES}-byte header")
+    version, flags, seq = HEADER.unpack_from(frame)
+    if version != VERSION:
+        raise ValueError(f"Unsupported frame version {version}")
+    return seq, flags, memoryview(frame)[HEADER_BYTES:]
+
+
+def encode_frame(seq: int, payload: bytes = b"", flags: int = 0) -> bytes:
+    """Client side of the format (benchmarks, test clients)"""
+    return HEADER.pack(VERSION, flags, seq) + payload
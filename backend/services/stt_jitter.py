@@ -0,0 +1,138 @@
+"""
+Reorder (jitter) buffer for streamed audio chunks.
+
+Clients number their chunks with ClientAudio.seq, but on a congested or
+reconnecting link chunks can arrive out of order or more than once. The
+buffer releases chunks strictly in seq order: a chunk that arrives early
+waits for the ones before it, duplicates and chunks older than what was
+already released are dropped.
+
+A gap is not waited on forever. Once more than max_pending chunks are
+queued behind it, or the oldest queued chunk has waited max_wait_ms, the
+missing seqs are declared lost and playout skips ahead; each released
+chunk carries how many seqs were skipped right before it so the caller
+can keep its audio clock aligned.
+
+A seq more than max_ahead past the next one to play is rejected outright
+rather than queued: skipping to it would declare every seq in between
+lost, and seqs come straight from the client (a u32 in binary frames).
+"""
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# (seq, item, seqs lost immediately before this one)
+Released = Tuple[int, Any, int]
+
+_SKIPPED_WINDOW = 4096
+
+
+class ReorderBuffer:
+    def __init__(self, max_pending: int = 32, max_wait_ms: float = 250.0, first_seq: int = 0,
+                 max_ahead: int = 1024):
+        self.max_pending = max_pending
+        self.max_ahead = max_ahead
+        self.max_wait_s = max_wait_ms / 1000
+        self.next_seq = first_seq
+        # seq -> (arrival time, item)
+        self._pending: Dict[int, Tuple[float, Any]] = {}
+        # Recently skipped seqs, to tell a chunk that missed its slot from a retransmission
+        self._skipped: Set[int] = set()
+        self.received = 0
+        self.released = 0
+        self.reordered = 0
+        self.duplicates = 0
+        self.late = 0
+        self.rejected = 0
+        self.lost = 0
+        self.max_depth = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def push(self, seq: int, item: Any, now: float) -> Tuple[List[Released], str]:
+        """
+        Offer a chunk; returns what can be released now and a verdict:
+        "accepted", "duplicate" (already queued or released), "late"
+        (its slot was skipped as lost) or "too_far" (more than max_ahead
+        past the next seq; dropped)
+        """
+        self.received += 1
+        if seq < self.next_seq:
+            if seq in self._skipped:
+                self.late += 1
+                return [], "late"
+            self.duplicates += 1
+            return [], "duplicate"
+        if seq in self._pending:
+            self.duplicates += 1
+            return [], "duplicate"
+        if seq - self.next_seq > self.max_ahead:
+            self.rejected += 1
+            return [], "too_far"
+        if seq != self.next_seq:
+            self.reordered += 1
+        self._pending[seq] = (now, item)
+        self.max_depth = max(self.max_depth, len(self._pending))
+        released = self._drain()
+        released.extend(self.expire(now))
+        return released, "accepted"
+
+    def expire(self, now: float) -> List[Released]:
+        """Give up on gaps that have been waited on for too long"""
+        released: List[Released] = []
+        while self._pending and (
+            len(self._pending) > self.max_pending or now - self._oldest_arrival() >= self.max_wait_s
+        ):
+            released.extend(self._skip_gap())
+        return released
+
+    def flush(self) -> List[Released]:
+        """Release everything still queued, skipping any gaps (end of stream)"""
+        released: List[Released] = []
+        while self._pending:
+            released.extend(self._skip_gap())
+        return released
+
+    def next_deadline(self, now: float) -> Optional[float]:
+        """Seconds until the current gap times out, or None when nothing is queued"""
+        if not self._pending:
+            return None
+        return max(0.0, self._oldest_arrival() + self.max_wait_s - now)
+
+    def _oldest_arrival(self) -> float:
+        return min(arrived for arrived, _ in self._pending.values())
+
+    def _skip_gap(self) -> List[Released]:
+        first = min(self._pending)
+        lost = first - self.next_seq
+        self.lost += lost
+        self._skipped.update(range(max(self.next_seq, first - _SKIPPED_WINDOW), first))
+        if len(self._skipped) > _SKIPPED_WINDOW:
+            self._skipped = {s for s in self._skipped if s >= first - _SKIPPED_WINDOW}
+        self.next_seq = first
+        released = self._drain()
+        if released:
+            seq, item, _ = released[0]
+            released[0] = (seq, item, lost)
+        return released
+
+    def _drain(self) -> List[Released]:
+        released: List[Released] = []
+        while self.next_seq in self._pending:
+            _, item = self._pending.pop(self.next_seq)
+            released.append((self.next_seq, item, 0))
+            self.next_seq += 1
+        self.released += len(released)
+        return released
+
+    def stats(self) -> dict:
+        return {
+            "received": self.received,
+            "released": self.released,
+            "reordered": self.reordered,
+            "duplicates": self.duplicates,
+            "late": self.late,
+            "rejected": self.rejected,
+            "lost": self.lost,
+            "pending": len(self._pending),
+            "max_depth": self.max_depth,
+        }
@@ -0,0 +1,384 @@
+"""
+One live transcription session: reorder buffer -> audio front end -> STT engine.
+
+Chunks go through a ReorderBuffer keyed by ClientAudio.seq, so they reach
+the engine in order even when the network reorders or duplicates them.
+Released chunks are decoded and resampled into fixed 16 kHz frames by the
+session's AudioProcessor (services/stt_audio.py, in the audio worker
+pool), and every frame is placed on the session's audio clock, which is
+where the startMs/endMs of every transcript message come from. Skipped
+seqs are concealed with silence as long as the lost chunks (at most
+STT_REORDER_MAX_WAIT_MS of it; the clock skips the rest). Audio the
+processor cannot decode (Opus without opuslib) goes to the engine as is,
+timed by its codec duration.
+
+Frames then pass the session's voice activity detector (services/stt_vad.py,
+STT_VAD_MODE): room noise and pauses are not sent to the engine, though
+they still advance the audio clock, and a pause after speech closes the
+engine's open segment, so each ServerFinal ends at a natural pause.
+
+Engine results are sent as ServerTranscriptChunk partials (one id per
+segment, revised in place) and a ServerFinal per closed segment, as the
+engine returns them or, when it transcribes in the background, as soon
+as they are ready; end() flushes the buffer, closes the open segment and
+always sends one last ServerFinal. Sessions started with soapDraft also
+keep a rolling SOAP note (services/soap_draft.py) fed by the final
+segments; its last version follows the closing ServerFinal.
+
+Latency is measured from a chunk's arrival at the server to the first
+transcript message that covers it, so it includes time spent waiting in
+the reorder buffer as well as engine time.
+"""
+from collections import deque
+from typing import Awaitable, Callable, Deque, List, Optional
+import asyncio
+import logging
+import os
+import time
+
+import numpy as np
+
+from schemas.transcription import (
+    AudioInfo,
+    ClientInit,
+    ServerTranscriptChunk,
+    ServerFinal,
+    ServerFinalSegment,
+    ServerError,
+)
+from services.stt_audio import TARGET_RATE, create_processor, run_audio
+from services.stt_engine import AudioChunk, SttEngine, SttResult, chunk_duration_ms, create_engine
+from services.soap_draft import create_draft
+from services.stt_jitter import ReorderBuffer, Released
+from services.stt_vad import create_vad
+
+Send = Callable[[dict], Awaitable[None]]
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return round(sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))], 3)
+
+
+class SttMetrics:
+    """Process-wide counters and recent latency samples for /metrics"""
+
+    def __init__(self, window: int = 2048):
+        self.latency_ms: Deque[float] = deque(maxlen=window)
+        # end of session -> final SOAP draft sent
+        self.draft_final_ms: Deque[float] = deque(maxlen=window)
+        self.engine_ms: Deque[float] = deque(maxlen=window)
+        # Per chunk decode/resample: including the worker pool hand-off, and the work alone
+        self.audio_ms: Deque[float] = deque(maxlen=window)
+        self.audio_work_ms: Deque[float] = deque(maxlen=window)
+        self.counts = {
+            "sessions": 0,
+            "active_sessions": 0,
+            "chunks": 0,
+            "reordered": 0,
+            "duplicates": 0,
+            "late": 0,
+            "rejected": 0,
+            "lost": 0,
+            "partials": 0,
+            "finals": 0,
+            "engine_errors": 0,
+            "vad_frames": 0,
+            "vad_skipped": 0,
+            "vad_endpoints": 0,
+            "soap_drafts": 0,
+            "soap_draft_errors": 0,
+        }
+
+    def stats(self) -> dict:
+        latency, engine = sorted(self.latency_ms), sorted(self.engine_ms)
+        draft_final = sorted(self.draft_final_ms)
+        audio, work = sorted(self.audio_ms), sorted(self.audio_work_ms)
+        return {
+            **self.counts,
+            "engine": os.getenv("STT_ENGINE_IMPL", "stub"),
+            "vad_skipped_fraction": round(self.counts["vad_skipped"] / self.counts["vad_frames"], 4)
+            if self.counts["vad_frames"] else 0.0,
+            "latency_ms_p50": _percentile(latency, 0.5),
+            "latency_ms_p95": _percentile(latency, 0.95),
+            "latency_ms_p99": _percentile(latency, 0.99),
+            "engine_ms_p50": _percentile(engine, 0.5),
+            "engine_ms_p95": _percentile(engine, 0.95),
+            "audio_chunk_ms_p50": _percentile(audio, 0.5),
+            "audio_chunk_ms_p95": _percentile(audio, 0.95),
+            "audio_work_ms_p50": _percentile(work, 0.5),
+            "audio_work_ms_p95": _percentile(work, 0.95),
+            "draft_final_ms_p50": _percentile(draft_final, 0.5),
+            "draft_final_ms_p95": _percentile(draft_final, 0.95),
+        }
+
+
+stt_metrics = SttMetrics()
+
+
+class SttSession:
+    def __init__(self, init: ClientInit, send: Send, engine: Optional[SttEngine] = None,
+                 buffer: Optional[ReorderBuffer] = None):
+        self.init = init
+        self.audio_info = init.audio
+        self._send = send
+        self.processor = create_processor(init.audio)
+        # With a processor, engines see 16 kHz pcm16 in fixed frames whatever the client sent
+        engine_audio = AudioInfo(codec="pcm16", sampleRateHz=TARGET_RATE, channels=1) if self.processor else init.audio
+        self.engine = engine or create_engine(engine_audio)
+        self.vad = create_vad(self.processor.frame_ms) if self.processor else None
+        self.draft = create_draft(init.sessionId, send) if init.soapDraft else None
+        self.buffer = buffer or ReorderBuffer(
+            max_pending=int(os.getenv("STT_REORDER_MAX_PENDING", "32")),
+            max_wait_ms=float(os.getenv("STT_REORDER_MAX_WAIT_MS", "250")),
+            max_ahead=int(os.getenv("STT_REORDER_MAX_AHEAD", "1024")),
+        )
+        self.clock_ms = 0.0
+        self._last_chunk_ms = 0.0
+        # Chunks fed to the engine that no transcript message has covered yet
+        self._uncovered: List[AudioChunk] = []
+        self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._expiry: Optional[asyncio.Task] = None
+        self._collector: Optional[asyncio.Task] = None
+        self.latency_ms: List[float] = []
+        self.partials = 0
+        self.finals = 0
+        stt_metrics.counts["sessions"] += 1
+        stt_metrics.counts["active_sessions"] += 1
+
+    def start(self) -> None:
+        self._expiry = asyncio.create_task(self._expire_gaps())
+        self._collector = asyncio.create_task(self._collect())
+
+    async def audio(self, seq: int, data: bytes, arrived: Optional[float] = None) -> None:
+        """Offer one chunk as received; anything now in order is transcribed"""
+        arrived = time.perf_counter() if arrived is None else arrived
+        stt_metrics.counts["chunks"] += 1
+        async with self._lock:
+            reordered = self.buffer.reordered
+            released, verdict = self.buffer.push(seq, (data, arrived), arrived)
+            stt_metrics.counts["reordered"] += self.buffer.reordered - reordered
+            if verdict == "late":
+                stt_metrics.counts["late"] += 1
+                await self._send(ServerError(
+                    message=f"Chunk {seq} arrived after its slot was played out",
+                    code="SEQ_ORDER",
+                ).model_dump())
+            elif verdict == "too_far":
+                stt_metrics.counts["rejected"] += 1
+                await self._send(ServerError(
+                    message=f"Chunk {seq} is more than {self.buffer.max_ahead} chunks ahead of {self.buffer.next_seq}",
+                    code="SEQ_ORDER",
+                ).model_dump())
+            elif verdict == "duplicate":
+                stt_metrics.counts["duplicates"] += 1
+            await self._play(released)
+        self._wake.set()
+
+    async def end(self) -> None:
+        """Flush everything and send the closing ServerFinal"""
+        async with self._lock:
+            await self._play(self.buffer.flush())
+            if self.processor is not None:
+                frames, real = self.processor.flush()
+                await self._feed_frames(self.buffer.next_seq - 1, frames, time.perf_counter(), last_real=real)
+            if self.vad is not None:
+                skipped = self.vad.skipped
+                self.vad.flush()
+                stt_metrics.counts["vad_skipped"] += self.vad.skipped - skipped
+            try:
+                results = await self.engine.finish()
+            except Exception as e:
+                results = []
+                await self._engine_failed(e)
+            finals = [r for r in results if r.final]
+            await self._send(ServerFinal(segments=[self._segment(r) for r in finals]).model_dump())
+            self.finals += len(finals)
+            stt_metrics.counts["finals"] += len(finals)
+            self._covered(results)
+            if self.draft is not None:
+                for r in finals:
+                    self.draft.add(r.text, r.start_ms, r.end_ms)
+                t0 = time.perf_counter()
+                await self.draft.finish()
+                stt_metrics.draft_final_ms.append((time.perf_counter() - t0) * 1000)
+
+    async def close(self) -> None:
+        for task in (self._expiry, self._collector):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._expiry = self._collector = None
+        await self.engine.close()
+        if self.draft is not None:
+            await self.draft.close()
+            stt_metrics.counts["soap_drafts"] += self.draft.version
+            stt_metrics.counts["soap_draft_errors"] += self.draft.failures
+        stt_metrics.counts["active_sessions"] -= 1
+        stats = self.stats()
+        logging.info(
+            "STT session %s: %d chunks (%d reordered, %d lost), %d partials, %d finals, "
+            "%.0f ms audio, latency p50 %.1f ms p95 %.1f ms",
+            self.init.sessionId, stats["buffer"]["received"], stats["buffer"]["reordered"],
+            stats["buffer"]["lost"], self.partials, self.finals, self.clock_ms,
+            stats["latency_ms_p50"], stats["latency_ms_p95"],
+        )
+
+    async def _expire_gaps(self) -> None:
+        """Release chunks stuck behind a gap once the gap times out"""
+        while True:
+            delay = self.buffer.next_deadline(time.perf_counter())
+            if delay is None:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            await asyncio.sleep(delay)
+            async with self._lock:
+                await self._play(self.buffer.expire(time.perf_counter()))
+
+    async def _collect(self) -> None:
+        """Send results the engine finished in the background"""
+        while True:
+            await self.engine.ready.wait()
+            async with self._lock:
+                self.engine.ready.clear()
+                try:
+                    results = self.engine.poll()
+                except Exception as e:
+                    # poll() dropped the failed request; look again for ones behind it
+                    self.engine.ready.set()
+                    await self._engine_failed(e)
+                    continue
+                await self._emit(results)
+
+    async def _play(self, released: List[Released]) -> None:
+        for seq, (data, arrived), lost in released:
+            if lost:
+                stt_metrics.counts["lost"] += lost
+                if self.processor is None:
+                    self.clock_ms += lost * self._last_chunk_ms
+                else:
+                    # Silence only up to the reorder wait; a longer gap just moves the clock on
+                    gap_ms = lost * self._last_chunk_ms
+                    conceal_ms = min(gap_ms, self.buffer.max_wait_s * 1000)
+                    frames = await run_audio(self.processor.conceal, conceal_ms, audio_ms=conceal_ms)
+                    await self._feed_frames(seq, frames, arrived)
+                    self.clock_ms += gap_ms - conceal_ms
+            duration = chunk_duration_ms(self.audio_info, data)
+            if duration:
+                self._last_chunk_ms = duration
+            if self.processor is None:
+                chunk = AudioChunk(seq, data, self.clock_ms, self.clock_ms + duration, arrived)
+                self.clock_ms = chunk.end_ms
+                await self._feed(chunk)
+                continue
+            t0 = time.perf_counter()
+            frames = await run_audio(self.processor.process, data, audio_ms=duration)
+            stt_metrics.audio_ms.append((time.perf_counter() - t0) * 1000)
+            stt_metrics.audio_work_ms.append(self.processor.cost_ms[-1])
+            await self._feed_frames(seq, frames, arrived)
+
+    async def _feed_frames(self, seq: int, frames: List[np.ndarray], arrived: float, last_real: Optional[int] = None) -> None:
+        chunks = []
+        for i, frame in enumerate(frames):
+            samples = last_real if last_real is not None and i == len(frames) - 1 else len(frame)
+            end_ms = self.clock_ms + samples * 1000 / TARGET_RATE
+            chunks.append(AudioChunk(seq, memoryview(frame).cast("B"), self.clock_ms, end_ms, arrived))
+            self.clock_ms = end_ms
+        if self.vad is None:
+            for chunk in chunks:
+                await self._feed(chunk)
+            return
+        counts = self.vad.frames, self.vad.skipped, self.vad.endpoints
+        events = self.vad.push(chunks, frames)
+        stt_metrics.counts["vad_frames"] += self.vad.frames - counts[0]
+        stt_metrics.counts["vad_skipped"] += self.vad.skipped - counts[1]
+        stt_metrics.counts["vad_endpoints"] += self.vad.endpoints - counts[2]
+        for kind, chunk in events:
+            if kind == "feed":
+                await self._feed(chunk)
+            else:
+                await self._endpoint()
+
+    async def _feed(self, chunk: AudioChunk) -> None:
+        self._uncovered.append(chunk)
+        t0 = time.perf_counter()
+        try:
+            results = await self.engine.feed(chunk)
+        except Exception as e:
+            await self._engine_failed(e)
+            return
+        stt_metrics.engine_ms.append((time.perf_counter() - t0) * 1000)
+        await self._emit(results)
+
+    async def _endpoint(self) -> None:
+        """A pause in speech: close the engine's open segment now"""
+        try:
+            results = await self.engine.endpoint()
+        except Exception as e:
+            await self._engine_failed(e)
+            return
+        await self._emit(results)
+
+    async def _emit(self, results: List[SttResult]) -> None:
+        for r in results:
+            if r.final:
+                await self._send(ServerFinal(segments=[self._segment(r)]).model_dump())
+                self.finals += 1
+                stt_metrics.counts["finals"] += 1
+                if self.draft is not None:
+                    self.draft.add(r.text, r.start_ms, r.end_ms)
+            else:
+                await self._send(ServerTranscriptChunk(
+                    id=self._segment_id(r), text=r.text, partial=True,
+                    startMs=round(r.start_ms), endMs=round(r.end_ms),
+                ).model_dump())
+                self.partials += 1
+                stt_metrics.counts["partials"] += 1
+        self._covered(results)
+
+    def _covered(self, results: List[SttResult]) -> None:
+        """Record arrival -> emission latency for chunks the results cover"""
+        if not results:
+            return
+        now = time.perf_counter()
+        start = min(r.start_ms for r in results)
+        for chunk in self._uncovered:
+            # Audio before the segment start (silence) was never transcribed
+            if chunk.end_ms > start:
+                ms = (now - chunk.arrived) * 1000
+                self.latency_ms.append(ms)
+                stt_metrics.latency_ms.append(ms)
+        self._uncovered = []
+
+    async def _engine_failed(self, e: Exception) -> None:
+        stt_metrics.counts["engine_errors"] += 1
+        logging.error("STT engine %s failed in session %s: %s", self.engine.name, self.init.sessionId, e)
+        await self._send(ServerError(message="Transcription engine error", code="STT_ERROR").model_dump())
+
+    def _segment_id(self, r: SttResult) -> str:
+        return f"seg-{r.segment}"
+
+    def _segment(self, r: SttResult) -> ServerFinalSegment:
+        return ServerFinalSegment(text=r.text, startMs=round(r.start_ms), endMs=round(r.end_ms))
+
+    def stats(self) -> dict:
+        latency = sorted(self.latency_ms)
+        return {
+            "engine": self.engine.name,
+            "buffer": self.buffer.stats(),
+            "audio_ms": round(self.clock_ms, 1),
+            "partials": self.partials,
+            "finals": self.finals,
+            "latency_ms_p50": _percentile(latency, 0.5),
+            "latency_ms_p95": _percentile(latency, 0.95),
+            "latency_ms_max": round(latency[-1], 2) if latency else 0.0,
+            "audio": self.processor.stats() if self.processor else None,
+            "vad": self.vad.stats() if self.vad else None,
+            "soap_draft": self.draft.stats() if self.draft else None,
+        }
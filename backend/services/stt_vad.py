@@ -0,0 +1,153 @@
+"""
+Streaming voice activity detection for live sessions.
+
+Runs on the AudioProcessor's fixed 16 kHz frames. For every batch of
+frames, energy (dBFS) and zero-crossing rate are computed in one vectorized
+pass; the decision per frame is:
+
+    speech  if energy > noise floor + margin_db
+         or energy > noise floor + margin_db / 2 and ZCR > zcr_min
+            (quiet fricatives: "s", "f", "th")
+
+The noise floor starts at min_db, follows drops in energy immediately and
+rises slowly (~1.5 dB/s), so it settles on the room's background level,
+follows changes in it, and is pulled back down by the dips between words.
+
+A small state machine on top turns frame decisions into utterances:
+
+- onset: onset_frames consecutive speech frames start an utterance; the
+  preroll_ms of audio before them is sent along so word beginnings are
+  not clipped;
+- hangover: after the last speech frame, hangover_ms more audio is still
+  sent (short gaps between words stay inside the utterance);
+- pause: once the hangover runs out the utterance ends and an endpoint is
+  emitted, which closes the engine's open segment so the ServerFinal
+  lands at the natural pause instead of at segment_max_ms.
+
+STT_VAD_MODE=drop (default) never sends non-speech frames to the engine;
+=mark sends everything but still cuts segments at pauses; =off disables
+the detector.
+"""
+from typing import Any, Deque, List, Optional, Tuple
+from collections import deque
+from dotenv import load_dotenv
+import os
+
+import numpy as np
+
+load_dotenv()
+
+# (kind, item): ("feed", item) in order, or ("endpoint", None) at a pause
+VadEvent = Tuple[str, Any]
+
+
+class StreamingVad:
+    def __init__(
+        self,
+        frame_ms: float = 20,
+        margin_db: float = 12.0,
+        min_db: float = -60.0,
+        zcr_min: float = 0.25,
+        onset_frames: int = 2,
+        hangover_ms: float = 300,
+        preroll_ms: float = 200,
+        mark_only: bool = False,
+    ):
+        self.margin_db = margin_db
+        self.min_db = min_db
+        self.zcr_min = zcr_min
+        self.onset_frames = onset_frames
+        self.hangover_frames = max(1, round(hangover_ms / frame_ms))
+        self.mark_only = mark_only
+        # Assume a quiet room until heard otherwise; never below min_db, so
+        # digital silence does not leave the floor far under real room noise
+        self.noise_db = min_db
+        # Per 20 ms frame; rises ~1.5 dB/s while nothing is quieter
+        self.rise_db = 0.03 * frame_ms / 20
+        self.in_speech = False
+        self._run = 0
+        self._silent_for = 0
+        self._preroll: Deque[Any] = deque(maxlen=max(onset_frames, round(preroll_ms / frame_ms)))
+        self.frames = 0
+        self.speech_frames = 0
+        self.skipped = 0
+        self.endpoints = 0
+
+    def features(self, frames: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(energy dBFS, zero-crossing rate) per row of an (n, samples) int16 array"""
+        x = frames.astype(np.float32) / 32768
+        energy = 10 * np.log10(np.einsum("ij,ij->i", x, x) / x.shape[1] + 1e-10)
+        signs = np.signbit(x)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (x.shape[1] - 1)
+        return energy, zcr
+
+    def push(self, items: List[Any], frames: List[np.ndarray]) -> List[VadEvent]:
+        """Classify a batch of frames; `items` are what gets passed back to feed"""
+        if not items:
+            return []
+        energy, zcr = self.features(np.stack(frames))
+        events: List[VadEvent] = []
+        for item, e, z in zip(items, energy.tolist(), zcr.tolist()):
+            self.frames += 1
+            speech = self._classify(e, z)
+            self.speech_frames += speech
+            if self.in_speech:
+                events.append(("feed", item))
+                self._silent_for = 0 if speech else self._silent_for + 1
+                if self._silent_for >= self.hangover_frames:
+                    self.in_speech = False
+                    self._run = 0
+                    self.endpoints += 1
+                    events.append(("endpoint", None))
+                continue
+            self._run = self._run + 1 if speech else 0
+            if self._run >= self.onset_frames:
+                self.in_speech = True
+                self._silent_for = 0
+                events.extend(("feed", held) for held in self._preroll)
+                self._preroll.clear()
+                events.append(("feed", item))
+            elif self.mark_only:
+                events.append(("feed", item))
+            else:
+                if len(self._preroll) == self._preroll.maxlen:
+                    self.skipped += 1
+                self._preroll.append(item)
+        return events
+
+    def flush(self) -> None:
+        """End of stream: audio held as preroll was never speech"""
+        self.skipped += len(self._preroll)
+        self._preroll.clear()
+
+    def _classify(self, e: float, z: float) -> bool:
+        if e < self.noise_db:
+            self.noise_db = max(e, self.min_db)
+        else:
+            self.noise_db += self.rise_db
+        return e > self.noise_db + self.margin_db or (e > self.noise_db + self.margin_db / 2 and z > self.zcr_min)
+
+    def stats(self) -> dict:
+        return {
+            "frames": self.frames,
+            "speech_frames": self.speech_frames,
+            "skipped": self.skipped,
+            "skipped_fraction": round(self.skipped / self.frames, 4) if self.frames else 0.0,
+            "endpoints": self.endpoints,
+            "noise_db": round(self.noise_db, 1),
+        }
+
+
+def create_vad(frame_ms: float) -> Optional[StreamingVad]:
+    mode = os.getenv("STT_VAD_MODE", "drop")
+    if mode == "off":
+        return None
+    if mode not in ("drop", "mark"):
+        raise ValueError(f"Unknown STT_VAD_MODE '{mode}'")
+    return StreamingVad(
+        frame_ms=frame_ms,
+        margin_db=float(os.getenv("STT_VAD_MARGIN_DB", "12")),
+        hangover_ms=float(os.getenv("STT_VAD_HANGOVER_MS", "300")),
+        preroll_ms=float(os.getenv("STT_VAD_PREROLL_MS", "200")),
+        mark_only=mode == "mark",
+    )
@@ -1,5 +1,11 @@
 type AudioInfo = { codec: "opus" | "pcm16"; sampleRateHz: 16000 | 48000; channels: 1 }
-type InitMessage = { type: "init"; sessionId: string; audio: AudioInfo }
+type InitMessage = {
+  type: "init"
+  sessionId: string
+  audio: AudioInfo
+  framing?: "json" | "binary"
+  soapDraft?: boolean
+}
 type AudioMessage = { type: "audio"; seq: number; data: string }
 type EndMessage = { type: "end" }
 type ServerTranscriptChunk = {
@@ -13,15 +19,50 @@ type ServerTranscriptChunk = {
 type ServerFinalSegment = { text: string; startMs: number; endMs: number }
 type ServerFinal = { type: "final"; segments: ServerFinalSegment[] }
 type ServerError = { type: "error"; message: string; code?: string }
+type ServerReady = { type: "ready"; sessionId: string; framing: "json" | "binary"; headerBytes: number }
+type SOAPNote = { subjective: string; objective: string; assessment: string; plan: string }
+type ServerSoapDraft = {
+  type: "soap_draft"
+  version: number
+  final: boolean
+  note: SOAPNote
+  segments: number
+  throughMs: number
+}
+
+// Binary audio frames (backend/services/stt_frames.py): version, flags, u32 big-endian seq, payload
+const FRAME_VERSION = 1
+const FLAG_END = 0x01
+const HEADER_BYTES = 6
 
-export function createTranscribeSocket(base = "ws://localhost:8000/ws/transcribe") {
+function encodeFrame(seq: number, payload: Uint8Array, flags = 0): Uint8Array {
+  const frame = new Uint8Array(HEADER_BYTES + payload.byteLength)
+  const view = new DataView(frame.buffer)
+  view.setUint8(0, FRAME_VERSION)
+  view.setUint8(1, flags)
+  view.setUint32(2, seq >>> 0, false)
+  frame.set(payload, HEADER_BYTES)
+  return frame
+}
+
+type TranscribeSocketOptions = {
+  audio?: AudioInfo
+  framing?: "json" | "binary"
+  soapDraft?: boolean
+}
+
+export function createTranscribeSocket(base = "ws://localhost:8000/ws/transcribe", options: TranscribeSocketOptions = {}) {
   const ws = new WebSocket(base)
+  const framing = options.framing ?? "json"
+  let nextSeq = 0
 
   ws.addEventListener("open", () => {
     const init: InitMessage = {
       type: "init",
       sessionId: crypto.randomUUID(),
-      audio: { codec: "opus", sampleRateHz: 16000, channels: 1 },
+      audio: options.audio ?? { codec: "opus", sampleRateHz: 16000, channels: 1 },
+      framing,
+      soapDraft: options.soapDraft ?? true,
     }
     ws.send(JSON.stringify(init))
   })
@@ -29,21 +70,43 @@ export function createTranscribeSocket(base = "ws://localhost:8000/ws/transcribe
   function sendAudio(seq: number, dataBase64: string) {
     const msg: AudioMessage = { type: "audio", seq, data: dataBase64 }
     ws.send(JSON.stringify(msg))
+    nextSeq = Math.max(nextSeq, seq + 1)
+  }
+
+  // Needs framing "binary"; the raw payload goes out without base64
+  function sendAudioBinary(seq: number, bytes: Uint8Array | ArrayBuffer) {
+    const payload = bytes instanceof Uint8Array ? bytes : new Uint8Array(bytes)
+    ws.send(encodeFrame(seq, payload))
+    nextSeq = Math.max(nextSeq, seq + 1)
   }
 
   function end() {
+    if (framing === "binary") {
+      // Header-only END frame; the server ignores its seq since there is no payload
+      ws.send(encodeFrame(nextSeq, new Uint8Array(0), FLAG_END))
+      return
+    }
     const msg: EndMessage = { type: "end" }
     ws.send(JSON.stringify(msg))
   }
 
-  function onMessage(handler: (msg: ServerTranscriptChunk | ServerFinal | ServerError) => void) {
+  function onMessage(handler: (msg: ServerTranscriptChunk | ServerFinal | ServerError | ServerReady | ServerSoapDraft) => void) {
     ws.addEventListener("message", (ev) => {
       const parsed = JSON.parse(ev.data)
       handler(parsed)
     })
   }
 
-  return { ws, sendAudio, end, onMessage }
+  return { ws, sendAudio, sendAudioBinary, end, onMessage }
 }
 
-export type { ServerTranscriptChunk, ServerFinal, ServerError, ServerFinalSegment }
+export type {
+  AudioInfo,
+  TranscribeSocketOptions,
+  ServerTranscriptChunk,
+  ServerFinal,
+  ServerError,
+  ServerFinalSegment,
+  ServerReady,
+  ServerSoapDraft,
+}
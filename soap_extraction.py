@@ -1,6 +1,7 @@
 """
 This script is used to test the entire SOAP extraction pipeline including the LLM and manual extraction.
 """
+import asyncio
 
 from backend.services.soap_extractor import extract_soap_note
 from backend.services.antibiotic_rules import extract_meds_from_text, analyze_antibiotics
@@ -18,7 +19,7 @@ Patient: Will that help?
 Doctor: Yes, this should clear up the infection. Come back in 3 days for a follow-up.
 """
 
-def test_complete_pipeline():
+async def test_complete_pipeline():
     """
     Test the complete pipeline including the SOAP extraction and antibiotic rules extraction.
     """
@@ -27,7 +28,7 @@ def test_complete_pipeline():
 
     # Step 1: Extract SOAP note from transcript
     print("\nStep 1: Extracting SOAP note from transcript...")
-    soap_note = extract_soap_note(sample_transcript)
+    soap_note = await extract_soap_note(sample_transcript)
 
     print(f"Subjective: {soap_note.subjective}")
     print(f"Objective: {soap_note.objective}")
@@ -36,12 +37,12 @@ def test_complete_pipeline():
 
     # Step 2: Extract medications from SOAP note
     print("\nStep 2: Extracting medications from SOAP note...")
-    extracted_meds = extract_meds_from_text(soap_note.plan)
+    extracted_meds = await extract_meds_from_text(soap_note.plan)
     print(f"Medications: {extracted_meds}")
 
     # Step 3: Run full anitbiotic analysis
     print("\nStep 3: Running full antibiotic analysis...")
-    result = analyze_antibiotics(
+    result = await analyze_antibiotics(
         meds=extracted_meds,
         allergies=["penicillin"],
         plan_text=soap_note.plan
@@ -62,4 +63,4 @@ def test_complete_pipeline():
     return result
 
 if __name__ == "__main__":
-    result = test_complete_pipeline()
\ No newline at end of file
+    result = asyncio.run(test_complete_pipeline())
\ No newline at end of file